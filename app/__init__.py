@@ -26,9 +26,11 @@ def create_app(config_name='dev'):
     # 只有在非测试环境下才启动定时任务
     if config_name != 'test' and not app.config.get('TESTING'):
         scheduler = BackgroundScheduler()
-        from .tasks import setup_qrcode_tasks, setup_violation_tasks
+        from .tasks import setup_qrcode_tasks, setup_violation_tasks, setup_recommendation_tasks, setup_check_in_tasks
         setup_qrcode_tasks(app, scheduler)
         setup_violation_tasks(app, scheduler)
+        setup_recommendation_tasks(app, scheduler)
+        setup_check_in_tasks(app, scheduler)
         
         if not scheduler.running:
             try:
@@ -4,6 +4,7 @@ from functools import wraps
 from ..models.db import db # <--- 确保这行是正确的！
 from ..models import SystemSetting, Reservation, User, StudyRoom
 from ..utils import success_response, error_response
+from ..services import SettingsStore
 from ..schemas import SettingUpdateSchema
 from marshmallow import ValidationError
 from . import api_bp
@@ -26,7 +27,7 @@ def admin_required(fn):
 def manage_settings():
     """获取或更新系统配置"""
     if request.method == 'GET':
-        settings = SystemSetting.query.all()
+        settings = SystemSetting.query.filter(SystemSetting.key != SettingsStore.VERSION_KEY).all()
         data = [s.to_dict() for s in settings]
         return jsonify(success_response(data=data))
     
@@ -37,19 +38,22 @@ def manage_settings():
                 for item in data:
                     validated_data = SettingUpdateSchema().load(item)
                     setting = db.session.get(SystemSetting, validated_data['key'])
-                    if setting:
+                    if setting and setting.key != SettingsStore.VERSION_KEY:
                         setting.value = validated_data['value']
             else:
                  validated_data = SettingUpdateSchema().load(data)
                  setting = db.session.get(SystemSetting, validated_data['key'])
-                 if setting:
+                 if setting and setting.key != SettingsStore.VERSION_KEY:
                      setting.value = validated_data['value']
                  else:
                      return jsonify(error_response(f"配置项 {validated_data['key']} 不存在", 404)), 404
         except ValidationError as err:
             return jsonify(error_response(str(err.messages), 400)), 400
         
+        # 版本令牌与配置一起提交，其它进程据此重新加载配置缓存
+        SettingsStore.bump_version()
         db.session.commit()
+        SettingsStore.invalidate()
         return jsonify(success_response(message="配置更新成功"))
 
 @api_bp.route('/admin/violations/all', methods=['GET'], endpoint='admin_get_all_violations')
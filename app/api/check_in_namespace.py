@@ -24,7 +24,8 @@ check_in_response = api.model('CheckInResponse', {
     'check_in_id': fields.Integer(description='签到记录ID'),
     'room_name': fields.String(description='自习室名称'),
     'room_location': fields.String(description='自习室位置'),
-    'check_in_time': fields.String(description='签到时间')
+    'check_in_time': fields.String(description='签到时间'),
+    'reservation_id': fields.Integer(description='关联的预约ID，没有正在进行的预约时为空')
 })
 
 check_out_response = api.model('CheckOutResponse', {
@@ -44,7 +45,8 @@ check_in_history_item = api.model('CheckInHistoryItem', {
 })
 
 check_in_history_response = api.model('CheckInHistoryResponse', {
-    'data': fields.List(fields.Nested(check_in_history_item))
+    'data': fields.List(fields.Nested(check_in_history_item)),
+    'next_cursor': fields.String(description='下一页游标，没有更多记录时为空')
 })
 
 # 定义路由
@@ -55,16 +57,12 @@ class CheckInResource(Resource):
     @api.response(200, '签到成功', check_in_response)
     @api.response(400, '无效的请求')
     @api.response(401, '未授权')
+    @api.response(403, '非学生用户')
     @jwt_required()
     def post(self):
         """学生扫码签到"""
-        # 获取当前用户ID
+        # 获取当前用户ID，学生角色在签到服务中与自习室信息一并查询校验
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        # 验证用户角色
-        if not user or user.role != 'student':
-            return error_response(message="只有学生可以使用签到功能", code=403), 403
         
         # 验证请求数据
         try:
@@ -79,7 +77,8 @@ class CheckInResource(Resource):
         if result['success']:
             return success_response(data=result['data'], message="签到成功")
         else:
-            return error_response(message=result['message'], code=400), 400
+            code = result.get('code', 400)
+            return error_response(message=result['message'], code=code), code
 
 @api.route('/checkout')
 class CheckOutResource(Resource):
@@ -116,7 +115,12 @@ class CheckOutResource(Resource):
 
 @api.route('/history')
 class CheckInHistoryResource(Resource):
-    @api.doc('获取签到历史')
+    @api.doc('获取签到历史', params={
+        'status': '签到状态过滤',
+        'limit': '每页记录数，1-100，默认10',
+        'cursor': '上一页返回的 next_cursor',
+        'offset': '已弃用，偏移量翻页，仅在未传 cursor 时生效'
+    })
     @api.response(200, '获取成功', check_in_history_response)
     @api.response(401, '未授权')
     @jwt_required()
@@ -135,6 +139,7 @@ class CheckInHistoryResource(Resource):
             params = CheckInListSchema().load({
                 'status': request.args.get('status'),
                 'limit': request.args.get('limit', 10, type=int),
+                'cursor': request.args.get('cursor'),
                 'offset': request.args.get('offset', 0, type=int)
             })
         except ValidationError as err:
@@ -145,11 +150,14 @@ class CheckInHistoryResource(Resource):
             current_user_id,
             status=params.get('status'),
             limit=params.get('limit'),
+            cursor=params.get('cursor'),
             offset=params.get('offset')
         )
         
         # 判断处理结果
         if result['success']:
-            return success_response(data=result['data'])
+            response = success_response(data=result['data'])
+            response['next_cursor'] = result['next_cursor']
+            return response
         else:
             return error_response(message=result['message'], code=400), 400 
\ No newline at end of file
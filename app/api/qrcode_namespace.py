@@ -1,4 +1,6 @@
-from flask import request
+import json
+from datetime import datetime
+from flask import request, current_app, Response
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..services import QRCodeService
@@ -17,6 +19,55 @@ qrcode_display_model = api.model('QRCodeDisplay', {
     'expires_in': fields.Integer(description='过期时间（秒）')
 })
 
+stream_ticket_model = api.model('QRCodeStreamTicket', {
+    'ticket': fields.String(description='推送流票据，作为 ticket 参数订阅该自习室的二维码推送'),
+    'expires_in': fields.Integer(description='票据有效期（秒），只需在建立连接时有效')
+})
+
+# 推送流无事件时发送注释行的间隔（秒），保持连接并及时发现已断开的客户端
+STREAM_HEARTBEAT_SECONDS = 15
+
+
+def _display_payload(room_id, room_name, room_location, qrcode_data):
+    """大屏显示所需的二维码数据"""
+    expires_at = datetime.fromisoformat(qrcode_data['data']['expires_at'])
+    return {
+        'room_id': room_id,
+        'room_name': room_name,
+        'room_location': room_location,
+        'qrcode_data': QRCodeService.encode_qrcode_for_display(qrcode_data),
+        'expires_in': int(max(0, (expires_at - datetime.utcnow()).total_seconds()))
+    }
+
+
+def _qrcode_event_stream(app, room_id, room_name, room_location):
+    """二维码推送流：先发送当前二维码，之后仅在轮换时发送新数据
+
+    每次检查都在独立的应用上下文中读取有效二维码缓存，结束后即归还数据库会话，
+    空闲连接只占用一个等待中的线程。
+    """
+    with app.app_context():
+        signal = QRCodeService.rotation_signal(room_id)
+
+    yield 'retry: 5000\n\n'
+    sent_id = None
+    while True:
+        # 先取版本号再读二维码，两者之间发生的轮换会让下一次等待立即返回
+        version = signal.version
+        with app.app_context():
+            qrcode_data = QRCodeService.get_active_qrcode(room_id)
+
+        if qrcode_data['qrcode_id'] != sent_id:
+            sent_id = qrcode_data['qrcode_id']
+            payload = _display_payload(room_id, room_name, room_location, qrcode_data)
+            yield f"event: qrcode\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+        else:
+            yield ': keepalive\n\n'
+
+        # 其它进程完成的轮换在本进程缓存过期后才可见，超时唤醒时借 get_active_qrcode 回库确认
+        signal.wait(version, STREAM_HEARTBEAT_SECONDS)
+
+
 # 定义路由
 @api.route('/room/<int:room_id>')
 class RoomQRCodeResource(Resource):
@@ -46,7 +97,6 @@ class RoomQRCodeResource(Resource):
         
         # 计算过期时间（秒）
         expires_at = qrcode_data['data']['expires_at']
-        from datetime import datetime
         expires_in = max(0, (datetime.fromisoformat(expires_at) - datetime.utcnow()).total_seconds())
         
         # 返回结果
@@ -84,7 +134,6 @@ class RoomQRCodeResource(Resource):
         
         # 计算过期时间（秒）
         expires_at = qrcode_data['data']['expires_at']
-        from datetime import datetime
         expires_in = max(0, (datetime.fromisoformat(expires_at) - datetime.utcnow()).total_seconds())
         
         # 返回结果
@@ -94,4 +143,67 @@ class RoomQRCodeResource(Resource):
             'room_location': room.location,
             'qrcode_data': encoded_data,
             'expires_in': int(expires_in)
-        }) 
\ No newline at end of file
+        }) 
+
+
+@api.route('/room/<int:room_id>/stream/ticket')
+class RoomQRCodeStreamTicketResource(Resource):
+    @api.doc('申请自习室二维码推送流票据')
+    @api.response(200, '申请成功', stream_ticket_model)
+    @api.response(403, '无权限')
+    @api.response(404, '自习室不存在')
+    @jwt_required()
+    def post(self, room_id):
+        """为 EventSource 申请短期票据
+
+        EventSource 无法设置请求头，访问令牌放在查询参数中会写入访问日志；
+        改为先用请求头中的令牌换取只能订阅该自习室、短时间内有效的票据。
+        """
+        current_user_id = get_jwt_identity()
+        user = User.query.get(current_user_id)
+
+        if not user or user.role != 'admin':
+            return error_response(message="只有管理员可以获取二维码", code=403), 403
+
+        room = StudyRoom.query.get(room_id)
+        if not room:
+            return error_response(message="自习室不存在", code=404), 404
+
+        return success_response(data={
+            'ticket': QRCodeService.issue_stream_ticket(room_id, user.id),
+            'expires_in': QRCodeService.STREAM_TICKET_SECONDS
+        })
+
+
+@api.route('/room/<int:room_id>/stream')
+class RoomQRCodeStreamResource(Resource):
+    @api.doc('订阅自习室二维码推送', params={'ticket': '通过申请推送流票据接口获得的票据'})
+    @api.response(200, 'text/event-stream 事件流，每个 qrcode 事件的数据格式同获取二维码接口', qrcode_display_model)
+    @api.response(401, '票据无效或已过期')
+    @api.response(403, '无权限')
+    @api.response(404, '自习室不存在')
+    def get(self, room_id):
+        """以 Server-Sent Events 向大屏推送自习室二维码，只在二维码轮换时发送
+
+        鉴权和自习室查询只在建立连接时进行一次，之后的数据来自本进程的有效二维码缓存。
+        票据过期后 EventSource 的自动重连会被拒绝，客户端需重新申请票据再连接。
+        每个连接占用一个工作线程，部署时使用 gthread 工作模式并按大屏数量配置线程数。
+        """
+        user_id = QRCodeService.verify_stream_ticket(request.args.get('ticket', ''), room_id)
+        if user_id is None:
+            return error_response(message="推送流票据无效或已过期", code=401), 401
+
+        user = User.query.get(user_id)
+        if not user or user.role != 'admin':
+            return error_response(message="只有管理员可以获取二维码", code=403), 403
+
+        room = StudyRoom.query.get(room_id)
+        if not room:
+            return error_response(message="自习室不存在", code=404), 404
+
+        stream = _qrcode_event_stream(current_app._get_current_object(), room_id, room.name, room.location)
+        return Response(stream, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            # 关闭 nginx 等反向代理的响应缓冲
+            'X-Accel-Buffering': 'no'
+        })
\ No newline at end of file
@@ -1,7 +1,8 @@
-from flask import jsonify
+from flask import jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models.db import db  
-from ..models import Reservation, Notification, StudyRoom, User
+from ..models import Reservation, StudyRoom, User
+from ..services import NotificationService
 from ..utils import success_response, error_response
 from . import api_bp
 
@@ -37,21 +38,42 @@ def get_violation_history():
 @api_bp.route('/reservations/notifications', methods=['GET'], endpoint='reservations_get_notifications')
 @jwt_required()
 def get_notifications():
-    """获取个人通知列表"""
-    user_id = get_jwt_identity()
-    notifications = Notification.query.filter_by(user_id=user_id).order_by(Notification.created_at.desc()).limit(50).all()
-    data = [n.to_dict() for n in notifications]
-    return jsonify(success_response(data=data))
+    """分页获取个人通知列表，可只看未读"""
+    user_id = int(get_jwt_identity())
+    result = NotificationService.list_notifications(
+        user_id,
+        unread_only=request.args.get('unread_only', 'false').lower() in ('1', 'true'),
+        cursor=request.args.get('cursor'),
+        limit=request.args.get('limit', type=int)
+    )
+    if not result['success']:
+        return jsonify(error_response(result['message'], 400)), 400
+
+    response = success_response(data=result['data'])
+    response['next_cursor'] = result['next_cursor']
+    response['unread_count'] = NotificationService.unread_count(user_id)
+    return jsonify(response)
+
+@api_bp.route('/reservations/notifications/unread-count', methods=['GET'], endpoint='reservations_get_unread_count')
+@jwt_required()
+def get_unread_count():
+    """获取未读通知数，供客户端轮询角标"""
+    user_id = int(get_jwt_identity())
+    return jsonify(success_response(data={'unread_count': NotificationService.unread_count(user_id)}))
+
+@api_bp.route('/reservations/notifications/read-all', methods=['POST'], endpoint='reservations_read_all_notifications')
+@jwt_required()
+def read_all_notifications():
+    """将全部未读通知标记为已读"""
+    user_id = int(get_jwt_identity())
+    updated = NotificationService.mark_all_read(user_id)
+    return jsonify(success_response(data={'updated': updated}, message="全部标记已读成功"))
 
 @api_bp.route('/reservations/notifications/<int:notification_id>/read', methods=['POST'], endpoint='reservations_read_notification')
 @jwt_required()
 def read_notification(notification_id):
     """将通知标记为已读"""
-    user_id = get_jwt_identity()
-    notification = db.session.get(Notification, notification_id)
-    if not notification or int(notification.user_id) != int(user_id):
+    user_id = int(get_jwt_identity())
+    if not NotificationService.mark_read(user_id, notification_id):
         return jsonify(error_response("通知不存在", 404)), 404
-    
-    notification.is_read = True
-    db.session.commit()
     return jsonify(success_response(message="标记已读成功"))
\ No newline at end of file
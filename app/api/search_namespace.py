@@ -1,16 +1,37 @@
 # 学生查询接口
 from app.services.student_service import StudentService
+from app.services.occupancy_service import OccupancyService
 from flask_restx import Namespace, Resource, reqparse
-from datetime import datetime
+from datetime import date, datetime, timedelta
 
 
 api = Namespace('search', description='学生自助服务')
 
 @api.route('/reservations/<int:student_id>')
 class StudentReservations(Resource):
+    parser = reqparse.RequestParser()
+    parser.add_argument('cursor', type=str)
+    parser.add_argument('limit', type=int, default=20)
+
+    def get(self, student_id):
+        """分页获取学生预约记录"""
+        args = self.parser.parse_args()
+        if not 1 <= args['limit'] <= 100:
+            return {"message": "每页记录数必须在1到100之间"}, 400
+
+        try:
+            return StudentService.get_reservation_history(student_id, cursor=args['cursor'], limit=args['limit'])
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+@api.route('/recommendation/<int:student_id>')
+class QuickRecommendation(Resource):
     def get(self, student_id):
-        """获取学生预约记录"""
-        return StudentService.get_reservation_history(student_id)
+        """根据预约偏好推荐座位"""
+        recommendation = StudentService.get_quick_recommendation(student_id)
+        if recommendation is None:
+            return {"message": "暂无可推荐的座位"}, 404
+        return recommendation
 
 # @api.route('/available')
 # class AvailableSlots(Resource):
@@ -42,6 +63,37 @@ class RoomSeatStatus(Resource):
         }
 
 
+@api.route('/room-status/cache-stats')
+class RoomSeatStatusCacheStats(Resource):
+    def get(self):
+        """查看座位状态缓存的命中情况"""
+        return StudentService.get_room_status_cache_stats()
+
+
+@api.route('/room-occupancy')
+class RoomOccupancy(Resource):
+    def get(self):
+        """获取所有自习室的实时在座人数与容量"""
+        return OccupancyService.get_all_rooms_occupancy()
+
+
+@api.route('/room-grid')
+class RoomDayGrid(Resource):
+    parser = reqparse.RequestParser()
+    parser.add_argument('room_id', type=int, required=True)
+    parser.add_argument('date', type=str, required=True)
+
+    def get(self):
+        """获取整间教室一天（本地日期）的座位占用网格"""
+        args = self.parser.parse_args()
+        try:
+            day = date.fromisoformat(args['date'])
+        except ValueError:
+            return {"message": "无效的日期"}, 400
+
+        return StudentService.get_room_day_grid(args['room_id'], day)
+
+
 @api.route('/search-available-seats')
 class SearchAvailableSeats(Resource):
     def get(self):
@@ -60,3 +112,41 @@ class SearchAvailableSeats(Resource):
             "end": request.args.get("end"),
             "available_seats": available_seats
         }
+
+
+@api.route('/earliest-windows')
+class EarliestWindows(Resource):
+    parser = reqparse.RequestParser()
+    parser.add_argument('duration', type=int, required=True, help='所需时长（分钟）')
+    parser.add_argument('has_power', type=str, default='false')
+    parser.add_argument('horizon_hours', type=int, default=24)
+    parser.add_argument('limit', type=int, default=5)
+    parser.add_argument('start', type=str)
+
+    def get(self):
+        """在所有自习室中查找最早的空闲时间窗，早于当前时间的 start 从当前时间开始查找"""
+        args = self.parser.parse_args()
+        if args['duration'] <= 0 or args['horizon_hours'] <= 0 or not 1 <= args['limit'] <= 50:
+            return {"message": "参数取值无效"}, 400
+        # 先按整数比较上限，过大的取值构造 timedelta 时会溢出
+        if args['duration'] * 60 > StudentService.EARLIEST_WINDOW_MAX_DURATION.total_seconds():
+            return {"message": "所需时长不能超过24小时"}, 400
+        if args['horizon_hours'] * 3600 > StudentService.EARLIEST_WINDOW_MAX_HORIZON.total_seconds():
+            return {"message": "查找范围不能超过7天"}, 400
+
+        try:
+            start = datetime.fromisoformat(args['start']) if args['start'] else None
+        except ValueError:
+            return {"message": "无效的开始时间"}, 400
+        windows = StudentService.find_earliest_windows(
+            duration=timedelta(minutes=args['duration']),
+            require_power=args['has_power'].lower() == 'true',
+            horizon=timedelta(hours=args['horizon_hours']),
+            limit=args['limit'],
+            start=start
+        )
+
+        return {
+            "duration": args['duration'],
+            "windows": windows
+        }
@@ -7,5 +7,6 @@ from .system_setting import SystemSetting
 from .notification import Notification
 from .time_slot import TimeSlot
 from .study_seat import Seat
+from .student_preference import StudentPreference
 
 from .db import db
@@ -4,6 +4,16 @@ from .db import db
 class CheckIn(db.Model):
     """学生签到记录模型"""
     __tablename__ = 'check_ins'
+    __table_args__ = (
+        # 清理失效二维码时判断是否仍被签到记录引用
+        db.Index('ix_check_ins_qrcode_id', 'qrcode_id'),
+        # 同一学生在同一自习室最多一条签到中的记录，NULL 互不冲突
+        db.Index('uq_check_ins_student_room_open', 'student_id', 'room_id', 'open_flag', unique=True),
+        # 自动签退按状态 + 自习室 + 签到时间查找未签退记录
+        db.Index('ix_check_ins_status_room_time', 'status', 'room_id', 'check_in_time'),
+        # 签到历史按学生 + 状态过滤，按签到时间键集翻页
+        db.Index('ix_check_ins_student_status_time', 'student_id', 'status', 'check_in_time'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     
@@ -15,6 +25,8 @@ class CheckIn(db.Model):
 
     # 签到状态：checked_in(已签到), checked_out(已签退), expired(过期)
     status = db.Column(db.String(20), default='checked_in')
+    # 由数据库根据 status 生成：签到中为 1，其它状态为 NULL，用于唯一索引防止重复签到
+    open_flag = db.Column(db.Integer, db.Computed("CASE WHEN status = 'checked_in' THEN 1 END"))
     
     # 时间记录
     check_in_time = db.Column(db.DateTime, default=datetime.utcnow)
@@ -4,6 +4,10 @@ from .db import db
 class Notification(db.Model):
     """用户通知模型"""
     __tablename__ = 'notifications'
+    __table_args__ = (
+        # 收件箱按用户、已读状态与创建时间分页
+        db.Index('ix_notifications_user_read_created', 'user_id', 'is_read', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
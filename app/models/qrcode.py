@@ -5,6 +5,12 @@ from .db import db
 class QRCode(db.Model):
     """自习室签到二维码模型"""
     __tablename__ = 'qrcodes'
+    __table_args__ = (
+        # 查找自习室当前有效二维码：room_id、is_active 等值 + expires_at 范围
+        db.Index('ix_qrcodes_room_active_expires', 'room_id', 'is_active', 'expires_at'),
+        # 刷新任务置失效与清理任务按 is_active + expires_at 扫描全表
+        db.Index('ix_qrcodes_active_expires', 'is_active', 'expires_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey('study_rooms.id'), nullable=False)
@@ -4,6 +4,16 @@ from .db import db
 class Reservation(db.Model):
     """预约记录模型"""
     __tablename__ = 'reservations'
+    __table_args__ = (
+        # 签到时查找学生在该自习室正在进行的预约
+        db.Index('ix_reservations_student_room_status_start', 'student_id', 'room_id', 'status', 'start_time'),
+        # 违约处理按状态 + 开始时间扫描
+        db.Index('ix_reservations_status_start', 'status', 'start_time'),
+        # 开始前提醒只扫描尚未提醒的预约
+        db.Index('ix_reservations_status_reminder_start', 'status', 'reminder_sent_at', 'start_time'),
+        # 截止时间堆按创建时间增量加载新预约
+        db.Index('ix_reservations_status_created', 'status', 'created_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -23,6 +33,9 @@ class Reservation(db.Model):
     
     # 关联签到记录
     check_in_id = db.Column(db.Integer, db.ForeignKey('check_ins.id'), nullable=True)
+
+    # 开始前提醒的发送时间，为空表示尚未提醒
+    reminder_sent_at = db.Column(db.DateTime, nullable=True)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
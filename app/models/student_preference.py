@@ -0,0 +1,47 @@
+from datetime import datetime
+from .db import db
+
+class StudentPreference(db.Model):
+    """学生预约偏好画像，由定时任务对预约有变化的学生按 time_slots 重算"""
+    __tablename__ = 'student_preferences'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+
+    # 各自习室、各座位的预约次数：{id: 次数}
+    room_counts = db.Column(db.JSON, nullable=False, default=dict)
+    seat_counts = db.Column(db.JSON, nullable=False, default=dict)
+    # 按开始小时统计的预约次数，长度为 24
+    hour_counts = db.Column(db.JSON, nullable=False, default=lambda: [0] * 24)
+
+    # 预约总数、其中带插座座位的次数、累计预约时长（分钟）
+    total_slots = db.Column(db.Integer, nullable=False, default=0)
+    power_slots = db.Column(db.Integer, nullable=False, default=0)
+    total_minutes = db.Column(db.Integer, nullable=False, default=0)
+
+    # 最近一次重算的时间，其最大值是下次按 time_slots.updated_at 找变更的水位
+    refreshed_at = db.Column(db.DateTime, nullable=True)
+
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def top_rooms(self, n=3):
+        """预约次数最多的 n 个自习室 [(room_id, 次数)]"""
+        ranked = sorted(self.room_counts.items(), key=lambda item: -item[1])[:n]
+        return [(int(room_id), count) for room_id, count in ranked]
+
+    def usual_hour(self):
+        """最常预约的开始小时"""
+        return max(range(24), key=lambda hour: self.hour_counts[hour])
+
+    def needs_power(self):
+        """半数以上的预约选择了带插座的座位"""
+        return self.total_slots > 0 and self.power_slots * 2 >= self.total_slots
+
+    def to_dict(self):
+        return {
+            'user_id': self.user_id,
+            'top_rooms': [room_id for room_id, _ in self.top_rooms()],
+            'usual_hour': self.usual_hour() if self.total_slots else None,
+            'needs_power': self.needs_power(),
+            'total_slots': self.total_slots,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
@@ -15,6 +15,12 @@ class StudyRoom(db.Model):
     
     # 二维码刷新间隔（分钟）
     qrcode_refresh_interval = db.Column(db.Integer, default=30)
+
+    # 每日开门时间（按 LOCAL_TIMEZONE 的本地时间记录），为空表示 0 点开门
+    open_time = db.Column(db.Time, nullable=True)
+
+    # 每日关门时间（按 LOCAL_TIMEZONE 的本地时间记录），为空表示全天开放、不自动签退；过后未签退的记录被自动签退
+    close_time = db.Column(db.Time, nullable=True)
     
     # 自习室管理员ID（可为空，表示由系统管理员管理）
     admin_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
@@ -34,6 +40,8 @@ class StudyRoom(db.Model):
             'capacity': self.capacity,
             'description': self.description,
             'qrcode_refresh_interval': self.qrcode_refresh_interval,
+            'open_time': self.open_time.strftime('%H:%M') if self.open_time else None,
+            'close_time': self.close_time.strftime('%H:%M') if self.close_time else None,
             'admin_id': self.admin_id,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
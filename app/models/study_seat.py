@@ -4,9 +4,16 @@ from .db import db
 class Seat(db.Model):
     __tablename__ = 'seat'
 
+    # 日占用位图的粒度：每个座位一天按 15 分钟划分为 96 个时间桶
+    BUCKET_MINUTES = 15
+    BUCKETS_PER_DAY = 24 * 60 // BUCKET_MINUTES
+
     id = db.Column(db.Integer, primary_key=True)
     room_id = db.Column(db.Integer, db.ForeignKey('study_rooms.id'), nullable=False)
     seat_number = db.Column(db.String(10), nullable=False)
     has_power = db.Column(db.Boolean, default=False)  # ✅ 是否有插头
 
-    room = db.relationship('StudyRoom', backref='seats')
\ No newline at end of file
+    # 占用版本号：该座位的时间块每变更一次加一，供进程内占用索引判断是否过期
+    slot_version = db.Column(db.Integer, default=0, nullable=False, server_default='0')
+
+    room = db.relationship('StudyRoom', backref='seats')
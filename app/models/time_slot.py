@@ -3,6 +3,18 @@ from datetime import time, datetime
 
 class TimeSlot(db.Model):
     __tablename__ = 'time_slots'
+    __table_args__ = (
+        # 同一座位同一时间段只能有一条时间块，并发预约时由数据库兜底去重
+        db.UniqueConstraint('seat_id', 'start_time', 'end_time', name='uq_time_slots_seat_period'),
+        # 座位冲突检查：seat_id、is_reserved 等值 + start_time 范围，end_time 由索引覆盖
+        db.Index('ix_time_slots_seat_reserved_period', 'seat_id', 'is_reserved', 'start_time', 'end_time'),
+        # 预约历史与用户时间冲突检查
+        db.Index('ix_time_slots_user_start', 'reserved_by', 'start_time'),
+        # 占用索引按教室加载未结束的预约
+        db.Index('ix_time_slots_room_reserved_end', 'room_id', 'is_reserved', 'end_time'),
+        # 偏好画像按更新时间找出预约有变化的学生
+        db.Index('ix_time_slots_updated_at', 'updated_at'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     # room_id = db.Column(db.Integer, nullable=False)
@@ -15,6 +27,8 @@ class TimeSlot(db.Model):
 
     is_reserved = db.Column(db.Boolean, default=False)
     reserved_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # 用户ID
+    # 创建或预约状态变化的时间；取消预约时应保留 reserved_by，画像才能扣除
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     room = db.relationship('StudyRoom', backref='time_slots')
     seat = db.relationship('Seat', backref='time_slots')
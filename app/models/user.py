@@ -15,6 +15,8 @@ class User(db.Model):
     # 新增字段
     violation_count = db.Column(db.Integer, default=0)
     banned_until = db.Column(db.DateTime, nullable=True) # 禁用预约的截止时间
+    # 未读通知数，随通知写入与标记已读在同一事务中维护
+    unread_notifications = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -22,6 +22,8 @@ class CheckInListSchema(Schema):
     """签到记录列表请求验证模式"""
     status = fields.String(required=False)
     limit = fields.Integer(required=False, missing=10)
+    cursor = fields.String(required=False, allow_none=True)
+    # 已弃用，旧客户端的偏移量翻页；新客户端使用 cursor
     offset = fields.Integer(required=False, missing=0)
 
     @validates('limit')
@@ -32,4 +34,4 @@ class CheckInListSchema(Schema):
     @validates('offset')
     def validate_offset(self, value):
         if value < 0:
-            raise ValidationError('偏移值不能为负数') 
\ No newline at end of file
+            raise ValidationError('偏移值不能为负数')
\ No newline at end of file
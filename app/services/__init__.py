@@ -1,4 +1,9 @@
 from .auth_service import AuthService
 from .qrcode_service import QRCodeService
 from .check_in_service import CheckInService
-from .violation_service import ViolationService # 新增
\ No newline at end of file
+from .violation_service import ViolationService # 新增
+from .recommendation_service import RecommendationService
+from .occupancy_service import OccupancyService
+from .settings_store import SettingsStore
+from .deadline_queue import DeadlineQueue
+from .notification_service import NotificationService
@@ -1,20 +1,52 @@
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timedelta
 from flask_jwt_extended import get_jwt_identity
-from ..models import User, StudyRoom, QRCode, CheckIn
+from sqlalchemy import and_, func, literal, or_, update
+from sqlalchemy.exc import IntegrityError
+from ..models import User, StudyRoom, QRCode, CheckIn, Reservation
 from ..models.db import db
+from ..utils.cursor import decode_cursor, encode_cursor
+from ..utils.sql_functions import minutes_between
+from ..utils.local_time import local_to_utc, utc_to_local
+from .occupancy_service import OccupancyService
 from .qrcode_service import QRCodeService
 
 class CheckInService:
+    # 预约开始前多少分钟内即可签到并关联该预约
+    CHECK_IN_EARLY_MINUTES = 15
+    # 自动签退：关联预约结束后的宽限分钟数、每批关闭的记录数、按关门时间回溯的天数
+    AUTO_CHECKOUT_GRACE_MINUTES = 30
+    AUTO_CHECKOUT_BATCH_SIZE = 500
+    AUTO_CHECKOUT_LOOKBACK_DAYS = 7
+    # 保证同一学生在同一自习室最多一条签到中记录的唯一索引
+    OPEN_GUARD_INDEX = 'uq_check_ins_student_room_open'
+
+    @staticmethod
+    def _is_open_guard_violation(error):
+        """IntegrityError 是否由 OPEN_GUARD_INDEX 引起
+
+        MySQL 的错误信息带有索引名，SQLite 只列出索引中的列。
+        """
+        message = str(error.orig)
+        if CheckInService.OPEN_GUARD_INDEX in message:
+            return True
+        index = next(i for i in CheckIn.__table__.indexes if i.name == CheckInService.OPEN_GUARD_INDEX)
+        return ', '.join(f'{CheckIn.__tablename__}.{c.name}' for c in index.columns) in message
+
     @staticmethod
     def student_check_in(student_id, encoded_qrcode):
         """学生签到
+
+        二维码命中本进程缓存时验证不访问数据库；学生角色、自习室信息和正在进行的预约
+        合并为一次查询，重复签到由 check_ins 的唯一索引在插入时拦截。
+        找到预约时在同一事务内互相关联，并把预约状态改为 checked_in。
         
         Args:
             student_id: 学生ID
             encoded_qrcode: 编码后的二维码字符串
             
         Returns:
-            dict: 包含签到结果的字典
+            dict: 包含签到结果的字典，失败时 code 为建议的 HTTP 状态码
         """
         try:
             # 验证二维码
@@ -23,31 +55,42 @@ class CheckInService:
             if not is_valid:
                 return {
                     'success': False,
-                    'message': error_msg
+                    'message': error_msg,
+                    'code': 400
                 }
             
             # 获取自习室信息
             room_id = qrcode.room_id
             
-            # 检查学生是否已经在该自习室签到
-            existing_check_in = CheckIn.query.filter_by(
-                student_id=student_id,
-                room_id=room_id,
-                status='checked_in'
-            ).first()
-            
-            if existing_check_in:
+            # 一次查询取得学生角色、自习室信息和该自习室内正在进行的预约，
+            # 自习室不存在时 name 为空，没有预约时 reservation_id 为空
+            now = datetime.utcnow()
+            row = db.session.query(
+                User.role, StudyRoom.name, StudyRoom.location, Reservation.id.label('reservation_id')
+            ).select_from(User).outerjoin(
+                StudyRoom, StudyRoom.id == room_id
+            ).outerjoin(
+                Reservation, and_(
+                    Reservation.student_id == User.id,
+                    Reservation.room_id == room_id,
+                    Reservation.status == 'scheduled',
+                    Reservation.start_time <= now + timedelta(minutes=CheckInService.CHECK_IN_EARLY_MINUTES),
+                    Reservation.end_time > now
+                )
+            ).filter(User.id == student_id).order_by(Reservation.start_time).first()
+
+            if not row or row.role != 'student':
                 return {
                     'success': False,
-                    'message': '您已经在该自习室签到'
+                    'message': '只有学生可以使用签到功能',
+                    'code': 403
                 }
             
-            # 获取自习室信息
-            room = StudyRoom.query.get(room_id)
-            if not room:
+            if row.name is None:
                 return {
                     'success': False,
-                    'message': '自习室不存在'
+                    'message': '自习室不存在',
+                    'code': 400
                 }
             
             # 创建新的签到记录
@@ -55,29 +98,58 @@ class CheckInService:
                 student_id=student_id,
                 room_id=room_id,
                 qrcode_id=qrcode.id,
+                reservation_id=row.reservation_id,
                 status='checked_in',
-                check_in_time=datetime.utcnow()
+                check_in_time=now
             )
             
             db.session.add(check_in)
+            try:
+                db.session.flush()
+            except IntegrityError as e:
+                db.session.rollback()
+                # 只有签到中记录的唯一索引冲突表示重复签到，其它约束错误照常抛出
+                if not CheckInService._is_open_guard_violation(e):
+                    raise
+                return {
+                    'success': False,
+                    'message': '您已经在该自习室签到',
+                    'code': 400
+                }
+            check_in_id = check_in.id
+
+            if row.reservation_id is not None:
+                # 只更新仍处于 scheduled 的预约，避免覆盖违约处理等并发修改
+                linked = db.session.execute(
+                    update(Reservation).where(
+                        Reservation.id == row.reservation_id,
+                        Reservation.status == 'scheduled'
+                    ).values(status='checked_in', check_in_id=check_in_id).execution_options(synchronize_session=False)
+                ).rowcount
+                if not linked:
+                    check_in.reservation_id = None
+            reservation_id = check_in.reservation_id
             db.session.commit()
+            OccupancyService.adjust({room_id: 1})
             
             # 返回签到成功信息
             return {
                 'success': True,
                 'message': '签到成功',
                 'data': {
-                    'check_in_id': check_in.id,
-                    'room_name': room.name,
-                    'room_location': room.location,
-                    'check_in_time': check_in.check_in_time.isoformat()
+                    'check_in_id': check_in_id,
+                    'room_name': row.name,
+                    'room_location': row.location,
+                    'check_in_time': now.isoformat(),
+                    'reservation_id': reservation_id
                 }
             }
         except Exception as e:
             db.session.rollback()
             return {
                 'success': False,
-                'message': f'签到失败: {str(e)}'
+                'message': f'签到失败: {str(e)}',
+                'code': 400
             }
     
     @staticmethod
@@ -113,6 +185,7 @@ class CheckInService:
             check_in.duration = check_in.calculate_duration()
             
             db.session.commit()
+            OccupancyService.adjust({room_id: -1})
             
             # 返回签退成功信息
             return {
@@ -132,50 +205,226 @@ class CheckInService:
             }
     
     @staticmethod
-    def get_student_check_ins(student_id, status=None, limit=10, offset=0):
-        """获取学生的签到记录
+    def _opening_before(closing_local, open_time):
+        """closing_local 这次关门所对应的开门时间（本地时间），开门时间为空表示 0 点开门"""
+        opening_local = datetime.combine(closing_local.date(), open_time or datetime.min.time())
+        if opening_local >= closing_local:
+            # 关门时间不晚于开门时间表示跨过午夜
+            opening_local -= timedelta(days=1)
+        return opening_local
+
+    @staticmethod
+    def _close_check_ins(stale_ids, check_out_time, status='checked_out'):
+        """分批关闭 stale_ids 选出的签到中记录
+
+        签退时间与学习时长都在 SQL 中计算，每批一条 UPDATE 并提交一次；
+        不支持 UPDATE ... RETURNING 的数据库（MySQL）每批先加锁读取一次。
+        check_out_time 为空时只修改状态。
+
+        Returns:
+            int: 关闭的记录数
+        """
+        if check_out_time is None:
+            values = {'status': status}
+        else:
+            values = {
+                'status': status,
+                'check_out_time': check_out_time,
+                'duration': minutes_between(CheckIn.check_in_time, check_out_time)
+            }
+
+        returning = db.session.get_bind().dialect.update_returning
+        closed = 0
+        while True:
+            rows = stale_ids.order_by(CheckIn.id).limit(CheckInService.AUTO_CHECKOUT_BATCH_SIZE).all()
+            if not rows:
+                break
+            ids = [row.id for row in rows]
+            # 选出后可能已被手动签退，入座人数按本次 UPDATE 实际关闭的记录扣减
+            if returning:
+                closed_rooms = db.session.execute(
+                    update(CheckIn).where(CheckIn.id.in_(ids), CheckIn.status == 'checked_in')
+                    .values(**values).returning(CheckIn.room_id).execution_options(synchronize_session=False)
+                ).scalars().all()
+            else:
+                # MySQL 不支持 UPDATE ... RETURNING，先锁定仍在签到中的记录，只关闭这些行
+                locked = db.session.query(CheckIn.id, CheckIn.room_id).filter(
+                    CheckIn.id.in_(ids), CheckIn.status == 'checked_in'
+                ).with_for_update().all()
+                if locked:
+                    db.session.execute(
+                        update(CheckIn).where(CheckIn.id.in_([row.id for row in locked]))
+                        .values(**values).execution_options(synchronize_session=False)
+                    )
+                closed_rooms = [row.room_id for row in locked]
+            db.session.commit()
+            closed += len(closed_rooms)
+            OccupancyService.adjust({room_id: -n for room_id, n in Counter(closed_rooms).items()})
+            if len(rows) < CheckInService.AUTO_CHECKOUT_BATCH_SIZE:
+                break
+        return closed
+
+    @staticmethod
+    def auto_check_out_stale(now=None):
+        """自动签退忘记签退的记录
+
+        1. 关联预约结束超过宽限期的，以预约结束时间签退；
+        2. 跨过自习室关门时间的，以签到后的第一个关门时间签退；关门期间签到的，以签到时间签退；
+           超过 AUTO_CHECKOUT_LOOKBACK_DAYS 天的遗留记录无法确定离开时间，标记为 expired。
+           未设置关门时间的自习室不自动签退。
+
+        Returns:
+            int: 关闭的记录数
+        """
+        now = now or datetime.utcnow()
+        open_check_ins = db.session.query(CheckIn.id).filter(CheckIn.status == 'checked_in')
+
+        reservation_end = db.session.query(Reservation.end_time).filter(
+            Reservation.id == CheckIn.reservation_id
+        ).scalar_subquery()
+        closed = CheckInService._close_check_ins(
+            open_check_ins.join(Reservation, Reservation.id == CheckIn.reservation_id).filter(
+                Reservation.end_time < now - timedelta(minutes=CheckInService.AUTO_CHECKOUT_GRACE_MINUTES)
+            ),
+            reservation_end
+        )
+
+        rooms_by_hours = {}
+        for room_id, open_time, close_time in db.session.query(
+            StudyRoom.id, StudyRoom.open_time, StudyRoom.close_time
+        ).filter(StudyRoom.close_time.isnot(None)):
+            rooms_by_hours.setdefault((open_time, close_time), []).append(room_id)
+
+        now_local = utc_to_local(now)
+        for (open_time, close_time), room_ids in rooms_by_hours.items():
+            # 当前时刻之前最近的一次关门，关门时间为本地时间，逐日换算为 UTC
+            last_close_local = datetime.combine(now_local.date(), close_time)
+            if last_close_local > now_local:
+                last_close_local -= timedelta(days=1)
+            last_close = local_to_utc(last_close_local)
+            next_open = local_to_utc(CheckInService._opening_before(last_close_local + timedelta(days=1), open_time))
+
+            in_rooms = open_check_ins.filter(CheckIn.room_id.in_(room_ids))
+            oldest = db.session.query(func.min(CheckIn.check_in_time)).filter(
+                CheckIn.status == 'checked_in', CheckIn.room_id.in_(room_ids), CheckIn.check_in_time < next_open
+            ).scalar()
+            if oldest is None:
+                continue
+
+            # 从最早的记录所在的关门周期起，逐日以该日关门时间签退；
+            # 关门期间（关门后到下次开门前）的签到不计学习时长，以签到时间签退
+            days = max(min((last_close - oldest).days, CheckInService.AUTO_CHECKOUT_LOOKBACK_DAYS), 0)
+            for day in range(days, -1, -1):
+                closing_local = last_close_local - timedelta(days=day)
+                opening = local_to_utc(CheckInService._opening_before(closing_local, open_time))
+                closing = local_to_utc(closing_local)
+                closed += CheckInService._close_check_ins(
+                    in_rooms.filter(
+                        CheckIn.check_in_time >= local_to_utc(closing_local - timedelta(days=1)),
+                        CheckIn.check_in_time < opening
+                    ),
+                    CheckIn.check_in_time
+                )
+                closed += CheckInService._close_check_ins(
+                    in_rooms.filter(CheckIn.check_in_time >= opening, CheckIn.check_in_time < closing),
+                    literal(closing)
+                )
+            closed += CheckInService._close_check_ins(
+                in_rooms.filter(CheckIn.check_in_time >= last_close, CheckIn.check_in_time < next_open),
+                CheckIn.check_in_time
+            )
+            closed += CheckInService._close_check_ins(
+                in_rooms.filter(
+                    CheckIn.check_in_time < local_to_utc(
+                        last_close_local - timedelta(days=CheckInService.AUTO_CHECKOUT_LOOKBACK_DAYS + 1)
+                    )
+                ),
+                None,
+                status='expired'
+            )
+
+        return closed
+
+    @staticmethod
+    def get_student_check_ins(student_id, status=None, limit=10, cursor=None, offset=0):
+        """按签到时间倒序分页获取学生的签到记录
+
+        自习室信息在同一条查询中连接取出，直接返回行元组；翻页使用 (check_in_time, id) 键集游标，
+        沿 ix_check_ins_student_status_time 索引定位，不随翻页深度变慢。
         
         Args:
             student_id: 学生ID
             status: 签到状态过滤
             limit: 记录数量限制
-            offset: 记录偏移量
+            cursor: 上一页返回的 next_cursor，为空时从最新一条开始
+            offset: 已弃用，兼容旧客户端的偏移量翻页，只在未传 cursor 时生效
             
         Returns:
-            list: 签到记录列表
+            dict: data 为本页记录，next_cursor 为下一页游标（没有更多记录时为 None）
         """
+        try:
+            keyset = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return {
+                'success': False,
+                'message': str(e)
+            }
+
         try:
             # 构建查询
-            query = CheckIn.query.filter_by(student_id=student_id)
+            query = db.session.query(
+                CheckIn.id, CheckIn.student_id, CheckIn.room_id, CheckIn.qrcode_id, CheckIn.reservation_id,
+                CheckIn.status, CheckIn.check_in_time, CheckIn.check_out_time, CheckIn.duration,
+                CheckIn.is_violation, StudyRoom.name, StudyRoom.location
+            ).outerjoin(StudyRoom, CheckIn.room_id == StudyRoom.id).filter(CheckIn.student_id == student_id)
             
             # 应用状态过滤
             if status:
-                query = query.filter_by(status=status)
-            
-            # 排序并分页
-            check_ins = query.order_by(
-                CheckIn.check_in_time.desc()
-            ).limit(limit).offset(offset).all()
-            
-            # 转换为字典列表
-            result = []
-            for check_in in check_ins:
-                # 获取关联信息
-                room = StudyRoom.query.get(check_in.room_id)
-                
-                # 构建记录字典
-                record = check_in.to_dict()
-                record['room_name'] = room.name if room else '未知'
-                record['room_location'] = room.location if room else '未知'
-                
-                result.append(record)
+                query = query.filter(CheckIn.status == status)
+
+            if keyset:
+                cursor_time, cursor_id = keyset
+                query = query.filter(or_(
+                    CheckIn.check_in_time < cursor_time,
+                    and_(CheckIn.check_in_time == cursor_time, CheckIn.id < cursor_id)
+                ))
+            
+            query = query.order_by(CheckIn.check_in_time.desc(), CheckIn.id.desc())
+            if offset and not keyset:
+                query = query.offset(offset)
+            # 多取一条用于判断是否还有下一页
+            rows = query.limit(limit + 1).all()
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            
+            # 转换为字典列表，字段与 CheckIn.to_dict 一致
+            result = [
+                {
+                    'id': check_in_id,
+                    'student_id': row_student_id,
+                    'room_id': room_id,
+                    'qrcode_id': qrcode_id,
+                    'reservation_id': reservation_id,
+                    'status': row_status,
+                    'check_in_time': check_in_time.isoformat() if check_in_time else None,
+                    'check_out_time': check_out_time.isoformat() if check_out_time else None,
+                    'duration': duration,
+                    'is_violation': is_violation,
+                    'room_name': room_name if room_name is not None else '未知',
+                    'room_location': room_location if room_location is not None else '未知'
+                }
+                for (check_in_id, row_student_id, room_id, qrcode_id, reservation_id, row_status, check_in_time,
+                     check_out_time, duration, is_violation, room_name, room_location) in rows
+            ]
+            next_cursor = encode_cursor(rows[-1].check_in_time, rows[-1].id) if has_more else None
             
             return {
                 'success': True,
-                'data': result
+                'data': result,
+                'next_cursor': next_cursor
             }
         except Exception as e:
             return {
                 'success': False,
                 'message': f'获取签到记录失败: {str(e)}'
-            } 
\ No newline at end of file
+            }
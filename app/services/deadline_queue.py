@@ -0,0 +1,138 @@
+import heapq
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from ..models import Reservation
+from ..models.db import db
+from .settings_store import SettingsStore
+
+
+class DeadlineQueue:
+    """预约截止时间的进程内最小堆
+
+    堆中条目为 (到期时间, 类型, 预约 id)，类型为 reminder（开始前提醒）或 no_show（超时未签到）。
+    新预约按 created_at 增量加载，每次回看 SYNC_OVERLAP_MINUTES 分钟并按 id 去重：
+    MySQL 中 id 较小的事务可能晚于 id 较大的事务提交，只按 id 水位加载会漏掉这类预约。
+    已取消或已签到的预约不主动删除，到期时由 ViolationService 的状态条件过滤，
+    下一次全量重建时移出堆。
+    """
+    REMINDER = 'reminder'
+    NO_SHOW = 'no_show'
+    # 增量加载的回看时长，需覆盖预约事务从写入 created_at 到提交的耗时以及各进程的时钟偏差
+    SYNC_OVERLAP_MINUTES = 5
+
+    @staticmethod
+    def _state():
+        state = current_app.extensions.get('reservation_deadlines')
+        if state is None:
+            state = current_app.extensions.setdefault('reservation_deadlines', {
+                'lock': threading.Lock(),
+                'heap': [],
+                # 上次加载的时间，以及回看窗口内已入堆的预约 id
+                'synced_at': None,
+                'recent_ids': set(),
+                # 构建堆时使用的 (提醒提前分钟数, 违约超时分钟数)，None 表示尚未加载
+                'offsets': None
+            })
+        return state
+
+    @staticmethod
+    def _offsets():
+        return (
+            SettingsStore.get_int('REMINDER_BEFORE_MINUTES', 15),
+            SettingsStore.get_int('NO_SHOW_TIMEOUT_MINUTES', 10)
+        )
+
+    @staticmethod
+    def _entries(rows, offsets, now):
+        reminder_before, no_show_after = (timedelta(minutes=m) for m in offsets)
+        for reservation_id, start_time, reminder_sent_at, _ in rows:
+            if reminder_sent_at is None and start_time > now:
+                yield (start_time - reminder_before, DeadlineQueue.REMINDER, reservation_id)
+            yield (start_time + no_show_after, DeadlineQueue.NO_SHOW, reservation_id)
+
+    @staticmethod
+    def _scheduled_rows():
+        return db.session.query(
+            Reservation.id, Reservation.start_time, Reservation.reminder_sent_at, Reservation.created_at
+        ).filter(Reservation.status == 'scheduled')
+
+    @staticmethod
+    def _overlap_start(synced_at):
+        return synced_at - timedelta(minutes=DeadlineQueue.SYNC_OVERLAP_MINUTES)
+
+    @staticmethod
+    def rebuild(now: datetime = None):
+        """从数据库全量重建堆，返回堆中的截止时间数"""
+        now = now or datetime.utcnow()
+        offsets = DeadlineQueue._offsets()
+        rows = DeadlineQueue._scheduled_rows().all()
+        heap = list(DeadlineQueue._entries(rows, offsets, now))
+        heapq.heapify(heap)
+        # 读取期间提交的预约会落在下一次增量加载的回看窗口内，记下窗口内已入堆的 id 以便去重
+        overlap_start = DeadlineQueue._overlap_start(now)
+        recent_ids = {row.id for row in rows if row.created_at is not None and row.created_at >= overlap_start}
+
+        state = DeadlineQueue._state()
+        with state['lock']:
+            state['heap'] = heap
+            state['synced_at'] = now
+            state['recent_ids'] = recent_ids
+            state['offsets'] = offsets
+        return len(heap)
+
+    @staticmethod
+    def sync(now: datetime = None):
+        """增量加载上次加载以来新增的预约
+
+        堆尚未加载或提醒、违约时间配置发生变化时改为全量重建。
+
+        Returns:
+            int: 新加入堆的截止时间数
+        """
+        state = DeadlineQueue._state()
+        offsets = DeadlineQueue._offsets()
+        if state['offsets'] != offsets:
+            return DeadlineQueue.rebuild(now)
+
+        now = now or datetime.utcnow()
+        rows = DeadlineQueue._scheduled_rows().filter(
+            Reservation.created_at >= DeadlineQueue._overlap_start(state['synced_at'])
+        ).all()
+        new_rows = [row for row in rows if row.id not in state['recent_ids']]
+        entries = list(DeadlineQueue._entries(new_rows, offsets, now))
+
+        with state['lock']:
+            for entry in entries:
+                heapq.heappush(state['heap'], entry)
+            # 下一次的回看窗口从本次加载时间往前算，窗口外的 id 不会再被读到
+            state['recent_ids'] = {row.id for row in rows}
+            state['synced_at'] = now
+        return len(entries)
+
+    @staticmethod
+    def pop_due(now: datetime = None):
+        """弹出所有已到期的截止时间，返回弹出的条目"""
+        now = now or datetime.utcnow()
+        state = DeadlineQueue._state()
+        due = []
+        with state['lock']:
+            heap = state['heap']
+            while heap and heap[0][0] <= now:
+                due.append(heapq.heappop(heap))
+        return due
+
+    @staticmethod
+    def push(entries):
+        """把条目放回堆中，用于处理失败后等待下一次触发重试"""
+        state = DeadlineQueue._state()
+        with state['lock']:
+            for entry in entries:
+                heapq.heappush(state['heap'], entry)
+
+    @staticmethod
+    def next_due():
+        """最早的截止时间，堆为空时返回 None"""
+        state = DeadlineQueue._state()
+        with state['lock']:
+            return state['heap'][0][0] if state['heap'] else None
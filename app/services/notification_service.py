@@ -0,0 +1,124 @@
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import and_, case, insert, or_, update
+from ..models import Notification, User
+from ..models.db import db
+from ..utils.cursor import decode_cursor, encode_cursor
+
+
+class NotificationService:
+    """通知收件箱
+
+    users.unread_notifications 与通知写入、标记已读在同一事务中维护，
+    读取未读数只需按主键取一行。
+    """
+    # 每页默认与最大条数
+    DEFAULT_PAGE_SIZE = 50
+    MAX_PAGE_SIZE = 100
+
+    @staticmethod
+    def _bump_unread(per_user):
+        """按用户调整未读数，per_user 为 {user_id: 增量}，一条 UPDATE 完成"""
+        if not per_user:
+            return
+        unread = User.unread_notifications + case(per_user, value=User.id, else_=0)
+        db.session.execute(
+            update(User).where(User.id.in_(per_user)).values(
+                # 绕过本服务直接写入的通知不计数，扣减时不低于 0
+                unread_notifications=case((unread < 0, 0), else_=unread)
+            ).execution_options(synchronize_session=False)
+        )
+
+    @staticmethod
+    def notify_many(notifications, now: datetime = None):
+        """批量写入通知并更新未读数，不提交事务
+
+        Args:
+            notifications: 由 {'user_id', 'message'} 组成的列表
+        """
+        if not notifications:
+            return
+        now = now or datetime.utcnow()
+        db.session.execute(insert(Notification), [
+            {'user_id': n['user_id'], 'message': n['message'], 'is_read': False, 'created_at': now}
+            for n in notifications
+        ])
+        NotificationService._bump_unread(Counter(n['user_id'] for n in notifications))
+
+    @staticmethod
+    def list_notifications(user_id: int, unread_only: bool = False, cursor: str = None, limit: int = None):
+        """按创建时间倒序分页获取用户通知
+
+        翻页使用 (created_at, id) 键集游标，只看未读时沿 ix_notifications_user_read_created 索引定位。
+
+        Returns:
+            dict: data 为本页通知，next_cursor 为下一页游标（没有更多记录时为 None）
+        """
+        try:
+            keyset = decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return {'success': False, 'message': str(e)}
+
+        limit = min(max(limit or NotificationService.DEFAULT_PAGE_SIZE, 1), NotificationService.MAX_PAGE_SIZE)
+        query = Notification.query.filter(Notification.user_id == user_id)
+        if unread_only:
+            query = query.filter(Notification.is_read == False)
+        if keyset:
+            cursor_time, cursor_id = keyset
+            query = query.filter(or_(
+                Notification.created_at < cursor_time,
+                and_(Notification.created_at == cursor_time, Notification.id < cursor_id)
+            ))
+
+        # 多取一条用于判断是否还有下一页
+        rows = query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        return {
+            'success': True,
+            'data': [n.to_dict() for n in rows],
+            'next_cursor': encode_cursor(rows[-1].created_at, rows[-1].id) if has_more else None
+        }
+
+    @staticmethod
+    def unread_count(user_id: int):
+        count = db.session.query(User.unread_notifications).filter(User.id == user_id).scalar()
+        return count or 0
+
+    @staticmethod
+    def mark_read(user_id: int, notification_id: int):
+        """将一条通知标记为已读
+
+        Returns:
+            bool: 通知不存在或不属于该用户时为 False
+        """
+        updated = db.session.execute(
+            update(Notification).where(
+                Notification.id == notification_id,
+                Notification.user_id == user_id,
+                Notification.is_read == False
+            ).values(is_read=True).execution_options(synchronize_session=False)
+        ).rowcount
+        if updated:
+            NotificationService._bump_unread({user_id: -1})
+        elif db.session.query(Notification.id).filter(
+            Notification.id == notification_id, Notification.user_id == user_id
+        ).first() is None:
+            return False
+        db.session.commit()
+        return True
+
+    @staticmethod
+    def mark_all_read(user_id: int):
+        """将用户全部未读通知标记为已读，返回标记的条数"""
+        updated = db.session.execute(
+            update(Notification).where(
+                Notification.user_id == user_id, Notification.is_read == False
+            ).values(is_read=True).execution_options(synchronize_session=False)
+        ).rowcount
+        if updated:
+            # 按实际标记的条数扣减，期间新写入的通知仍计为未读
+            NotificationService._bump_unread({user_id: -updated})
+        db.session.commit()
+        return updated
@@ -0,0 +1,88 @@
+# 自习室实时在座人数：进程内计数随签到、签退即时增减，定期按 check_ins 校正
+import threading
+import time
+from collections import Counter
+from flask import current_app
+from sqlalchemy import func
+from ..models import StudyRoom, CheckIn
+from ..models.db import db
+
+
+class OccupancyService:
+    # 计数超过该秒数未与数据库校正时，读取前先校正一次；其它进程的签到签退最迟在这段时间后可见
+    RECONCILE_SECONDS = 30
+
+    @staticmethod
+    def _state():
+        """当前应用的在座计数，挂在 app.extensions 上"""
+        state = current_app.extensions.get('room_occupancy')
+        if state is None:
+            state = current_app.extensions.setdefault('room_occupancy', {
+                'counts': Counter(),
+                'lock': threading.Lock(),
+                'reconciled_at': None
+            })
+        return state
+
+    @staticmethod
+    def adjust(deltas):
+        """按 {room_id: 增量} 更新计数，签到为正、签退为负，应在事务提交后调用"""
+        state = OccupancyService._state()
+        with state['lock']:
+            counts = state['counts']
+            for room_id, delta in deltas.items():
+                counts[room_id] = max(0, counts[room_id] + delta)
+
+    @staticmethod
+    def reconcile():
+        """用 check_ins 中签到中的记录数重建计数
+
+        Returns:
+            int: 计数与数据库不一致而被校正的自习室数
+        """
+        actual = Counter(dict(
+            db.session.query(CheckIn.room_id, func.count(CheckIn.id)).filter(
+                CheckIn.status == 'checked_in'
+            ).group_by(CheckIn.room_id).all()
+        ))
+
+        state = OccupancyService._state()
+        with state['lock']:
+            counts = state['counts']
+            drifted = sum(1 for room_id in set(counts) | set(actual) if counts[room_id] != actual[room_id])
+            state['counts'] = actual
+            state['reconciled_at'] = time.monotonic()
+        return drifted
+
+    @staticmethod
+    def get_counts():
+        """各自习室当前在座人数 {room_id: count}"""
+        state = OccupancyService._state()
+        reconciled_at = state['reconciled_at']
+        if reconciled_at is None or time.monotonic() - reconciled_at >= OccupancyService.RECONCILE_SECONDS:
+            OccupancyService.reconcile()
+        with state['lock']:
+            return dict(state['counts'])
+
+    @staticmethod
+    def get_all_rooms_occupancy():
+        """所有自习室的在座人数与容量
+
+        Returns:
+            list: 每个自习室的 occupied、capacity、available 与 occupancy_rate，容量未设置时后两者为空
+        """
+        counts = OccupancyService.get_counts()
+        rooms = db.session.query(StudyRoom.id, StudyRoom.name, StudyRoom.capacity).order_by(StudyRoom.id).all()
+
+        result = []
+        for room_id, name, capacity in rooms:
+            occupied = counts.get(room_id, 0)
+            result.append({
+                'room_id': room_id,
+                'room_name': name,
+                'capacity': capacity,
+                'occupied': occupied,
+                'available': max(0, capacity - occupied) if capacity else None,
+                'occupancy_rate': round(occupied / capacity, 4) if capacity else None
+            })
+        return result
@@ -3,16 +3,146 @@ import json
 import base64
 import hmac
 import hashlib
-from ..models import StudyRoom, QRCode
+import struct
+import threading
+import time
+from collections import namedtuple
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import delete, insert, update
+from ..models import StudyRoom, QRCode, CheckIn
 from ..models.db import db
 
+# 缓存中的有效二维码，字段与签到所需的 QRCode 属性一致
+ActiveQRCode = namedtuple('ActiveQRCode', ['id', 'room_id', 'code', 'expires_at'])
+
+
+class RotationSignal:
+    """单个自习室有效二维码的变更通知，该自习室的推送流在此等待而不是轮询数据库"""
+
+    def __init__(self):
+        self.version = 0
+        self._condition = threading.Condition()
+
+    def notify(self):
+        with self._condition:
+            self.version += 1
+            self._condition.notify_all()
+
+    def wait(self, seen_version, timeout):
+        """等待版本号离开 seen_version 或超时，返回当前版本号"""
+        with self._condition:
+            self._condition.wait_for(lambda: self.version != seen_version, timeout)
+            return self.version
+
+
 class QRCodeService:
     # 用于签名的密钥，实际应用中应从配置中读取
     SECRET_KEY = 'study_spot_qrcode_secret_key'
+    # 紧凑格式：版本号、room_id、过期时间的 UTC 秒数、原始 UUID 字节，后接截断的 HMAC-SHA256
+    COMPACT_VERSION = 1
+    COMPACT_HEADER = struct.Struct('>BII16s')
+    COMPACT_MAC_BYTES = 16
+    # 41 字节经无填充的 URL 安全 Base64 编码后的长度；旧格式（Base64 JSON）远长于此
+    COMPACT_ENCODED_LENGTH = 55
+    _EPOCH = datetime(1970, 1, 1)
+    # 预先处理密钥的 HMAC 对象，每次签名只需 copy()
+    _COMPACT_HMAC = hmac.new(SECRET_KEY.encode(), digestmod=hashlib.sha256)
+    # 缓存条目超过该秒数后回库确认一次，限制其它进程手动轮换后旧码仍被接受的时间
+    ACTIVE_CODE_TTL = 30
+    # 当前二维码剩余有效期不超过该分钟数时预先生成下一张并开始展示，旧码继续有效至过期；
+    # 刷新任务每分钟运行一次，重叠窗口需大于任务间隔
+    ROTATION_OVERLAP_MINUTES = 2
+    # 清理任务每批删除的行数与单次运行最多处理的批数
+    PRUNE_BATCH_SIZE = 1000
+    PRUNE_MAX_BATCHES = 50
+    # 推送流票据的有效期（秒），只用于建立连接，断线重连时重新申请
+    STREAM_TICKET_SECONDS = 60
+
+    @staticmethod
+    def _active_codes():
+        """当前应用的有效二维码缓存 room_id -> (缓存时间, 按过期时间升序的 ActiveQRCode)，挂在 app.extensions 上"""
+        return current_app.extensions.setdefault('qrcode_active_codes', {})
+
+    @staticmethod
+    def rotation_signal(room_id):
+        """自习室的二维码变更通知，只在该自习室缓存的二维码发生变化时触发"""
+        signals = current_app.extensions.setdefault('qrcode_rotation_signals', {})
+        signal = signals.get(room_id)
+        if signal is None:
+            signal = signals.setdefault(room_id, RotationSignal())
+        return signal
+
+    @staticmethod
+    def _stream_ticket_serializer():
+        return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='qrcode-stream')
+
+    @staticmethod
+    def issue_stream_ticket(room_id, user_id):
+        """签发只能订阅指定自习室推送流的短期票据，代替放在查询参数中的访问令牌"""
+        return QRCodeService._stream_ticket_serializer().dumps({'room_id': room_id, 'user_id': user_id})
+
+    @staticmethod
+    def verify_stream_ticket(ticket, room_id):
+        """校验推送流票据，返回签发时的用户ID；票据无效、过期或不属于该自习室时返回 None"""
+        try:
+            payload = QRCodeService._stream_ticket_serializer().loads(
+                ticket, max_age=QRCodeService.STREAM_TICKET_SECONDS
+            )
+        except BadSignature:
+            return None
+        if payload.get('room_id') != room_id:
+            return None
+        return payload.get('user_id')
+
+    @staticmethod
+    def _store_room_codes(room_id, cached_at, codes):
+        """写入缓存条目；二维码与原条目不同时通知该自习室的推送流，仅刷新缓存时间时不通知"""
+        codes = tuple(sorted(codes, key=lambda c: c.expires_at))
+        previous = QRCodeService._active_codes().get(room_id)
+        QRCodeService._active_codes()[room_id] = (cached_at, codes)
+        if previous is None or previous[1] != codes:
+            QRCodeService.rotation_signal(room_id).notify()
+
+    @staticmethod
+    def _cache_room_codes(room_id, codes):
+        """整体替换自习室的缓存条目，轮换时旧码随之移出"""
+        QRCodeService._store_room_codes(room_id, time.monotonic(), codes)
+
+    @staticmethod
+    def _remember_code(active):
+        """把回库验证通过的二维码并入缓存；条目已过期时以它重新建立条目"""
+        entry = QRCodeService._active_codes().get(active.room_id)
+        if entry is None or time.monotonic() - entry[0] >= QRCodeService.ACTIVE_CODE_TTL:
+            QRCodeService._cache_room_codes(active.room_id, [active])
+            return
+        codes = [c for c in entry[1] if c.id != active.id] + [active]
+        QRCodeService._store_room_codes(active.room_id, entry[0], codes)
+
+    @staticmethod
+    def _fresh_room_codes(room_id, now):
+        """缓存条目仍在有效期内时返回自习室未过期的二维码，否则返回 None"""
+        entry = QRCodeService._active_codes().get(room_id)
+        if entry is None or time.monotonic() - entry[0] >= QRCodeService.ACTIVE_CODE_TTL:
+            return None
+        return [c for c in entry[1] if c.expires_at > now]
+
+    @staticmethod
+    def _cached_active_code(room_id, code, now):
+        """缓存中与扫码内容一致且未过期的二维码，未命中时返回 None"""
+        for active in QRCodeService._fresh_room_codes(room_id, now) or ():
+            if active.code == code:
+                return active
+        return None
+
+    @staticmethod
+    def _rotation_overlap(interval: timedelta):
+        """新旧二维码同时有效的时长，不超过刷新间隔的一半"""
+        return min(timedelta(minutes=QRCodeService.ROTATION_OVERLAP_MINUTES), interval / 2)
     
     @staticmethod
     def generate_signature(data):
-        """生成数据签名"""
+        """生成旧格式（Base64 JSON）二维码的数据签名，只用于校验旧码"""
         # 将数据转换为字符串
         data_str = json.dumps(data, sort_keys=True)
         # 使用HMAC-SHA256生成签名
@@ -27,7 +157,36 @@ class QRCodeService:
     def verify_signature(data, signature):
         """验证数据签名"""
         computed_signature = QRCodeService.generate_signature(data)
-        return computed_signature == signature
+        return hmac.compare_digest(computed_signature, str(signature))
+
+    @staticmethod
+    def _compact_mac(body):
+        mac = QRCodeService._COMPACT_HMAC.copy()
+        mac.update(body)
+        return mac.digest()[:QRCodeService.COMPACT_MAC_BYTES]
+
+    @staticmethod
+    def _compact_body(room_id, expires_at, code):
+        return QRCodeService.COMPACT_HEADER.pack(
+            QRCodeService.COMPACT_VERSION,
+            room_id,
+            int((expires_at - QRCodeService._EPOCH).total_seconds()),
+            bytes.fromhex(code)
+        )
+
+    @staticmethod
+    def _signed_qrcode(qrcode_id, room_id, code, expires_at):
+        """组装二维码数据，签名为紧凑格式打包字节的 HMAC（十六进制），不序列化 JSON"""
+        body = QRCodeService._compact_body(room_id, expires_at, code)
+        return {
+            'data': {
+                'room_id': room_id,
+                'code': code,
+                'expires_at': expires_at.isoformat()
+            },
+            'signature': QRCodeService._compact_mac(body).hex(),
+            'qrcode_id': qrcode_id
+        }
     
     @staticmethod
     def generate_room_qrcode(room_id):
@@ -63,90 +222,194 @@ class QRCodeService:
         
         db.session.add(qrcode)
         db.session.commit()
+        QRCodeService._cache_room_codes(room_id, [ActiveQRCode(qrcode.id, room_id, unique_code, expires_at)])
         
-        # 生成二维码数据
-        qrcode_data = {
-            'room_id': room_id,
-            'code': unique_code,
-            'expires_at': expires_at.isoformat()
-        }
-        
-        # 添加签名
-        signature = QRCodeService.generate_signature(qrcode_data)
-        
-        # 返回完整的二维码数据
-        return {
-            'data': qrcode_data,
-            'signature': signature,
-            'qrcode_id': qrcode.id
-        }
+        return QRCodeService._signed_qrcode(qrcode.id, room_id, unique_code, expires_at)
     
+    @staticmethod
+    def refresh_expired_qrcodes(now=None):
+        """按各自习室的 qrcode_refresh_interval 预先轮换二维码
+
+        当前二维码进入重叠窗口（或已没有有效二维码）的自习室提前生成下一张，
+        展示端立即切换到新码，旧码保持有效直到自身过期，边界时刻扫码不会失败。
+        新码从当前最晚的过期时间起算一个周期，轮换节奏不随任务执行时刻漂移。
+        一条 UPDATE 使已过期的二维码失效，两条查询读取自习室与有效二维码，
+        一条批量 INSERT 写入新码并用一条查询取回 id，统一提交一次后整体重建本进程缓存。
+
+        Returns:
+            list: 新二维码 [{'room_id', 'code', 'expires_at'}]
+        """
+        now = now or datetime.utcnow()
+
+        db.session.execute(
+            update(QRCode).where(QRCode.is_active == True, QRCode.expires_at <= now).values(is_active=False)
+        )
+
+        rooms = db.session.query(StudyRoom.id, StudyRoom.qrcode_refresh_interval).all()
+        active = {}
+        for row in db.session.query(QRCode.id, QRCode.room_id, QRCode.code, QRCode.expires_at).filter(
+            QRCode.is_active == True
+        ):
+            active.setdefault(row.room_id, []).append(ActiveQRCode(*row))
+
+        new_codes = []
+        for room_id, interval in rooms:
+            interval = timedelta(minutes=interval or 30)
+            latest = max((c.expires_at for c in active.get(room_id, ())), default=now)
+            if latest - now > QRCodeService._rotation_overlap(interval):
+                continue
+            new_codes.append({
+                'room_id': room_id,
+                'code': QRCode.generate_code(),
+                'is_active': True,
+                'created_at': now,
+                'expires_at': latest + interval
+            })
+
+        if new_codes:
+            # MySQL 不支持 INSERT ... RETURNING：批量插入后按唯一的 code 取回 id
+            db.session.execute(insert(QRCode), new_codes)
+            ids = dict(db.session.query(QRCode.code, QRCode.id).filter(
+                QRCode.code.in_([c['code'] for c in new_codes])
+            ).all())
+            for c in new_codes:
+                active.setdefault(c['room_id'], []).append(
+                    ActiveQRCode(ids[c['code']], c['room_id'], c['code'], c['expires_at'])
+                )
+        db.session.commit()
+
+        for room_id, _ in rooms:
+            QRCodeService._cache_room_codes(room_id, active.get(room_id, ()))
+
+        return [
+            {'room_id': c['room_id'], 'code': c['code'], 'expires_at': c['expires_at']}
+            for c in new_codes
+        ]
+
+    @staticmethod
+    def prune_inactive_qrcodes(retention_days=None, now=None):
+        """分批删除过期超过保留期的失效二维码
+
+        每批按 id 顺序选出至多 PRUNE_BATCH_SIZE 行删除并提交，单次运行最多 PRUNE_MAX_BATCHES 批，
+        避免长事务锁表。仍被 check_ins.qrcode_id 引用的二维码保留。
+
+        Args:
+            retention_days: 保留天数，默认读取配置 QRCODE_RETENTION_DAYS
+
+        Returns:
+            int: 删除的行数
+        """
+        if retention_days is None:
+            retention_days = current_app.config.get('QRCODE_RETENTION_DAYS', 7)
+        cutoff = (now or datetime.utcnow()) - timedelta(days=retention_days)
+
+        referenced = db.session.query(CheckIn.id).filter(CheckIn.qrcode_id == QRCode.id).exists()
+        removed = 0
+        for _ in range(QRCodeService.PRUNE_MAX_BATCHES):
+            ids = [qrcode_id for (qrcode_id,) in db.session.query(QRCode.id).filter(
+                QRCode.is_active == False,
+                QRCode.expires_at < cutoff,
+                ~referenced
+            ).order_by(QRCode.id).limit(QRCodeService.PRUNE_BATCH_SIZE)]
+            if not ids:
+                break
+
+            result = db.session.execute(
+                delete(QRCode).where(QRCode.id.in_(ids)).execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            removed += result.rowcount
+            if len(ids) < QRCodeService.PRUNE_BATCH_SIZE:
+                break
+
+        return removed
+
     @staticmethod
     def get_active_qrcode(room_id):
-        """获取自习室当前有效的二维码
+        """获取自习室当前展示的二维码
         
+        重叠窗口内同时有两张有效二维码，展示最新生成的一张；优先读取本进程缓存。
+
         Args:
             room_id: 自习室ID
             
         Returns:
             dict: 包含二维码信息的字典，如果没有有效二维码则生成新的
         """
-        # 查找当前有效的二维码
-        qrcode = QRCode.query.filter_by(
-            room_id=room_id,
-            is_active=True
-        ).order_by(QRCode.created_at.desc()).first()
-        
-        # 如果没有有效二维码或二维码已过期，则生成新的
-        if not qrcode or qrcode.is_expired():
-            return QRCodeService.generate_room_qrcode(room_id)
-        
-        # 生成二维码数据
-        qrcode_data = {
-            'room_id': room_id,
-            'code': qrcode.code,
-            'expires_at': qrcode.expires_at.isoformat()
-        }
-        
-        # 添加签名
-        signature = QRCodeService.generate_signature(qrcode_data)
-        
-        # 返回完整的二维码数据
-        return {
-            'data': qrcode_data,
-            'signature': signature,
-            'qrcode_id': qrcode.id
-        }
+        now = datetime.utcnow()
+        codes = QRCodeService._fresh_room_codes(room_id, now)
+        if not codes:
+            codes = [
+                ActiveQRCode(q.id, q.room_id, q.code, q.expires_at)
+                for q in QRCode.query.filter(
+                    QRCode.room_id == room_id,
+                    QRCode.is_active == True,
+                    QRCode.expires_at > now
+                ).all()
+            ]
+            # 没有有效二维码时才生成新的
+            if not codes:
+                return QRCodeService.generate_room_qrcode(room_id)
+            QRCodeService._cache_room_codes(room_id, codes)
+
+        qrcode = max(codes, key=lambda c: c.expires_at)
+        return QRCodeService._signed_qrcode(qrcode.id, room_id, qrcode.code, qrcode.expires_at)
     
     @staticmethod
     def encode_qrcode_for_display(qrcode_data):
-        """将二维码数据编码为适合显示的格式
-        
+        """将二维码数据编码为适合显示的紧凑格式
+
+        按 COMPACT_HEADER 打包 room_id、过期时间和原始 UUID，附加截断的 HMAC，
+        再做无填充的 URL 安全 Base64 编码，得到 55 个字符的字符串。
+        签名直接作用于打包后的字节，不再需要序列化 JSON。
+
         Args:
-            qrcode_data: 二维码数据字典
+            qrcode_data: 二维码数据字典，data 中包含 room_id、code、expires_at
             
         Returns:
-            str: Base64编码的二维码字符串
+            str: 紧凑格式的二维码字符串
         """
-        # 将二维码数据转换为JSON字符串
-        json_data = json.dumps(qrcode_data)
-        
-        # Base64编码
-        encoded_data = base64.b64encode(json_data.encode()).decode()
-        
-        return encoded_data
+        data = qrcode_data['data']
+        expires_at = data['expires_at']
+        if isinstance(expires_at, str):
+            expires_at = datetime.fromisoformat(expires_at)
+
+        body = QRCodeService._compact_body(data['room_id'], expires_at, data['code'])
+        raw = body + QRCodeService._compact_mac(body)
+        return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
     
+    @staticmethod
+    def _decode_compact(encoded_data):
+        raw = base64.urlsafe_b64decode(encoded_data + '=')
+        header_size = QRCodeService.COMPACT_HEADER.size
+        if len(raw) != header_size + QRCodeService.COMPACT_MAC_BYTES or raw[0] != QRCodeService.COMPACT_VERSION:
+            return None
+        _, room_id, expires_ts, code = QRCodeService.COMPACT_HEADER.unpack_from(raw)
+        return {
+            'version': QRCodeService.COMPACT_VERSION,
+            'data': {
+                'room_id': room_id,
+                'code': code.hex(),
+                'expires_at': (QRCodeService._EPOCH + timedelta(seconds=expires_ts)).isoformat()
+            },
+            'signed': raw[:header_size],
+            'signature': raw[header_size:]
+        }
+
     @staticmethod
     def decode_qrcode(encoded_data):
-        """解码二维码数据
+        """解码二维码数据，同时支持紧凑格式和旧的 Base64 JSON 格式
         
         Args:
-            encoded_data: Base64编码的二维码字符串
+            encoded_data: 二维码字符串
             
         Returns:
-            dict: 二维码数据字典
+            dict: 二维码数据字典，紧凑格式带有 version 字段
         """
         try:
+            if len(encoded_data) == QRCodeService.COMPACT_ENCODED_LENGTH:
+                return QRCodeService._decode_compact(encoded_data)
+
             # Base64解码
             json_data = base64.b64decode(encoded_data.encode()).decode()
             
@@ -160,12 +423,15 @@ class QRCodeService:
     @staticmethod
     def verify_qrcode(encoded_data):
         """验证二维码有效性
-        
+
+        扫码内容与本进程缓存的自习室有效二维码（重叠窗口内新旧两张）之一一致时
+        直接通过，不访问数据库；缓存未命中或二维码已轮换时回库查询。
+
         Args:
-            encoded_data: Base64编码的二维码字符串
+            encoded_data: 二维码字符串，紧凑格式或旧的 Base64 JSON 格式
             
         Returns:
-            tuple: (是否有效, 错误消息, 二维码对象)
+            tuple: (是否有效, 错误消息, 二维码对象)，命中缓存时二维码对象为 ActiveQRCode
         """
         # 解码二维码数据
         qrcode_data = QRCodeService.decode_qrcode(encoded_data)
@@ -179,7 +445,12 @@ class QRCodeService:
         if not signature or not data:
             return False, "二维码数据不完整", None
         
-        if not QRCodeService.verify_signature(data, signature):
+        # 紧凑格式的 signed 为原始字节，JSON 无法伪造出这一类型
+        if isinstance(qrcode_data.get('signed'), bytes):
+            signature_valid = hmac.compare_digest(QRCodeService._compact_mac(qrcode_data['signed']), signature)
+        else:
+            signature_valid = QRCodeService.verify_signature(data, signature)
+        if not signature_valid:
             return False, "二维码验证失败，可能已被篡改", None
         
         # 获取二维码信息
@@ -197,8 +468,14 @@ class QRCodeService:
             return False, "二维码格式错误", None
         
         # 检查是否过期
-        if datetime.utcnow() > expires_at:
+        now = datetime.utcnow()
+        if now > expires_at:
             return False, "二维码已过期", None
+
+        # 与缓存的当前二维码一致则无需查库
+        active = QRCodeService._cached_active_code(room_id, code, now)
+        if active is not None:
+            return True, None, active
         
         # 验证二维码是否存在且有效
         qrcode = QRCode.query.filter_by(
@@ -209,6 +486,7 @@ class QRCodeService:
         
         if not qrcode:
             return False, "无效的二维码", None
+        QRCodeService._remember_code(ActiveQRCode(qrcode.id, qrcode.room_id, qrcode.code, qrcode.expires_at))
         
         # 所有验证通过
         return True, None, qrcode 
\ No newline at end of file
@@ -0,0 +1,175 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from ..models import StudentPreference, TimeSlot, Seat
+from ..models.db import db
+from .seat_index import SeatIndex
+
+
+class RecommendationService:
+    # 每批重算画像的学生数
+    REFRESH_BATCH_SIZE = 500
+    # 按 time_slots.updated_at 找变更时向前回看的分钟数，覆盖提交晚于写入时间的事务；须小于任务间隔
+    REFRESH_LOOKBACK_MINUTES = 5
+    # 只在最常去的几个自习室中挑选座位
+    CANDIDATE_ROOMS = 3
+    # 常用时段没有空位时，向后顺延尝试的小时数
+    FALLBACK_HOURS = 3
+
+    @staticmethod
+    def _reset(profile):
+        profile.room_counts = {}
+        profile.seat_counts = {}
+        profile.hour_counts = [0] * 24
+        profile.total_slots = 0
+        profile.power_slots = 0
+        profile.total_minutes = 0
+        return profile
+
+    @staticmethod
+    def _new_profile(user_id):
+        return RecommendationService._reset(StudentPreference(user_id=user_id))
+
+    @staticmethod
+    def _accumulate(profile, rows):
+        """把一组预约记录累加到画像，rows 为 (slot_id, room_id, seat_id, start_time, end_time, has_power)"""
+        room_counts = dict(profile.room_counts)
+        seat_counts = dict(profile.seat_counts)
+        hour_counts = list(profile.hour_counts)
+
+        for _, room_id, seat_id, start_time, end_time, has_power in rows:
+            room_counts[str(room_id)] = room_counts.get(str(room_id), 0) + 1
+            seat_counts[str(seat_id)] = seat_counts.get(str(seat_id), 0) + 1
+            hour_counts[start_time.hour] += 1
+            profile.total_slots += 1
+            profile.power_slots += 1 if has_power else 0
+            profile.total_minutes += int((end_time - start_time).total_seconds() // 60)
+
+        # JSON 列整体赋新对象，保证变更被 ORM 识别
+        profile.room_counts = room_counts
+        profile.seat_counts = seat_counts
+        profile.hour_counts = hour_counts
+
+    @staticmethod
+    def _slot_rows():
+        return db.session.query(
+            TimeSlot.id, TimeSlot.room_id, TimeSlot.seat_id, TimeSlot.start_time, TimeSlot.end_time, Seat.has_power
+        ).join(Seat, TimeSlot.seat_id == Seat.id).filter(TimeSlot.is_reserved == True)
+
+    @staticmethod
+    def refresh_profiles(now: datetime = None):
+        """重算预约有变化的学生的偏好画像
+
+        以画像 refreshed_at 的最大值为水位，回看 REFRESH_LOOKBACK_MINUTES 后按 time_slots.updated_at
+        找出有变化的时间块（新预约、复用旧时间块、取消），对其 reserved_by 学生按当前预约整体重算，
+        因此取消的预约会被扣除，乱序提交的事务也不会漏掉。每批单独提交，避免一次长事务持有大量行锁；
+        前面的批次沿用旧水位，只有最后一批写入 now，中途失败时下次仍从旧水位整体重算。
+
+        Returns:
+            int: 本次重算画像的学生数
+        """
+        now = now or datetime.utcnow()
+        watermark = db.session.query(func.max(StudentPreference.refreshed_at)).scalar()
+
+        changed = db.session.query(TimeSlot.reserved_by).filter(TimeSlot.reserved_by.isnot(None))
+        if watermark is not None:
+            changed = changed.filter(
+                TimeSlot.updated_at >= watermark - timedelta(minutes=RecommendationService.REFRESH_LOOKBACK_MINUTES)
+            )
+        user_ids = sorted({user_id for (user_id,) in changed.distinct()})
+
+        batch_size = RecommendationService.REFRESH_BATCH_SIZE
+        for offset in range(0, len(user_ids), batch_size):
+            batch = user_ids[offset:offset + batch_size]
+            refreshed_at = now if offset + batch_size >= len(user_ids) else watermark
+            by_user = {}
+            for row in RecommendationService._slot_rows().add_columns(TimeSlot.reserved_by).filter(
+                TimeSlot.reserved_by.in_(batch)
+            ).order_by(TimeSlot.id):
+                by_user.setdefault(row[-1], []).append(row[:-1])
+
+            profiles = {
+                p.user_id: p for p in StudentPreference.query.filter(StudentPreference.user_id.in_(batch)).all()
+            }
+            for user_id in batch:
+                profile = profiles.get(user_id)
+                if profile is None:
+                    profile = RecommendationService._new_profile(user_id)
+                    db.session.add(profile)
+                else:
+                    RecommendationService._reset(profile)
+                RecommendationService._accumulate(profile, by_user.get(user_id, []))
+                profile.refreshed_at = refreshed_at
+
+            db.session.commit()
+
+        return len(user_ids)
+
+    @staticmethod
+    def get_profile(user_id: int):
+        """读取学生画像；定时任务尚未覆盖的学生临时从预约历史构建，不落库"""
+        profile = db.session.get(StudentPreference, user_id)
+        if profile is not None:
+            return profile
+
+        profile = RecommendationService._new_profile(user_id)
+        rows = RecommendationService._slot_rows().filter(TimeSlot.reserved_by == user_id).all()
+        RecommendationService._accumulate(profile, rows)
+        return profile
+
+    @staticmethod
+    def _rank_free_seats(profile, start: datetime, end: datetime):
+        needs_power = profile.needs_power()
+        ranked = []
+        for room_id, room_count in profile.top_rooms(RecommendationService.CANDIDATE_ROOMS):
+            occupancy = SeatIndex.get_room(room_id)
+            if occupancy is None or not occupancy.covers(start):
+                continue
+            free = occupancy.free_mask(start, end)
+            for (seat_id, seat_number, has_power), is_free in zip(occupancy.seats, free):
+                if not is_free or (needs_power and not has_power):
+                    continue
+                # 常去的自习室与坐过的座位得分更高
+                score = (room_count + profile.seat_counts.get(str(seat_id), 0)) / profile.total_slots
+                ranked.append((score, room_id, seat_id, seat_number, has_power))
+
+        ranked.sort(key=lambda item: (-item[0], item[1], item[2]))
+        return ranked
+
+    @staticmethod
+    def recommend(user_id: int, limit: int = 3, now: datetime = None):
+        """按学生偏好推荐最近一次常用时段内的空闲座位
+
+        Returns:
+            list: 按得分排序的推荐列表，没有预约历史或没有合适空位时为空
+        """
+        profile = RecommendationService.get_profile(user_id)
+        if not profile.total_slots:
+            return []
+
+        now = now or datetime.utcnow()
+        minutes = profile.total_minutes / profile.total_slots
+        duration = timedelta(minutes=min(120, max(15, round(minutes / 15) * 15)))
+
+        # 常用开始时间的下一次出现：今天已过则顺延到明天，按日期运算避免跨月出错
+        start = now.replace(hour=profile.usual_hour(), minute=0, second=0, microsecond=0)
+        if start <= now:
+            start += timedelta(days=1)
+
+        for shift in range(RecommendationService.FALLBACK_HOURS + 1):
+            slot_start = start + timedelta(hours=shift)
+            ranked = RecommendationService._rank_free_seats(profile, slot_start, slot_start + duration)
+            if ranked:
+                return [
+                    {
+                        "seat_id": seat_id,
+                        "room_id": room_id,
+                        "seat_number": seat_number,
+                        "has_power": has_power,
+                        "score": round(score, 4),
+                        "suggested_start_time": slot_start.isoformat(),
+                        "suggested_end_time": (slot_start + duration).isoformat()
+                    }
+                    for score, room_id, seat_id, seat_number, has_power in ranked[:limit]
+                ]
+
+        return []
@@ -0,0 +1,352 @@
+# 进程内座位占用索引：按教室缓存各座位已预约的时间区间，搜索接口不再逐次查询 time_slots
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, update
+from sqlalchemy.orm import Session
+from ..models import Seat, TimeSlot
+from ..models.db import db
+
+
+class RoomOccupancy:
+    """单个教室的占用索引
+
+    每个座位保存合并后、按开始时间排序且互不重叠的已预约区间，
+    重叠判断用二分查找完成，复杂度 O(log n)。
+    """
+
+    def __init__(self, room_id, fingerprint, seats, window_start):
+        self.room_id = room_id
+        # (座位数, 座位版本号之和, 最大座位ID)，与数据库比对判断索引是否过期
+        self.fingerprint = fingerprint
+        # [(seat_id, seat_number, has_power)]，按 seat_id 排序
+        self.seats = seats
+        # 只索引 end_time 晚于该时间的预约，更早的查询交回数据库处理
+        self.window_start = window_start
+        self.checked_at = time.monotonic()
+        # seat_id -> (starts, ends)，整体替换而非原地修改，读线程无需加锁
+        self._intervals = {}
+        # 当天起点（UTC）-> 打包后的日占用位图，形状 (座位数, BUCKETS_PER_DAY / 8)，区间变更时清空
+        self._grids = {}
+        # 区间每次变更递增；位图计算期间发生变更时不写入缓存，避免缓存过期的位图
+        self._version = 0
+        self._grid_lock = threading.Lock()
+
+    def covers(self, start: datetime):
+        """查询区间是否落在索引窗口内"""
+        return start >= self.window_start
+
+    def intervals(self, seat_id):
+        """返回座位合并后的 (starts, ends) 两个有序列表"""
+        return self._intervals.get(seat_id, ((), ()))
+
+    def add(self, seat_id, start: datetime, end: datetime):
+        """插入一个已预约区间，并与相邻或重叠的区间合并"""
+        starts, ends = self.intervals(seat_id)
+        # 与新区间重叠或相接的区间下标范围 [lo, hi)
+        lo = bisect_left(ends, start)
+        hi = bisect_right(starts, end)
+        if lo < hi:
+            start = min(start, starts[lo])
+            end = max(end, ends[hi - 1])
+        self._intervals[seat_id] = (
+            list(starts[:lo]) + [start] + list(starts[hi:]),
+            list(ends[:lo]) + [end] + list(ends[hi:])
+        )
+        with self._grid_lock:
+            self._version += 1
+            self._grids = {}
+
+    def is_free(self, seat_id, start: datetime, end: datetime):
+        """座位在 [start, end) 内是否没有任何预约"""
+        starts, ends = self.intervals(seat_id)
+        # 开始时间早于 end 的最后一个区间；区间互不重叠，它的结束时间也是其中最晚的
+        idx = bisect_left(starts, end) - 1
+        return idx < 0 or ends[idx] <= start
+
+    def first_gap(self, seat_id, start: datetime, end: datetime, duration: timedelta):
+        """在 [start, end) 内扫描座位的已预约区间，返回第一个长度不小于 duration 的空闲起点，没有则返回 None"""
+        starts, ends = self.intervals(seat_id)
+        cursor = start
+        # 跳过在 start 之前已经结束的区间
+        for idx in range(bisect_right(ends, start), len(starts)):
+            if starts[idx] >= end or starts[idx] - cursor >= duration:
+                break
+            cursor = max(cursor, ends[idx])
+        return cursor if end - cursor >= duration else None
+
+    def day_grid(self, day_start: datetime):
+        """整间教室从 day_start 起 24 小时的占用位图
+
+        第 i 行对应 self.seats[i]，每一位对应一个时间桶，桶内只要有预约即置 1。
+        按 BUCKETS_PER_DAY 位打包为 uint8，每个座位 12 字节。
+        day_start 为 UTC 时间，本地日期的网格传入本地零点换算后的时刻。
+        """
+        grid = self._grids.get(day_start)
+        if grid is not None:
+            return grid
+
+        version = self._version
+        day_end = day_start + timedelta(days=1)
+        bucket = timedelta(minutes=Seat.BUCKET_MINUTES)
+        bits = np.zeros((len(self.seats), Seat.BUCKETS_PER_DAY), dtype=bool)
+
+        for row, (seat_id, _, _) in enumerate(self.seats):
+            starts, ends = self.intervals(seat_id)
+            # 只遍历与当天相交的区间
+            for idx in range(bisect_right(ends, day_start), bisect_left(starts, day_end)):
+                first = (max(starts[idx], day_start) - day_start) // bucket
+                last = -((day_start - min(ends[idx], day_end)) // bucket)
+                bits[row, first:last] = True
+
+        grid = np.packbits(bits, axis=1)
+        with self._grid_lock:
+            if self._version == version:
+                self._grids = {**self._grids, day_start: grid}
+        return grid
+
+    def free_mask(self, start: datetime, end: datetime):
+        """[start, end) 内整间教室每个座位是否空闲，返回与 self.seats 对齐的布尔数组
+
+        完全落在查询区间内的时间桶只要有占用，座位必然冲突，对全教室做一次按位与即可得出；
+        只有首尾两个部分覆盖的时间桶无法仅凭位图判断，交给区间二分精确核对。
+        """
+        day_start = datetime.combine(start.date(), datetime.min.time())
+        if not self.seats or end <= start or end > day_start + timedelta(days=1):
+            # 跨天或非法区间：逐座位按区间判断
+            return np.array([self.is_free(seat_id, start, end) for seat_id, _, _ in self.seats], dtype=bool)
+
+        bucket = timedelta(minutes=Seat.BUCKET_MINUTES)
+        touched_first = (start - day_start) // bucket
+        touched_last = -((day_start - end) // bucket)
+        full_first = -((day_start - start) // bucket)
+        full_last = (end - day_start) // bucket
+
+        full = np.zeros(Seat.BUCKETS_PER_DAY, dtype=bool)
+        full[full_first:full_last] = True
+        edge = np.zeros(Seat.BUCKETS_PER_DAY, dtype=bool)
+        edge[touched_first:touched_last] = True
+        edge &= ~full
+
+        grid = self.day_grid(day_start)
+        busy = (grid & np.packbits(full)).any(axis=1)
+        unsure = ~busy & (grid & np.packbits(edge)).any(axis=1)
+
+        free = ~busy & ~unsure
+        for row in np.flatnonzero(unsure):
+            free[row] = self.is_free(self.seats[row][0], start, end)
+        return free
+
+
+class SeatIndex:
+    # 两次向数据库核对版本的最短间隔（秒），间隔内的读请求完全不访问数据库
+    VERSION_CHECK_SECONDS = 2
+
+    @staticmethod
+    def _registry():
+        """当前应用的索引表，挂在 app.extensions 上，保证每个应用实例互不干扰"""
+        registry = current_app.extensions.get('seat_index')
+        if registry is None:
+            registry = current_app.extensions.setdefault('seat_index', {
+                'lock': threading.Lock(),
+                'rooms': {},
+                # 教室占用发生变化时的回调，参数为 room_id（None 表示全部教室）
+                'listeners': []
+            })
+        return registry
+
+    @staticmethod
+    def subscribe(callback):
+        """登记教室占用变化的回调，供依赖占用数据的上层缓存及时失效"""
+        listeners = SeatIndex._registry()['listeners']
+        if callback not in listeners:
+            listeners.append(callback)
+
+    @staticmethod
+    def _notify(registry, room_ids):
+        for callback in list(registry['listeners']):
+            for room_id in room_ids:
+                callback(room_id)
+
+    @staticmethod
+    def _fingerprint(room_id):
+        row = db.session.query(
+            func.count(Seat.id),
+            func.coalesce(func.sum(Seat.slot_version), 0),
+            func.max(Seat.id)
+        ).filter(Seat.room_id == room_id).one()
+        return tuple(row)
+
+    @staticmethod
+    def _load(room_id, fingerprint, window_start=None):
+        if window_start is None:
+            window_start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        seats = db.session.query(Seat.id, Seat.seat_number, Seat.has_power).filter(
+            Seat.room_id == room_id
+        ).order_by(Seat.id).all()
+
+        occupancy = RoomOccupancy(room_id, fingerprint, [tuple(s) for s in seats], window_start)
+
+        slots = db.session.query(TimeSlot.seat_id, TimeSlot.start_time, TimeSlot.end_time).filter(
+            TimeSlot.room_id == room_id,
+            TimeSlot.is_reserved == True,
+            TimeSlot.end_time > window_start
+        ).order_by(TimeSlot.seat_id, TimeSlot.start_time).all()
+
+        for seat_id, start_time, end_time in slots:
+            occupancy.add(seat_id, start_time, end_time)
+
+        return occupancy
+
+    @staticmethod
+    def get_room(room_id: int):
+        """获取教室的最新占用索引
+
+        Returns:
+            RoomOccupancy: 教室占用索引；教室不存在或没有座位时返回 None
+        """
+        registry = SeatIndex._registry()
+        occupancy = registry['rooms'].get(room_id)
+
+        if occupancy is not None and time.monotonic() - occupancy.checked_at < SeatIndex.VERSION_CHECK_SECONDS:
+            return occupancy
+
+        fingerprint = SeatIndex._fingerprint(room_id)
+        if fingerprint[0] == 0:
+            with registry['lock']:
+                dropped = registry['rooms'].pop(room_id, None)
+            if dropped is not None:
+                SeatIndex._notify(registry, [room_id])
+            return None
+
+        if occupancy is not None and occupancy.fingerprint == fingerprint:
+            occupancy.checked_at = time.monotonic()
+            return occupancy
+
+        stale = occupancy is not None
+        occupancy = SeatIndex._load(room_id, fingerprint)
+        with registry['lock']:
+            registry['rooms'][room_id] = occupancy
+        if stale:
+            # 其它进程写入导致重载
+            SeatIndex._notify(registry, [room_id])
+        return occupancy
+
+    @staticmethod
+    def get_room_for_day(room_id: int, day_start: datetime):
+        """获取能覆盖从 day_start 起一天的占用索引；早于索引窗口的日期临时从数据库构建，不写入缓存"""
+        occupancy = SeatIndex.get_room(room_id)
+        if occupancy is None or occupancy.covers(day_start):
+            return occupancy
+        return SeatIndex._load(room_id, occupancy.fingerprint, window_start=day_start)
+
+    @staticmethod
+    def invalidate(room_id=None):
+        """丢弃教室（或全部教室）的索引，下一次读取时重新加载
+
+        绕过 ORM 的批量 UPDATE/DELETE 修改座位或时间块后需要手动调用。
+        """
+        registry = SeatIndex._registry()
+        with registry['lock']:
+            if room_id is None:
+                registry['rooms'].clear()
+            else:
+                registry['rooms'].pop(room_id, None)
+        SeatIndex._notify(registry, [room_id])
+
+    @staticmethod
+    def record_version_bump(session, room_id, seat_id):
+        """登记已由调用方在当前事务中手动递增过版本号的座位，避免 flush 时重复递增"""
+        changes = session.info.setdefault('seat_index_changes', {})
+        change = changes.setdefault(room_id, {'seats': set(), 'intervals': [], 'reload': False})
+        change['seats'].add(seat_id)
+        session.info.setdefault('seat_index_bumped', set()).add(seat_id)
+
+    @staticmethod
+    def _apply(changes):
+        """事务提交后把本进程的写入同步到索引"""
+        registry = SeatIndex._registry()
+        with registry['lock']:
+            for room_id, change in changes.items():
+                occupancy = registry['rooms'].get(room_id)
+                if occupancy is None:
+                    continue
+                if change['reload']:
+                    registry['rooms'].pop(room_id, None)
+                    continue
+                for seat_id, start, end in change['intervals']:
+                    occupancy.add(seat_id, start, end)
+                # 本进程的版本号递增已计入指纹，其它进程的写入仍会让指纹对不上而触发重载
+                count, version_sum, max_id = occupancy.fingerprint
+                occupancy.fingerprint = (count, version_sum + len(change['seats']), max_id)
+        SeatIndex._notify(registry, list(changes))
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_slot_changes(session, flush_context, instances):
+    """收集本次 flush 涉及的座位与时间块变更"""
+    changes = session.info.setdefault('seat_index_changes', {})
+
+    def room_change(room_id):
+        return changes.setdefault(room_id, {'seats': set(), 'intervals': [], 'reload': False})
+
+    for obj in session.new:
+        if isinstance(obj, TimeSlot):
+            change = room_change(obj.room_id)
+            if obj.seat_id is None:
+                change['reload'] = True
+                continue
+            change['seats'].add(obj.seat_id)
+            if obj.is_reserved:
+                change['intervals'].append((obj.seat_id, obj.start_time, obj.end_time))
+        elif isinstance(obj, Seat):
+            room_change(obj.room_id)['reload'] = True
+
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, TimeSlot):
+            change = room_change(obj.room_id)
+            change['reload'] = True
+            if obj.seat_id is not None:
+                change['seats'].add(obj.seat_id)
+        elif isinstance(obj, Seat):
+            change = room_change(obj.room_id)
+            change['reload'] = True
+            if obj in session.dirty and session.is_modified(obj):
+                change['seats'].add(obj.id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _bump_seat_versions(session, flush_context):
+    """在同一事务内递增受影响座位的版本号，通知其它进程的索引失效"""
+    changes = session.info.get('seat_index_changes')
+    if not changes:
+        return
+    bumped = session.info.setdefault('seat_index_bumped', set())
+    seat_ids = set()
+    for change in changes.values():
+        seat_ids |= change['seats'] - bumped
+    if seat_ids:
+        session.connection().execute(
+            update(Seat.__table__).where(Seat.__table__.c.id.in_(seat_ids)).values(
+                slot_version=Seat.__table__.c.slot_version + 1
+            )
+        )
+        bumped |= seat_ids
+
+
+@event.listens_for(Session, 'after_commit')
+def _apply_slot_changes(session):
+    changes = session.info.pop('seat_index_changes', None)
+    session.info.pop('seat_index_bumped', None)
+    if changes and has_app_context():
+        SeatIndex._apply(changes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_slot_changes(session):
+    session.info.pop('seat_index_changes', None)
+    session.info.pop('seat_index_bumped', None)
@@ -0,0 +1,94 @@
+import threading
+import time
+import uuid
+from flask import current_app
+from sqlalchemy import insert, update
+from ..models import SystemSetting
+from ..models.db import db
+
+
+class SettingsStore:
+    """system_settings 的进程内缓存
+
+    一次查询加载全部配置，读操作直接访问内存。配置修改时更新版本行，
+    其它进程在下次核对版本时发现变化并整体重新加载。
+    """
+    # 保存版本令牌的保留配置项，不对管理员开放
+    VERSION_KEY = '_SETTINGS_VERSION'
+    # 两次向数据库核对版本的最短间隔（秒）
+    VERSION_CHECK_SECONDS = 5
+
+    @staticmethod
+    def _state():
+        state = current_app.extensions.get('system_settings')
+        if state is None:
+            state = current_app.extensions.setdefault('system_settings', {
+                'lock': threading.Lock(),
+                'values': None,
+                'version': None,
+                'checked_at': 0.0
+            })
+        return state
+
+    @staticmethod
+    def _load(state):
+        values = dict(db.session.query(SystemSetting.key, SystemSetting.value).all())
+        version = values.pop(SettingsStore.VERSION_KEY, None)
+        with state['lock']:
+            state['values'] = values
+            state['version'] = version
+            state['checked_at'] = time.monotonic()
+        return values
+
+    @staticmethod
+    def _values():
+        state = SettingsStore._state()
+        values = state['values']
+        if values is None:
+            return SettingsStore._load(state)
+        if time.monotonic() - state['checked_at'] < SettingsStore.VERSION_CHECK_SECONDS:
+            return values
+
+        version = db.session.query(SystemSetting.value).filter(
+            SystemSetting.key == SettingsStore.VERSION_KEY
+        ).scalar()
+        if version != state['version']:
+            return SettingsStore._load(state)
+        state['checked_at'] = time.monotonic()
+        return values
+
+    @staticmethod
+    def get(key, default=None, cast=str):
+        """读取配置并转换类型，配置不存在或无法转换时返回默认值"""
+        value = SettingsStore._values().get(key)
+        if value is None:
+            return default
+        try:
+            return cast(value)
+        except (ValueError, TypeError):
+            return default
+
+    @staticmethod
+    def get_int(key, default):
+        return SettingsStore.get(key, default, cast=int)
+
+    @staticmethod
+    def bump_version():
+        """在当前事务中更新版本令牌，随配置修改一起提交"""
+        token = uuid.uuid4().hex
+        updated = db.session.execute(
+            update(SystemSetting).where(SystemSetting.key == SettingsStore.VERSION_KEY)
+            .values(value=token).execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            db.session.execute(insert(SystemSetting).values(
+                key=SettingsStore.VERSION_KEY, value=token, description='配置版本，修改配置时自动更新'
+            ))
+
+    @staticmethod
+    def invalidate():
+        """丢弃本进程缓存，下次读取时重新加载"""
+        state = SettingsStore._state()
+        with state['lock']:
+            state['values'] = None
+            state['version'] = None
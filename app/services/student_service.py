@@ -1,74 +1,228 @@
 # 处理学生侧的核心逻辑，例如搜索可预约时间块等
+import heapq
+import random
+import time
 from typing import List
 from app.schemas.search_schema import ReservationOut, AvailableSlot
 from app.models import StudyRoom, TimeSlot, Seat
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError, OperationalError
 from ..models import db
+from ..utils.cursor import decode_cursor, encode_cursor
+from ..utils.lru_cache import TTLLRUCache
+from ..utils.local_time import local_to_utc, utc_to_local
+from .recommendation_service import RecommendationService
+from .seat_index import SeatIndex
+from .settings_store import SettingsStore
 
 class StudentService:
+    # 预约遇到并发冲突时的最大尝试次数与退避基数（秒）
+    MAX_BOOKING_ATTEMPTS = 3
+    BOOKING_RETRY_BACKOFF = 0.05
+    # 教室座位状态缓存的容量与有效期（秒）
+    ROOM_STATUS_CACHE_SIZE = 512
+    ROOM_STATUS_CACHE_TTL = 5
+    # 最早空闲时间窗查询的最长查找范围与最长时长，限制逐日、逐座位扫描的工作量
+    EARLIEST_WINDOW_MAX_HORIZON = timedelta(days=7)
+    EARLIEST_WINDOW_MAX_DURATION = timedelta(hours=24)
+
+    @staticmethod
+    def _seat_conflict_exists(start: datetime, end: datetime):
+        """与外层 Seat 关联的冲突子查询：该座位在 [start, end) 内存在已预约的时间块"""
+        return StudentService._seat_conflict_query(Seat.id, start, end).exists()
+
+    @staticmethod
+    def _seat_conflict_query(seat_id, start: datetime, end: datetime):
+        """座位在 [start, end) 内的已预约时间块
+
+        条件按 ix_time_slots_seat_reserved_period 的列顺序书写：
+        seat_id、is_reserved 等值定位，start_time 范围扫描，end_time 直接在索引中过滤。
+        """
+        return db.session.query(TimeSlot.id).filter(
+            TimeSlot.seat_id == seat_id,
+            TimeSlot.is_reserved == True,
+            TimeSlot.start_time < end,
+            TimeSlot.end_time > start
+        )
+
+    @staticmethod
+    def _user_conflict_query(user_id: int, start: datetime, end: datetime):
+        """用户在 [start, end) 内的已预约时间块，走 ix_time_slots_user_start"""
+        return db.session.query(TimeSlot.id).filter(
+            TimeSlot.reserved_by == user_id,
+            TimeSlot.start_time < end,
+            TimeSlot.end_time > start,
+            TimeSlot.is_reserved == True
+        )
+
+    @staticmethod
+    def _room_status_cache():
+        """当前应用的教室座位状态缓存，随占用索引的变化按教室失效"""
+        cache = current_app.extensions.get('room_status_cache')
+        if cache is None:
+            cache = current_app.extensions.setdefault('room_status_cache', TTLLRUCache(
+                maxsize=StudentService.ROOM_STATUS_CACHE_SIZE,
+                ttl=StudentService.ROOM_STATUS_CACHE_TTL
+            ))
+            SeatIndex.subscribe(StudentService._invalidate_room_status)
+        return cache
+
+    @staticmethod
+    def _invalidate_room_status(room_id):
+        cache = current_app.extensions.get('room_status_cache')
+        if cache is not None:
+            cache.invalidate(None if room_id is None else lambda key: key[0] == room_id)
+
+    @staticmethod
+    def get_room_status_cache_stats():
+        """座位状态缓存的命中统计"""
+        return StudentService._room_status_cache().stats()
 
     @staticmethod
     def get_room_seat_status(room_id: int, start: datetime, end: datetime):
-        seats = Seat.query.filter_by(room_id=room_id).all()
-        seat_statuses = []
+        # 同一教室同一时间段的状态在开放预约时被大量重复请求，先查缓存
+        cache = StudentService._room_status_cache()
+        key = (room_id, start, end)
+        rows = cache.get(key)
+        if rows is None:
+            rows = StudentService._compute_room_seat_status(room_id, start, end)
+            cache.put(key, rows)
+        # 缓存中保存不可变的元组，每次返回新的列表，调用方修改结果不会污染缓存
+        return [
+            {
+                "seat_id": seat_id,
+                "seat_number": seat_number,
+                "has_power": has_power,
+                "is_available": is_available
+            }
+            for seat_id, seat_number, has_power, is_available in rows
+        ]
 
-        for seat in seats:
-            # 查询该座位在该时间段内是否已被预约
-            conflict = TimeSlot.query.filter(
-                TimeSlot.seat_id == seat.id,
-                TimeSlot.start_time < end,
-                TimeSlot.end_time > start,
-                TimeSlot.is_reserved == True
-            ).first()
+    @staticmethod
+    def _compute_room_seat_status(room_id: int, start: datetime, end: datetime):
+        """计算教室座位状态，返回 (seat_id, seat_number, has_power, is_available) 元组"""
+        # 优先使用进程内占用索引，读路径不访问 time_slots
+        occupancy = SeatIndex.get_room(room_id)
+        if occupancy is not None and occupancy.covers(start):
+            free = occupancy.free_mask(start, end)
+            return tuple(
+                (seat_id, seat_number, has_power, bool(is_free))
+                for (seat_id, seat_number, has_power), is_free in zip(occupancy.seats, free)
+            )
+
+        # 索引窗口之外的查询：一条语句带出整间教室所有座位的可用状态
+        conflict = StudentService._seat_conflict_exists(start, end)
+        rows = db.session.query(
+            Seat.id, Seat.seat_number, Seat.has_power, (~conflict).label('is_available')
+        ).filter(Seat.room_id == room_id).order_by(Seat.id).all()
+
+        # 若无冲突记录，表示可预约
+        return tuple(
+            (seat_id, seat_number, has_power, bool(is_available))
+            for seat_id, seat_number, has_power, is_available in rows
+        )
 
-            seat_statuses.append({
-                "seat_id": seat.id,
-                "seat_number": seat.seat_number,
-                "has_power": seat.has_power,
-                "is_available": conflict is None  # 若无冲突记录，表示可预约
-            })
+    @staticmethod
+    def get_room_day_grid(room_id: int, day: date):
+        """整间教室一天的占用网格
+
+        day 为本地日期，网格从本地零点起按 LOCAL_TIMEZONE 换算为 UTC 后覆盖 24 小时。
+        每个座位的占用位图编码为十六进制字符串，每一位对应一个 BUCKET_MINUTES 分钟的时间桶，
+        1 表示该时间桶内有预约。
+        """
+        day_start = local_to_utc(datetime.combine(day, datetime.min.time()))
+        occupancy = SeatIndex.get_room_for_day(room_id, day_start)
+        if occupancy is None:
+            seats, rows = [], []
+        else:
+            seats, rows = occupancy.seats, occupancy.day_grid(day_start)
 
-        return seat_statuses
+        return {
+            "room_id": room_id,
+            "date": day.isoformat(),
+            "bucket_minutes": Seat.BUCKET_MINUTES,
+            "seats": [
+                {
+                    "seat_id": seat_id,
+                    "seat_number": seat_number,
+                    "has_power": has_power,
+                    "occupancy": row.tobytes().hex()
+                }
+                for (seat_id, seat_number, has_power), row in zip(seats, rows)
+            ]
+        }
 
     @staticmethod
-    def reserve_slot(user_id: int, seat_id: int, start_time: datetime, end_time: datetime, MAX_RESERVATION_DURATION=timedelta(hours=2)):
+    def reserve_slot(user_id: int, seat_id: int, start_time: datetime, end_time: datetime):
         # 校验时间合法
         if start_time >= end_time:
             return {"success": False, "message": "预约开始时间必须早于结束时间"}
 
-        if end_time - start_time > MAX_RESERVATION_DURATION:
-            return {"success": False, "message": "预约时长不能超过2小时"}
+        # 单次预约最长时长（分钟）由系统配置 MAX_RESERVATION_DURATION 控制
+        max_minutes = SettingsStore.get_int('MAX_RESERVATION_DURATION', 120)
+        if end_time - start_time > timedelta(minutes=max_minutes):
+            limit = f"{max_minutes // 60}小时" if max_minutes % 60 == 0 else f"{max_minutes}分钟"
+            return {"success": False, "message": f"预约时长不能超过{limit}"}
+
+        # 读取配置可能已开启事务；MySQL 可重复读下快照在第一次读取时确定，
+        # 先结束这一事务，锁定座位后的冲突检查才能看到其它事务已提交的预约
+        db.session.commit()
+
+        # 并发冲突（唯一约束冲突、死锁、锁等待超时）时回滚并有限次重试
+        for attempt in range(StudentService.MAX_BOOKING_ATTEMPTS):
+            try:
+                return StudentService._reserve_slot_locked(user_id, seat_id, start_time, end_time)
+            except (IntegrityError, OperationalError):
+                db.session.rollback()
+                time.sleep(StudentService.BOOKING_RETRY_BACKOFF * (attempt + 1) * random.random())
+
+        return {"success": False, "message": "当前预约人数过多，请稍后重试"}
+
+    @staticmethod
+    def _lock_seat(seat_id: int):
+        """锁定座位行并返回座位，同一座位的预约事务由此串行化
+
+        支持行锁的数据库使用 SELECT ... FOR UPDATE；SQLite 不支持，
+        改为先递增座位版本号，借这条 UPDATE 提前拿到数据库写锁。
+        """
+        if db.session.get_bind().dialect.name == 'sqlite':
+            locked = db.session.query(Seat).filter(Seat.id == seat_id).update(
+                {Seat.slot_version: Seat.slot_version + 1}, synchronize_session=False
+            )
+            if not locked:
+                return None
+            seat = db.session.get(Seat, seat_id, populate_existing=True)
+            SeatIndex.record_version_bump(db.session, seat.room_id, seat_id)
+            return seat
+
+        return db.session.query(Seat).filter(Seat.id == seat_id).with_for_update().first()
 
-        # 是否有这个座位
-        seat = Seat.query.get(seat_id)
+    @staticmethod
+    def _reserve_slot_locked(user_id: int, seat_id: int, start_time: datetime, end_time: datetime):
+        # 是否有这个座位（同时锁定该座位，直到提交或回滚）
+        seat = StudentService._lock_seat(seat_id)
         if not seat:
+            db.session.rollback()
             return {"success": False, "message": "座位不存在"}
 
         # 检查该座位是否已被预约（重叠时间）
-        conflict = TimeSlot.query.filter(
-            TimeSlot.seat_id == seat_id,
-            TimeSlot.start_time < end_time,
-            TimeSlot.end_time > start_time,
-            TimeSlot.is_reserved == True
-        ).first()
+        conflict = StudentService._seat_conflict_query(seat_id, start_time, end_time).first()
 
         if conflict:
+            db.session.rollback()
             return {"success": False, "message": "该座位在该时间段已被预约"}
 
         # （可选）用户是否已预约重叠时间段
-        user_conflict = TimeSlot.query.filter(
-            TimeSlot.reserved_by == user_id,
-            TimeSlot.start_time < end_time,
-            TimeSlot.end_time > start_time,
-            TimeSlot.is_reserved == True
-        ).first()
+        user_conflict = StudentService._user_conflict_query(user_id, start_time, end_time).first()
 
         if user_conflict:
+            db.session.rollback()
             return {"success": False, "message": "您在该时间段已有预约"}
 
-        # 查找是否已有这个 slot（可精确查 start/end），否则创建新的 TimeSlot
+        # 查找是否已有这个 slot（按唯一键精确查 start/end），否则创建新的 TimeSlot
         slot = TimeSlot.query.filter_by(
-            room_id=seat.room_id,
             seat_id=seat_id,
             start_time=start_time,
             end_time=end_time
@@ -76,6 +230,7 @@ class StudentService:
 
         if not slot:
             # 如果没有现成的时间块，创建新的（也可以不允许）
+            # (seat_id, start_time, end_time) 上的唯一约束兜底拦截并发插入
 
             slot = TimeSlot(
                 seat_id=seat_id,
@@ -93,62 +248,179 @@ class StudentService:
         return {"success": True, "message": "预约成功", "slot_id": slot.id}
 
     @staticmethod
-    def get_reservation_history(user_id: int):
-        slots = TimeSlot.query.filter_by(reserved_by=user_id).order_by(TimeSlot.start_time.desc()).all()
-        result = []
-        for slot in slots:
-            seat = Seat.query.get(slot.seat_id)
-            room = StudyRoom.query.get(slot.room_id)
-            result.append({
-                "slot_id": slot.id,
-                "room_name": room.name,
-                "seat_number": seat.seat_number,
-                "start_time": slot.start_time.isoformat(),
-                "end_time": slot.end_time.isoformat(),
-                "has_ended": slot.end_time < datetime.now()
-            })
-        return result
+    def get_reservation_history(user_id: int, cursor: str = None, limit: int = 20):
+        """按开始时间倒序分页获取用户的预约记录
+
+        座位与自习室信息在同一条查询中连接取出；翻页使用 (start_time, id) 键集游标，
+        沿 ix_time_slots_user_start 索引定位，不随翻页深度变慢。
+
+        Args:
+            user_id: 用户ID
+            cursor: 上一页返回的 next_cursor，为空时从最新一条开始
+            limit: 每页条数
+
+        Returns:
+            dict: items 为本页记录，next_cursor 为下一页游标（没有更多记录时为 None）
+        """
+        keyset = decode_cursor(cursor) if cursor else None
+
+        query = db.session.query(
+            TimeSlot.id, TimeSlot.start_time, TimeSlot.end_time, Seat.seat_number, StudyRoom.name
+        ).join(Seat, TimeSlot.seat_id == Seat.id).join(
+            StudyRoom, TimeSlot.room_id == StudyRoom.id
+        ).filter(TimeSlot.reserved_by == user_id)
+
+        if keyset:
+            cursor_start, cursor_id = keyset
+            query = query.filter(or_(
+                TimeSlot.start_time < cursor_start,
+                and_(TimeSlot.start_time == cursor_start, TimeSlot.id < cursor_id)
+            ))
+
+        # 多取一条用于判断是否还有下一页
+        rows = query.order_by(TimeSlot.start_time.desc(), TimeSlot.id.desc()).limit(limit + 1).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        now = datetime.utcnow()
+        items = [
+            {
+                "slot_id": slot_id,
+                "room_name": room_name,
+                "seat_number": seat_number,
+                "start_time": start_time.isoformat(),
+                "end_time": end_time.isoformat(),
+                "has_ended": end_time < now
+            }
+            for slot_id, start_time, end_time, seat_number, room_name in rows
+        ]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if has_more else None
+
+        return {"items": items, "next_cursor": next_cursor}
 
     @staticmethod
     def get_quick_recommendation(user_id: int):
-        # 简单策略：返回用户上一次预约的座位和时间段
-        last_slot = TimeSlot.query.filter_by(reserved_by=user_id).order_by(TimeSlot.start_time.desc()).first()
-        if not last_slot:
+        """根据学生偏好画像推荐座位，其余候选放在 alternatives 中"""
+        recommendations = RecommendationService.recommend(user_id)
+        if not recommendations:
             return None
 
-        return {
-            "seat_id": last_slot.seat_id,
-            "room_id": last_slot.room_id,
-            "suggested_start_time": last_slot.start_time.replace(day=datetime.now().day).isoformat()
-        }
+        best = dict(recommendations[0])
+        best["alternatives"] = recommendations[1:]
+        return best
 
     @staticmethod
     def search_available_seats(room_id: int, start: datetime, end: datetime, require_power: bool = False):
-        # 1. 查询该教室中所有座位（可筛选是否带插头）
-        seat_query = Seat.query.filter_by(room_id=room_id)
+        occupancy = SeatIndex.get_room(room_id)
+        if occupancy is not None and occupancy.covers(start):
+            free = occupancy.free_mask(start, end)
+            return [
+                {
+                    "seat_id": seat_id,
+                    "seat_number": seat_number,
+                    "has_power": has_power
+                }
+                for (seat_id, seat_number, has_power), is_free in zip(occupancy.seats, free)
+                if is_free and (has_power or not require_power)
+            ]
+
+        # 1. 该教室中所有座位（可筛选是否带插头）
+        # 2. 反连接排除在给定时间段存在冲突 TimeSlot 的座位，一次查询完成
+        conflict = StudentService._seat_conflict_exists(start, end)
+        seat_query = db.session.query(Seat.id, Seat.seat_number, Seat.has_power).filter(
+            Seat.room_id == room_id,
+            ~conflict
+        )
         if require_power:
-            seat_query = seat_query.filter_by(has_power=True)
-        seats = seat_query.all()
-
-        available = []
-
-        for seat in seats:
-            # 2. 查看该座位在给定时间段是否已被预约（存在冲突的 TimeSlot）
-            conflict = TimeSlot.query.filter(
-                TimeSlot.seat_id == seat.id,
-                TimeSlot.start_time < end,
-                TimeSlot.end_time > start,
-                TimeSlot.is_reserved == True
-            ).first()
-
-            if conflict is None:
-                available.append({
-                    "seat_id": seat.id,
-                    "seat_number": seat.seat_number,
-                    "has_power": seat.has_power
-                })
-
-        return available
+            seat_query = seat_query.filter(Seat.has_power == True)
+
+        return [
+            {
+                "seat_id": seat_id,
+                "seat_number": seat_number,
+                "has_power": has_power
+            }
+            for seat_id, seat_number, has_power in seat_query.order_by(Seat.id).all()
+        ]
+
+    @staticmethod
+    def _open_intervals(open_time, close_time, start: datetime, end: datetime):
+        """自习室在 [start, end) 内的开放时段（UTC），开放与关门时间为本地时间，为空分别表示 0 点开门、24 点关门"""
+        if open_time is None and close_time is None:
+            return [(start, end)]
+
+        intervals = []
+        day = utc_to_local(start).date() - timedelta(days=1)
+        last_day = utc_to_local(end).date()
+        while day <= last_day:
+            open_local = datetime.combine(day, open_time or datetime.min.time())
+            if close_time is not None:
+                close_local = datetime.combine(day, close_time)
+            else:
+                close_local = datetime.combine(day + timedelta(days=1), datetime.min.time())
+            if close_local <= open_local:
+                # 关门时间不晚于开门时间表示跨过午夜
+                close_local += timedelta(days=1)
+            open_start, open_end = max(local_to_utc(open_local), start), min(local_to_utc(close_local), end)
+            if open_start < open_end:
+                intervals.append((open_start, open_end))
+            day += timedelta(days=1)
+        return intervals
+
+    @staticmethod
+    def find_earliest_windows(duration: timedelta, require_power: bool = False,
+                              horizon: timedelta = timedelta(hours=24), limit: int = 5, start: datetime = None):
+        """在所有自习室中查找最早能容纳 duration 的空闲时间窗
+
+        逐座位扫描合并后的已预约区间，每个座位取其在自习室开放时段内最早的空闲起点，
+        再在全部座位中取最早的 limit 个。
+
+        Args:
+            duration: 需要的连续时长
+            require_power: 是否只考虑带插座的座位
+            horizon: 从 start 起向后查找的时间范围，时间窗必须完整落在其中
+            limit: 返回的时间窗数量
+            start: 查找起点，默认为当前时间；早于当前时间时从当前时间开始
+
+        Returns:
+            list: 按开始时间排序的时间窗列表
+        """
+        earliest = datetime.utcnow().replace(second=0, microsecond=0) + timedelta(minutes=1)
+        if start is None or start < earliest:
+            start = earliest
+        end = start + min(horizon, StudentService.EARLIEST_WINDOW_MAX_HORIZON)
+
+        candidates = []
+        rooms = db.session.query(StudyRoom.id, StudyRoom.name, StudyRoom.open_time, StudyRoom.close_time).order_by(
+            StudyRoom.id
+        ).all()
+        for room_id, room_name, open_time, close_time in rooms:
+            occupancy = SeatIndex.get_room(room_id)
+            if occupancy is None or not occupancy.covers(start):
+                continue
+            open_intervals = StudentService._open_intervals(open_time, close_time, start, end)
+            for seat_id, seat_number, has_power in occupancy.seats:
+                if require_power and not has_power:
+                    continue
+                for open_start, open_end in open_intervals:
+                    window_start = occupancy.first_gap(seat_id, open_start, open_end, duration)
+                    if window_start is not None:
+                        candidates.append((window_start, room_id, seat_id, room_name, seat_number, has_power))
+                        break
+
+        return [
+            {
+                "room_id": room_id,
+                "room_name": room_name,
+                "seat_id": seat_id,
+                "seat_number": seat_number,
+                "has_power": has_power,
+                "start_time": window_start.isoformat(),
+                "end_time": (window_start + duration).isoformat()
+            }
+            for window_start, room_id, seat_id, room_name, seat_number, has_power
+            in heapq.nsmallest(limit, candidates, key=lambda c: c[:3])
+        ]
 
     @staticmethod
     def get_student_reservations(student_id: int) -> List[ReservationOut]:
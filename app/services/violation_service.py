@@ -1,85 +1,167 @@
+from collections import Counter
 from datetime import datetime, timedelta
-from ..models import Reservation, User, SystemSetting, Notification
+from sqlalchemy import case, func, update
+from ..models import Reservation, User, StudyRoom
+from .settings_store import SettingsStore
+from .notification_service import NotificationService
 from app.models.db import db
 from flask import current_app
 
 class ViolationService:
     @staticmethod
     def get_setting(key, default_value):
-        """获取系统配置"""
-        setting = db.session.get(SystemSetting, key)
-        if setting:
-            try:
-                return int(setting.value)
-            except (ValueError, TypeError):
-                return default_value
-        return default_value
+        """获取整数类型的系统配置，从进程内配置缓存读取"""
+        return SettingsStore.get_int(key, default_value)
 
     @staticmethod
     def create_notification(user_id, message):
         """为用户创建一条通知"""
         try:
-            notification = Notification(user_id=user_id, message=message)
-            db.session.add(notification) # <<-- 这里现在是正确的了
+            NotificationService.notify_many([{'user_id': user_id, 'message': message}])
             current_app.logger.info(f"为用户 {user_id} 创建通知: {message}")
         except Exception as e:
             current_app.logger.error(f"创建通知失败: {e}")
 
     @staticmethod
     def check_upcoming_reservations():
-        """检查即将开始的预约并发送提醒"""
-        # ... (这部分逻辑不变) ...
+        """为新进入提醒窗口的预约发送开始前提醒
+
+        只扫描 reminder_sent_at 为空的预约，加锁读取后用带条件的 UPDATE 认领再写通知，
+        多个 worker 同时执行时每条预约也只提醒一次。
+
+        Returns:
+            int: 本次发送的提醒数
+        """
         reminder_minutes = ViolationService.get_setting('REMINDER_BEFORE_MINUTES', 15)
         now = datetime.utcnow()
-        
-        upcoming_reservations = Reservation.query.filter(
+
+        rows = db.session.query(Reservation.id, Reservation.student_id, Reservation.start_time).filter(
             Reservation.status == 'scheduled',
+            Reservation.reminder_sent_at.is_(None),
             Reservation.start_time > now,
             Reservation.start_time <= now + timedelta(minutes=reminder_minutes)
+        ).with_for_update(
+            # 并发的 worker 跳过已被锁定的预约，各自认领不同的行
+            skip_locked=True
         ).all()
-        
-        for res in upcoming_reservations:
-            message = f"您的自习室预约即将于 {res.start_time.strftime('%H:%M')} 开始，请准时签到。"
-            ViolationService.create_notification(res.student_id, message)
-            current_app.logger.info(f"已为预约ID {res.id} 发送开始前提醒。")
+        if not rows:
+            return 0
+
+        claim = update(Reservation).where(
+            Reservation.id.in_([row.id for row in rows]), Reservation.reminder_sent_at.is_(None)
+        ).values(reminder_sent_at=now).execution_options(synchronize_session=False)
+        if db.session.get_bind().dialect.update_returning:
+            # 只提醒本次 UPDATE 确实认领到的预约
+            claimed = set(db.session.execute(claim.returning(Reservation.id)).scalars())
+            rows = [row for row in rows if row.id in claimed]
+        else:
+            # 本批预约已被锁定，读取与 UPDATE 之间不会被其它 worker 认领
+            db.session.execute(claim)
+
+        NotificationService.notify_many([
+            {
+                'user_id': row.student_id,
+                'message': f"您的自习室预约即将于 {row.start_time.strftime('%H:%M')} 开始，请准时签到。"
+            }
+            for row in rows
+        ], now)
+        db.session.commit()
+
+        current_app.logger.info(f"已为 {len(rows)} 条预约发送开始前提醒")
+        return len(rows)
+
+    # 每批处理的违约预约数，以及单次任务最多处理的批数
+    NO_SHOW_CHUNK_SIZE = 500
+    NO_SHOW_MAX_CHUNKS = 20
+
+    @staticmethod
+    def _no_show_message(room_name, start_time, violation_count, max_violations, banned_until):
+        if violation_count >= max_violations:
+            return (f"您的预约（自习室: {room_name}, 时间: {start_time.strftime('%Y-%m-%d %H:%M')}）"
+                    f"因超时未签到已被取消并记为违约。您已累计违约 {violation_count} 次，"
+                    f"预约功能将被禁用至 {banned_until.strftime('%Y-%m-%d')}。")
+        remaining_chances = max_violations - violation_count
+        return (f"您的预约（自习室: {room_name}, 时间: {start_time.strftime('%Y-%m-%d %H:%M')}）"
+                f"因超时未签到已被取消并记为违约。您当前累计违约 {violation_count} 次，"
+                f"再违约 {remaining_chances} 次将被禁用预约功能。")
 
     @staticmethod
     def process_no_show_violations():
-        """处理超时未签到的违约"""
-        # ... (这部分逻辑不变) ...
+        """处理超时未签到的违约
+
+        按批处理，每批固定执行：一次加锁查询取出预约与自习室名称，一条 UPDATE 标记违约，
+        一条 UPDATE 按学生汇总累加违约次数，一条 UPDATE 为达到上限的学生设置禁用时间，
+        一次查询读回累计次数，一条批量 INSERT 写入通知并更新未读数，然后提交。
+
+        Returns:
+            int: 标记为违约的预约数
+        """
         timeout_minutes = ViolationService.get_setting('NO_SHOW_TIMEOUT_MINUTES', 10)
         max_violations = ViolationService.get_setting('MAX_VIOLATION_COUNT', 3)
         ban_days = ViolationService.get_setting('BAN_DAYS', 7)
         now = datetime.utcnow()
-        
-        no_show_reservations = Reservation.query.filter(
-            Reservation.status == 'scheduled',
-            Reservation.start_time < now - timedelta(minutes=timeout_minutes)
-        ).all()
-        
-        for res in no_show_reservations:
-            # 修正点: 使用 session.get
-            student = db.session.get(User, res.student_id)
-            if not student:
-                continue
-            
-            res.status = 'violation_no_show'
-            student.violation_count += 1
-            
-            if student.violation_count >= max_violations:
-                student.banned_until = now + timedelta(days=ban_days)
-                ban_end_date = student.banned_until.strftime('%Y-%m-%d')
-                message = (f"您的预约（自习室: {res.room.name}, 时间: {res.start_time.strftime('%Y-%m-%d %H:%M')}）"
-                           f"因超时未签到已被取消并记为违约。您已累计违约 {student.violation_count} 次，"
-                           f"预约功能将被禁用至 {ban_end_date}。")
+        banned_until = now + timedelta(days=ban_days)
+        returning = db.session.get_bind().dialect.update_returning
+
+        processed = 0
+        for _ in range(ViolationService.NO_SHOW_MAX_CHUNKS):
+            rows = db.session.query(
+                Reservation.id, Reservation.student_id, Reservation.start_time, StudyRoom.name
+            ).join(StudyRoom, Reservation.room_id == StudyRoom.id).filter(
+                Reservation.status == 'scheduled',
+                Reservation.start_time < now - timedelta(minutes=timeout_minutes)
+            ).order_by(Reservation.id).limit(ViolationService.NO_SHOW_CHUNK_SIZE).with_for_update(
+                # 锁定本批预约，并发的处理任务跳过已被锁定的行，各自处理不同的预约
+                of=Reservation, skip_locked=True
+            ).all()
+            if not rows:
+                break
+
+            ids = [row.id for row in rows]
+            flip = update(Reservation).where(
+                Reservation.id.in_(ids), Reservation.status == 'scheduled'
+            ).values(status='violation_no_show').execution_options(synchronize_session=False)
+            if returning:
+                # 只处理本次 UPDATE 确实标记的预约，期间被签到或被其它任务标记的不重复计数和通知
+                marked = set(db.session.execute(flip.returning(Reservation.id)).scalars())
+                rows = [row for row in rows if row.id in marked]
             else:
-                remaining_chances = max_violations - student.violation_count
-                message = (f"您的预约（自习室: {res.room.name}, 时间: {res.start_time.strftime('%Y-%m-%d %H:%M')}）"
-                           f"因超时未签到已被取消并记为违约。您当前累计违约 {student.violation_count} 次，"
-                           f"再违约 {remaining_chances} 次将被禁用预约功能。")
-            
-            ViolationService.create_notification(student.id, message)
-            current_app.logger.info(f"预约ID {res.id} 已被处理为违约。学生ID: {student.id}")
-
-        if no_show_reservations:
-            db.session.commit() # <<-- 这里现在是正确的了
\ No newline at end of file
+                # 本批预约已被锁定，状态不会在读取与 UPDATE 之间变化
+                db.session.execute(flip)
+
+            per_student = Counter(row.student_id for row in rows)
+            if per_student:
+                db.session.execute(
+                    update(User).where(User.id.in_(per_student)).values(
+                        violation_count=func.coalesce(User.violation_count, 0) + case(per_student, value=User.id, else_=0)
+                    ).execution_options(synchronize_session=False)
+                )
+                db.session.execute(
+                    update(User).where(
+                        User.id.in_(per_student), User.violation_count >= max_violations
+                    ).values(banned_until=banned_until).execution_options(synchronize_session=False)
+                )
+                totals = dict(db.session.query(User.id, User.violation_count).filter(User.id.in_(per_student)).all())
+
+                # 同一学生本批有多条违约时，按预约顺序还原每条通知对应的累计次数
+                pending = Counter(per_student)
+                notifications = []
+                for row in rows:
+                    pending[row.student_id] -= 1
+                    violation_count = totals[row.student_id] - pending[row.student_id]
+                    notifications.append({
+                        'user_id': row.student_id,
+                        'message': ViolationService._no_show_message(
+                            row.name, row.start_time, violation_count, max_violations, banned_until
+                        )
+                    })
+                NotificationService.notify_many(notifications, now)
+
+            db.session.commit()
+            processed += len(rows)
+            if len(ids) < ViolationService.NO_SHOW_CHUNK_SIZE:
+                break
+
+        if processed:
+            current_app.logger.info(f"已将 {processed} 条超时未签到的预约处理为违约")
+        return processed
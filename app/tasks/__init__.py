@@ -1,3 +1,5 @@
-from ..services import ViolationService # 导入 ViolationService
+from ..services import ViolationService, DeadlineQueue # 违约任务使用的服务与截止时间堆
 from .qrcode_tasks import setup_qrcode_tasks
-from .violation_tasks import setup_violation_tasks # 导入新任务设置函数
\ No newline at end of file
+from .violation_tasks import setup_violation_tasks # 导入新任务设置函数
+from .recommendation_tasks import setup_recommendation_tasks
+from .check_in_tasks import setup_check_in_tasks
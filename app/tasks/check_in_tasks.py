@@ -0,0 +1,48 @@
+import time
+from ..services import CheckInService, OccupancyService
+
+
+def auto_check_out_stale(app):
+    """自动签退忘记签退的签到记录"""
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            closed = CheckInService.auto_check_out_stale()
+        except Exception as e:
+            app.logger.error(f"自动签退失败: {str(e)}")
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        app.logger.info(f"自动签退完成: 关闭 {closed} 条签到记录，耗时 {elapsed_ms:.1f} ms")
+
+
+def reconcile_room_occupancy(app):
+    """按签到记录校正自习室在座人数"""
+    with app.app_context():
+        try:
+            drifted = OccupancyService.reconcile()
+            if drifted:
+                app.logger.info(f"在座人数已校正: {drifted} 个自习室的计数与签到记录不一致")
+        except Exception as e:
+            app.logger.error(f"校正在座人数失败: {str(e)}")
+
+
+def setup_check_in_tasks(app, scheduler):
+    """设置签到相关的定时任务"""
+    # 每5分钟关闭一次过期的签到
+    scheduler.add_job(
+        auto_check_out_stale,
+        'interval',
+        minutes=5,
+        args=[app],
+        id='auto_check_out_stale'
+    )
+
+    # 每分钟按签到记录校正一次在座人数
+    scheduler.add_job(
+        reconcile_room_occupancy,
+        'interval',
+        minutes=1,
+        args=[app],
+        id='reconcile_room_occupancy'
+    )
@@ -1,32 +1,33 @@
-from datetime import datetime
-from flask import current_app
-# from apscheduler.schedulers.background import BackgroundScheduler # 不再需要在这里创建
-from ..models import StudyRoom, QRCode
+import time
 from ..services import QRCodeService
 
-# scheduler = BackgroundScheduler() # 删除这行
 
-def refresh_expired_qrcodes():
+def refresh_expired_qrcodes(app):
     """刷新所有过期的二维码"""
-    with current_app.app_context():
-        # 获取所有自习室
-        rooms = StudyRoom.query.all()
-        current_time = datetime.utcnow()
-        
-        for room in rooms:
-            # 获取当前有效的二维码
-            qrcode = QRCode.query.filter_by(
-                room_id=room.id,
-                is_active=True
-            ).order_by(QRCode.created_at.desc()).first()
-            
-            # 如果二维码不存在或已过期，则生成新的
-            if not qrcode or current_time >= qrcode.expires_at:
-                try:
-                    QRCodeService.generate_room_qrcode(room.id)
-                    current_app.logger.info(f"已刷新自习室 {room.name} 的二维码")
-                except Exception as e:
-                    current_app.logger.error(f"刷新自习室 {room.name} 的二维码失败: {str(e)}")
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            refreshed = QRCodeService.refresh_expired_qrcodes()
+        except Exception as e:
+            app.logger.error(f"刷新二维码失败: {str(e)}")
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        app.logger.info(f"二维码刷新完成: 轮换 {len(refreshed)} 个自习室，耗时 {elapsed_ms:.1f} ms")
+
+
+def prune_inactive_qrcodes(app):
+    """清理超过保留期的失效二维码"""
+    with app.app_context():
+        started = time.perf_counter()
+        try:
+            removed = QRCodeService.prune_inactive_qrcodes()
+        except Exception as e:
+            app.logger.error(f"清理失效二维码失败: {str(e)}")
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        app.logger.info(f"失效二维码清理完成: 删除 {removed} 行，耗时 {elapsed_ms:.1f} ms")
 
 
 def setup_qrcode_tasks(app, scheduler): # 接收 scheduler 作为参数
@@ -36,10 +37,15 @@ def setup_qrcode_tasks(app, scheduler): # 接收 scheduler 作为参数
         refresh_expired_qrcodes,
         'interval',
         minutes=1,
+        args=[app],
         id='refresh_qrcodes'
     )
-    
-    # 不再需要在这里启动和注册停止函数，已移到 app/__init__.py
-    # scheduler.start()
-    # import atexit
-    # atexit.register(lambda: scheduler.shutdown())
\ No newline at end of file
+
+    # 每小时清理一次失效二维码
+    scheduler.add_job(
+        prune_inactive_qrcodes,
+        'interval',
+        hours=1,
+        args=[app],
+        id='prune_qrcodes'
+    )
@@ -0,0 +1,24 @@
+from ..services import RecommendationService
+
+
+def refresh_preference_profiles(app):
+    """增量刷新学生偏好画像"""
+    with app.app_context():
+        try:
+            processed = RecommendationService.refresh_profiles()
+            if processed:
+                app.logger.info(f"已汇总 {processed} 条预约到学生偏好画像")
+        except Exception as e:
+            app.logger.error(f"刷新学生偏好画像失败: {e}")
+
+
+def setup_recommendation_tasks(app, scheduler):
+    """设置推荐相关的定时任务"""
+    # 每10分钟增量刷新一次偏好画像
+    scheduler.add_job(
+        refresh_preference_profiles,
+        'interval',
+        minutes=10,
+        args=[app],
+        id='refresh_preference_profiles'
+    )
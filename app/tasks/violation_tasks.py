@@ -1,28 +1,95 @@
-from flask import current_app
-from apscheduler.schedulers.background import BackgroundScheduler
-from . import ViolationService
-
-def check_and_process_violations():
-    """组合任务：检查即将开始的预约和处理违约"""
-    with current_app.app_context():
-        current_app.logger.info("开始执行违约检查和提醒任务...")
+from datetime import datetime, timedelta, timezone
+from . import ViolationService, DeadlineQueue
+
+# 按最早截止时间触发的一次性任务
+DEADLINE_JOB_ID = 'fire_reservation_deadlines'
+# 处理失败后放回堆中的截止时间延后重试的秒数
+DEADLINE_RETRY_SECONDS = 30
+# 增量加载新预约的间隔（分钟）：只影响临近开始才创建的预约，提醒最多推迟这么久；
+# 空闲时每次只有一次扫描和一次配置版本核对，其余预约由每10分钟的兜底重建覆盖
+DEADLINE_SYNC_MINUTES = 2
+
+def _arm_deadline_job(app, scheduler):
+    """把一次性任务重新定到堆中最早的截止时间"""
+    due = DeadlineQueue.next_due()
+    if due is None:
+        if scheduler.get_job(DEADLINE_JOB_ID):
+            scheduler.remove_job(DEADLINE_JOB_ID)
+        return
+    # 截止时间为 UTC 的 naive datetime，调度器按本地时区解释 naive 时间
+    scheduler.add_job(
+        fire_reservation_deadlines,
+        'date',
+        run_date=due.replace(tzinfo=timezone.utc),
+        args=[app, scheduler],
+        id=DEADLINE_JOB_ID,
+        replace_existing=True,
+        misfire_grace_time=None
+    )
+
+def fire_reservation_deadlines(app, scheduler):
+    """处理已到期的提醒和违约截止时间"""
+    with app.app_context():
+        due = DeadlineQueue.pop_due()
+        try:
+            kinds = {kind for _, kind, _ in due}
+            if DeadlineQueue.REMINDER in kinds:
+                ViolationService.check_upcoming_reservations()
+            if DeadlineQueue.NO_SHOW in kinds:
+                ViolationService.process_no_show_violations()
+        except Exception as e:
+            app.logger.error(f"处理预约截止时间出错: {e}")
+            # 放回已弹出的截止时间并稍后重试，不必等兜底任务，也避免持续失败时反复立即触发
+            retry_at = datetime.utcnow() + timedelta(seconds=DEADLINE_RETRY_SECONDS)
+            DeadlineQueue.push([(retry_at, kind, reservation_id) for _, kind, reservation_id in due])
+        finally:
+            _arm_deadline_job(app, scheduler)
+
+def sync_reservation_deadlines(app, scheduler):
+    """把新增的预约加入截止时间堆"""
+    with app.app_context():
+        try:
+            if DeadlineQueue.sync():
+                _arm_deadline_job(app, scheduler)
+        except Exception as e:
+            app.logger.error(f"加载新预约截止时间出错: {e}")
+
+def check_and_process_violations(app, scheduler):
+    """兜底任务：检查即将开始的预约和处理违约，并重建截止时间堆"""
+    with app.app_context():
+        app.logger.info("开始执行违约检查和提醒任务...")
         try:
             # 1. 发送预约开始前提醒
             ViolationService.check_upcoming_reservations()
             
             # 2. 处理超时未签到的违约
             ViolationService.process_no_show_violations()
+
+            # 3. 重建截止时间堆，丢弃已取消或已签到的预约
+            DeadlineQueue.rebuild()
+            _arm_deadline_job(app, scheduler)
             
-            current_app.logger.info("违约检查和提醒任务执行完毕。")
+            app.logger.info("违约检查和提醒任务执行完毕。")
         except Exception as e:
-            current_app.logger.error(f"执行违约检查任务时出错: {e}")
+            app.logger.error(f"执行违约检查任务时出错: {e}")
 
 def setup_violation_tasks(app, scheduler):
     """设置违约处理相关的定时任务"""
-    # 每分钟执行一次检查
+    # 每10分钟兜底检查一次，启动时立即执行以建立截止时间堆
     scheduler.add_job(
         check_and_process_violations,
         'interval',
-        minutes=1,
+        minutes=10,
+        args=[app, scheduler],
+        next_run_time=datetime.now(),
         id='check_violations_job'
+    )
+
+    # 每隔 DEADLINE_SYNC_MINUTES 分钟增量加载新预约的截止时间
+    scheduler.add_job(
+        sync_reservation_deadlines,
+        'interval',
+        minutes=DEADLINE_SYNC_MINUTES,
+        args=[app, scheduler],
+        id='sync_reservation_deadlines'
     )
\ No newline at end of file
@@ -0,0 +1,18 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from app.models import db
+
+
+@contextmanager
+def count_queries():
+    """统计代码块内向数据库发出的 SQL 语句数"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
@@ -1,12 +1,17 @@
 # app/tests/unit/test_check_in_service.py
 import pytest
 import json
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from app import create_app
-from app.models import User, StudyRoom, QRCode, CheckIn
+from app.models import User, StudyRoom, QRCode, CheckIn, Reservation
 from app.models.db import db
 from app.services.qrcode_service import QRCodeService
 from app.services.check_in_service import CheckInService
+from app.services.violation_service import ViolationService
+from app.tests.conftest import count_queries
+from app.services.occupancy_service import OccupancyService
+from sqlalchemy import event, literal, update
+from sqlalchemy.exc import IntegrityError
 
 class TestStudentCheckIn:
     @pytest.fixture
@@ -175,4 +180,312 @@ class TestStudentCheckIn:
             
             # 验证结果
             assert result['success'] == False
-            assert '您已经在该自习室签到' in result['message']
\ No newline at end of file
+            assert '您已经在该自习室签到' in result['message']
+
+    def test_check_in_statement_count(self, app):
+        """二维码命中缓存时，一次签到只执行一条查询和一条插入"""
+        with app.app_context():
+            student = User.query.filter_by(username='test_student').first()
+            room = StudyRoom.query.filter_by(name='测试自习室').first()
+            student_id = student.id
+            encoded_qrcode = QRCodeService.encode_qrcode_for_display(QRCodeService.generate_room_qrcode(room.id))
+
+            with count_queries() as statements:
+                result = CheckInService.student_check_in(student_id, encoded_qrcode)
+            assert result['success'] == True
+            assert [s.split()[0] for s in statements] == ['SELECT', 'INSERT']
+
+            # 重复签到同样只需一读一写，由唯一索引拒绝
+            with count_queries() as statements:
+                result = CheckInService.student_check_in(student_id, encoded_qrcode)
+            assert result['success'] == False
+            assert '您已经在该自习室签到' in result['message']
+            assert len(statements) == 2
+
+    def test_database_rejects_second_open_check_in(self, app):
+        """签到中的记录在数据库层面唯一，签退后可再次签到"""
+        with app.app_context():
+            student = User.query.filter_by(username='test_student').first()
+            room = StudyRoom.query.filter_by(name='测试自习室').first()
+            qrcode = QRCode.query.filter_by(room_id=room.id).first()
+
+            first = CheckIn(student_id=student.id, room_id=room.id, qrcode_id=qrcode.id, status='checked_in')
+            db.session.add(first)
+            db.session.commit()
+
+            db.session.add(CheckIn(student_id=student.id, room_id=room.id, qrcode_id=qrcode.id, status='checked_in'))
+            with pytest.raises(IntegrityError):
+                db.session.commit()
+            db.session.rollback()
+
+            first.status = 'checked_out'
+            db.session.add(CheckIn(student_id=student.id, room_id=room.id, qrcode_id=qrcode.id, status='checked_in'))
+            db.session.commit()
+            assert CheckIn.query.count() == 2
+
+    def test_other_integrity_errors_are_not_reported_as_duplicate(self, app, monkeypatch):
+        """只有签到中记录的唯一索引冲突按重复签到处理"""
+        with app.app_context():
+            student_id = User.query.filter_by(username='test_student').first().id
+            room = StudyRoom.query.filter_by(name='测试自习室').first()
+            encoded_qrcode = QRCodeService.encode_qrcode_for_display(QRCodeService.generate_room_qrcode(room.id))
+
+            def fail_flush(message):
+                def flush(*args, **kwargs):
+                    raise IntegrityError('INSERT INTO check_ins', {}, Exception(message))
+                monkeypatch.setattr(db.session, 'flush', flush)
+
+            # MySQL 的错误信息带有索引名
+            fail_flush("(1062, \"Duplicate entry '1-1-1' for key 'check_ins.uq_check_ins_student_room_open'\")")
+            result = CheckInService.student_check_in(student_id, encoded_qrcode)
+            assert result['message'] == '您已经在该自习室签到'
+
+            # 其它约束错误交给通用的失败处理，不误报为重复签到
+            fail_flush('(1452, "Cannot add or update a child row: a foreign key constraint fails")')
+            result = CheckInService.student_check_in(student_id, encoded_qrcode)
+            assert result['success'] == False
+            assert result['message'].startswith('签到失败')
+            assert 'foreign key constraint' in result['message']
+
+    def test_non_student_cannot_check_in(self, app):
+        with app.app_context():
+            admin = User(username='admin', password='password', role='admin', name='管理员')
+            db.session.add(admin)
+            db.session.commit()
+            room = StudyRoom.query.filter_by(name='测试自习室').first()
+            encoded_qrcode = QRCodeService.encode_qrcode_for_display(QRCodeService.generate_room_qrcode(room.id))
+
+            result = CheckInService.student_check_in(admin.id, encoded_qrcode)
+
+            assert result['success'] == False
+            assert result['code'] == 403
+
+    def test_check_in_links_current_reservation(self, app):
+        """签到关联正在进行的预约并将其改为已签到，违约处理不再处理该预约"""
+        with app.app_context():
+            student = User.query.filter_by(username='test_student').first()
+            room = StudyRoom.query.filter_by(name='测试自习室').first()
+            student_id, room_id = student.id, room.id
+            now = datetime.utcnow()
+            current = Reservation(student_id=student_id, room_id=room_id, status='scheduled',
+                                  start_time=now - timedelta(minutes=20), end_time=now + timedelta(hours=1))
+            later = Reservation(student_id=student_id, room_id=room_id, status='scheduled',
+                                start_time=now + timedelta(hours=3), end_time=now + timedelta(hours=4))
+            db.session.add_all([current, later])
+            db.session.commit()
+            current_id, later_id = current.id, later.id
+            encoded_qrcode = QRCodeService.encode_qrcode_for_display(QRCodeService.generate_room_qrcode(room_id))
+
+            with count_queries() as statements:
+                result = CheckInService.student_check_in(student_id, encoded_qrcode)
+
+            assert result['success'] == True
+            assert result['data']['reservation_id'] == current_id
+            assert [s.split()[0] for s in statements] == ['SELECT', 'INSERT', 'UPDATE']
+
+            linked = db.session.get(Reservation, current_id)
+            assert linked.status == 'checked_in'
+            assert linked.check_in_id == result['data']['check_in_id']
+            assert db.session.get(CheckIn, linked.check_in_id).reservation_id == current_id
+            assert db.session.get(Reservation, later_id).status == 'scheduled'
+
+            ViolationService.process_no_show_violations()
+            assert db.session.get(Reservation, current_id).status == 'checked_in'
+            assert db.session.get(User, student_id).violation_count == 0
+
+
+class TestAutoCheckOut:
+    NOW = datetime(2025, 6, 19, 23, 0)
+
+    @pytest.fixture
+    def app(self):
+        app = create_app('test')
+
+        with app.app_context():
+            db.create_all()
+            # 依次得到 id 1-6
+            students = [User(username=f'student{i}', password='password', role='student', name=f'学生{i}')
+                        for i in range(1, 7)]
+            rooms = [
+                StudyRoom(id=1, name='关门自习室', location='一楼', close_time=time(22, 0)),
+                StudyRoom(id=2, name='通宵自习室', location='二楼'),
+            ]
+            db.session.add_all(students + rooms)
+            db.session.add(QRCode(id=1, room_id=1, code=QRCode.generate_code(), expires_at=self.NOW))
+            db.session.add(Reservation(id=1, student_id=2, room_id=2, status='checked_in',
+                                       start_time=self.NOW.replace(hour=10), end_time=self.NOW.replace(hour=12)))
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    @staticmethod
+    def _check_in(student_id, room_id, check_in_time, reservation_id=None):
+        check_in = CheckIn(student_id=student_id, room_id=room_id, qrcode_id=1, status='checked_in',
+                           check_in_time=check_in_time, reservation_id=reservation_id)
+        db.session.add(check_in)
+        db.session.commit()
+        return check_in.id
+
+    def test_closes_stale_check_ins_with_sql_durations(self, app):
+        day = self.NOW.replace(hour=0)
+        same_day = self._check_in(1, 1, day.replace(hour=9))
+        reserved = self._check_in(2, 2, day.replace(hour=10), reservation_id=1)
+        after_close = self._check_in(3, 1, day.replace(hour=22, minute=30))
+        two_days_ago = self._check_in(4, 1, day - timedelta(days=2) + timedelta(hours=10))
+        ancient = self._check_in(5, 1, day - timedelta(days=20))
+        overnight = self._check_in(6, 2, day.replace(hour=8))
+
+        assert CheckInService.auto_check_out_stale(now=self.NOW) == 5
+
+        def state(check_in_id):
+            c = db.session.get(CheckIn, check_in_id)
+            return c.status, c.check_out_time, c.duration
+
+        assert state(same_day) == ('checked_out', day.replace(hour=22), 13 * 60)
+        assert state(reserved) == ('checked_out', day.replace(hour=12), 2 * 60)
+        assert state(two_days_ago) == ('checked_out', day - timedelta(days=2) + timedelta(hours=22), 12 * 60)
+        assert state(ancient) == ('expired', None, None)
+        # 关门后签到不计学习时长，不会拖到次日关门
+        assert state(after_close) == ('checked_out', day.replace(hour=22, minute=30), 0)
+        assert state(overnight)[0] == 'checked_in'
+        assert CheckInService.auto_check_out_stale(now=self.NOW) == 0
+
+    def test_one_update_per_batch(self, app, monkeypatch):
+        monkeypatch.setattr(CheckInService, 'AUTO_CHECKOUT_BATCH_SIZE', 2)
+        for student_id in (1, 2, 3):
+            self._check_in(student_id, 1, self.NOW.replace(hour=8 + student_id))
+
+        with count_queries() as statements:
+            closed = CheckInService.auto_check_out_stale(now=self.NOW)
+
+        assert closed == 3
+        assert len([s for s in statements if s.startswith('UPDATE')]) == 2
+        assert sorted(c.duration for c in CheckIn.query.all()) == [11 * 60, 12 * 60, 13 * 60]
+
+    @pytest.mark.parametrize('returning', [True, False])
+    def test_occupancy_follows_rows_actually_closed(self, app, monkeypatch, returning):
+        """选出后被手动签退的记录不计入关闭数，也不重复扣减入座人数"""
+        monkeypatch.setattr(db.session.get_bind().dialect, 'update_returning', returning)
+        ids = [self._check_in(student_id, 1, self.NOW.replace(hour=8 + student_id)) for student_id in (1, 2, 3)]
+        OccupancyService.reconcile()
+
+        # 批量读取之后、关闭之前，另一个请求签退了其中一条
+        executed = []
+
+        def concurrent_check_out(orm_execute_state):
+            executed.append(orm_execute_state.statement)
+            if len(executed) == 2:
+                orm_execute_state.session.connection().execute(
+                    update(CheckIn).where(CheckIn.id == ids[0]).values(status='checked_out')
+                )
+        event.listen(db.session, 'do_orm_execute', concurrent_check_out)
+        try:
+            closed = CheckInService._close_check_ins(
+                db.session.query(CheckIn.id).filter(CheckIn.status == 'checked_in'), literal(self.NOW)
+            )
+        finally:
+            event.remove(db.session, 'do_orm_execute', concurrent_check_out)
+
+        assert closed == 2
+        # 手动签退自行扣减，这里只模拟了数据库中的状态变化
+        assert OccupancyService._state()['counts'][1] == 1
+
+    def test_close_time_is_local_wall_clock(self, app):
+        """关门时间按本地时区理解：北京时间 22:00 即 UTC 14:00"""
+        app.config['LOCAL_TIMEZONE'] = 'Asia/Shanghai'
+        day = self.NOW.replace(hour=0)
+        morning = self._check_in(1, 1, day.replace(hour=1))
+        evening = self._check_in(2, 1, day.replace(hour=13, minute=30))
+        after_close = self._check_in(3, 1, day.replace(hour=14, minute=30))
+
+        # UTC 13:45 即北京时间 21:45，尚未关门
+        assert CheckInService.auto_check_out_stale(now=day.replace(hour=13, minute=45)) == 0
+        # UTC 15:00 即北京时间 23:00，已过当天关门时间
+        assert CheckInService.auto_check_out_stale(now=day.replace(hour=15)) == 3
+        assert db.session.get(CheckIn, morning).check_out_time == day.replace(hour=14)
+        assert db.session.get(CheckIn, evening).check_out_time == day.replace(hour=14)
+        assert db.session.get(CheckIn, after_close).duration == 0
+
+    def test_check_in_while_closed_before_opening(self, app):
+        """设置了开门时间时，关门后到次日开门前的签到都以签到时间签退"""
+        db.session.get(StudyRoom, 1).open_time = time(8, 0)
+        db.session.commit()
+        day = self.NOW.replace(hour=0)
+        early = self._check_in(1, 1, day.replace(hour=7))
+        studying = self._check_in(2, 1, day.replace(hour=8))
+        late = self._check_in(3, 1, day - timedelta(days=1) + timedelta(hours=23))
+
+        assert CheckInService.auto_check_out_stale(now=self.NOW) == 3
+        assert db.session.get(CheckIn, early).duration == 0
+        assert db.session.get(CheckIn, late).check_out_time == day - timedelta(days=1) + timedelta(hours=23)
+        assert db.session.get(CheckIn, studying).duration == 14 * 60
+
+    def test_room_without_close_time_is_not_auto_checked_out(self, app):
+        assert db.session.get(StudyRoom, 2).close_time is None
+        check_in_id = self._check_in(1, 2, self.NOW - timedelta(days=2))
+
+        assert CheckInService.auto_check_out_stale(now=self.NOW) == 0
+        assert db.session.get(CheckIn, check_in_id).status == 'checked_in'
+
+
+class TestCheckInHistory:
+
+    @pytest.fixture
+    def app(self):
+        app = create_app('test')
+
+        with app.app_context():
+            db.create_all()
+            student = User(username='test_student', password='password', role='student', name='测试学生')
+            rooms = [StudyRoom(id=1, name='自习室一', location='一楼'), StudyRoom(id=2, name='自习室二', location='二楼')]
+            db.session.add_all([student] + rooms)
+            db.session.add(QRCode(id=1, room_id=1, code=QRCode.generate_code(), expires_at=datetime.utcnow()))
+            db.session.commit()
+
+            base = datetime(2025, 6, 19, 8, 0)
+            db.session.add_all([
+                CheckIn(student_id=student.id, room_id=1 + i % 2, qrcode_id=1, status='checked_out',
+                        check_in_time=base + timedelta(hours=i // 2))
+                for i in range(7)
+            ])
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    def test_pages_with_cursor_in_one_query_each(self, app):
+        student_id = User.query.filter_by(username='test_student').one().id
+        seen = []
+        cursor = None
+        while True:
+            with count_queries() as statements:
+                result = CheckInService.get_student_check_ins(student_id, status='checked_out', limit=3, cursor=cursor)
+            assert result['success'] is True
+            assert len(statements) == 1
+            seen.extend(result['data'])
+            cursor = result['next_cursor']
+            if cursor is None:
+                break
+
+        assert len(seen) == 7
+        assert len({r['id'] for r in seen}) == 7
+        keys = [(r['check_in_time'], r['id']) for r in seen]
+        assert keys == sorted(keys, reverse=True)
+        assert {r['room_name'] for r in seen} == {'自习室一', '自习室二'}
+
+    def test_status_filter_and_bad_cursor(self, app):
+        student_id = User.query.filter_by(username='test_student').one().id
+
+        assert CheckInService.get_student_check_ins(student_id, status='checked_in')['data'] == []
+        assert CheckInService.get_student_check_ins(student_id, cursor='not-a-cursor')['success'] is False
+
+    def test_legacy_offset_still_pages(self, app):
+        """旧客户端的 offset 翻页仍然可用，结果与游标翻页一致"""
+        student_id = User.query.filter_by(username='test_student').one().id
+        first = CheckInService.get_student_check_ins(student_id, limit=3)
+        by_cursor = CheckInService.get_student_check_ins(student_id, limit=3, cursor=first['next_cursor'])
+        by_offset = CheckInService.get_student_check_ins(student_id, limit=3, offset=3)
+
+        assert [r['id'] for r in by_offset['data']] == [r['id'] for r in by_cursor['data']]
+        assert by_offset['next_cursor'] is not None
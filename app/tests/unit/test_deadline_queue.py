@@ -0,0 +1,122 @@
+import pytest
+from datetime import datetime, timedelta
+from apscheduler.schedulers.background import BackgroundScheduler
+from app import create_app
+from app.models import User, StudyRoom, Reservation, SystemSetting
+from app.models import db
+from app.services import DeadlineQueue, SettingsStore, ViolationService
+from app.tasks import violation_tasks
+from app.tests.conftest import count_queries
+
+
+class TestDeadlineQueue:
+
+    @pytest.fixture
+    def app(self):
+        app = create_app('test')
+
+        with app.app_context():
+            db.create_all()
+            student = User(username='test_student', password='password', role='student', name='测试学生')
+            room = StudyRoom(name='测试自习室', location='一楼')
+            db.session.add_all([
+                student, room,
+                SystemSetting(key='REMINDER_BEFORE_MINUTES', value='15', description=''),
+                SystemSetting(key='NO_SHOW_TIMEOUT_MINUTES', value='10', description='')
+            ])
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    @staticmethod
+    def _reserve(start, status='scheduled'):
+        student = User.query.filter_by(username='test_student').one()
+        room = StudyRoom.query.filter_by(name='测试自习室').one()
+        reservation = Reservation(student_id=student.id, room_id=room.id, status=status,
+                                  start_time=start, end_time=start + timedelta(hours=1))
+        db.session.add(reservation)
+        db.session.commit()
+        return reservation.id
+
+    def test_rebuild_orders_deadlines(self, app):
+        """重建后按到期时间依次弹出提醒和违约截止时间"""
+        now = datetime.utcnow()
+        start = now + timedelta(hours=1)
+        self._reserve(start)
+        self._reserve(now + timedelta(hours=2), status='cancelled')
+
+        assert DeadlineQueue.rebuild(now) == 2
+        assert DeadlineQueue.next_due() == start - timedelta(minutes=15)
+
+        assert DeadlineQueue.pop_due(start - timedelta(minutes=16)) == []
+        assert [kind for _, kind, _ in DeadlineQueue.pop_due(start - timedelta(minutes=15))] == [DeadlineQueue.REMINDER]
+        assert DeadlineQueue.next_due() == start + timedelta(minutes=10)
+        assert [kind for _, kind, _ in DeadlineQueue.pop_due(start + timedelta(minutes=10))] == [DeadlineQueue.NO_SHOW]
+        assert DeadlineQueue.next_due() is None
+
+    def test_sync_loads_only_new_reservations(self, app):
+        """增量加载不重复加入已入堆的预约，空闲时只有一次查询"""
+        now = datetime.utcnow()
+        self._reserve(now + timedelta(hours=1))
+        assert DeadlineQueue.sync(now) == 2
+
+        with count_queries() as statements:
+            assert DeadlineQueue.sync(now) == 0
+        assert len(statements) == 1
+
+        # 已提醒过的预约只加入违约截止时间
+        reservation_id = self._reserve(now + timedelta(minutes=30))
+        db.session.get(Reservation, reservation_id).reminder_sent_at = now
+        db.session.commit()
+        assert DeadlineQueue.sync(now) == 1
+        assert DeadlineQueue.next_due() == now + timedelta(minutes=40)
+
+    def test_setting_change_triggers_rebuild(self, app):
+        """提醒时间配置变化后按新配置重建堆"""
+        now = datetime.utcnow()
+        start = now + timedelta(hours=1)
+        self._reserve(start)
+        DeadlineQueue.sync(now)
+
+        db.session.get(SystemSetting, 'REMINDER_BEFORE_MINUTES').value = '30'
+        SettingsStore.bump_version()
+        db.session.commit()
+        SettingsStore.invalidate()
+
+        assert DeadlineQueue.sync(now) == 2
+        assert DeadlineQueue.next_due() == start - timedelta(minutes=30)
+
+
+    def test_sync_picks_up_late_commit_with_lower_id(self, app):
+        """id 较小但晚于上次加载才提交的预约，在回看窗口内被补上"""
+        now = datetime.utcnow()
+        late_id = self._reserve(now + timedelta(hours=1))
+        self._reserve(now + timedelta(hours=2))
+        # 模拟 late_id 所在事务晚提交：上次加载时只看到了 id 较大的预约
+        db.session.get(Reservation, late_id).status = 'pending_commit'
+        db.session.commit()
+        assert DeadlineQueue.sync(now) == 2
+
+        db.session.get(Reservation, late_id).status = 'scheduled'
+        db.session.commit()
+        assert DeadlineQueue.sync(now + timedelta(seconds=30)) == 2
+        assert DeadlineQueue.next_due() == now + timedelta(hours=1) - timedelta(minutes=15)
+
+    def test_failed_processor_pushes_deadlines_back(self, app, monkeypatch):
+        """处理出错时已弹出的截止时间放回堆中，稍后重试"""
+        now = datetime.utcnow()
+        self._reserve(now - timedelta(minutes=20))
+        DeadlineQueue.rebuild(now)
+
+        def fail():
+            raise RuntimeError('数据库不可用')
+        monkeypatch.setattr(ViolationService, 'process_no_show_violations', fail)
+        scheduler = BackgroundScheduler()
+        violation_tasks.fire_reservation_deadlines(app, scheduler)
+
+        job = scheduler.get_job(violation_tasks.DEADLINE_JOB_ID)
+        assert job is not None
+        retry_at = DeadlineQueue.next_due()
+        assert retry_at > now
+        assert [kind for _, kind, _ in DeadlineQueue.pop_due(retry_at)] == [DeadlineQueue.NO_SHOW]
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from app import create_app
 from app.models.db import db
 from app.models import User, StudyRoom, Reservation, Notification, SystemSetting
+from app.services import SettingsStore, NotificationService
 from flask_jwt_extended import create_access_token
 
 @pytest.fixture(scope='module')
@@ -74,6 +75,26 @@ class TestReservationRoutes:
         assert data['code'] == 200
         assert len(data['data']) == 1
         assert data['data'][0]['message'] == '一条测试通知'
+        assert data['next_cursor'] is None
+
+    def test_unread_count_and_read_all(self, client, student_token):
+        headers = {'Authorization': f'Bearer {student_token}'}
+        student = User.query.filter_by(username='test_student').one()
+        NotificationService.notify_many([{'user_id': student.id, 'message': '新通知'}])
+        db.session.commit()
+
+        res = client.get('/api/reservations/notifications/unread-count', headers=headers)
+        assert json.loads(res.data)['data']['unread_count'] == 1
+
+        res = client.post('/api/reservations/notifications/read-all', headers=headers)
+        data = json.loads(res.data)
+        assert res.status_code == 200
+        assert data['data']['updated'] == 2
+
+        res = client.get('/api/reservations/notifications?unread_only=true', headers=headers)
+        data = json.loads(res.data)
+        assert data['data'] == []
+        assert data['unread_count'] == 0
 
 class TestAdminRoutes:
     def test_get_settings_as_admin(self, client, admin_token):
@@ -90,6 +111,7 @@ class TestAdminRoutes:
         assert data['code'] == 403
 
     def test_update_settings_as_admin(self, client, admin_token):
+        assert SettingsStore.get('TEST_KEY') == 'test_value'
         update_data = {'key': 'TEST_KEY', 'value': 'new_value'}
         res = client.post('/api/admin/settings', headers={'Authorization': f'Bearer {admin_token}'}, json=update_data)
         data = json.loads(res.data)
@@ -97,6 +119,9 @@ class TestAdminRoutes:
         assert data['code'] == 200
         setting = db.session.get(SystemSetting, 'TEST_KEY')
         assert setting.value == 'new_value'
+        # 本进程缓存立即失效，版本令牌随配置一起提交
+        assert SettingsStore.get('TEST_KEY') == 'new_value'
+        assert db.session.get(SystemSetting, SettingsStore.VERSION_KEY) is not None
 
     def test_get_all_violations_as_admin(self, client, admin_token):
         res = client.get('/api/admin/violations/all', headers={'Authorization': f'Bearer {admin_token}'})
@@ -0,0 +1,85 @@
+import pytest
+from datetime import datetime, timedelta
+from app import create_app
+from app.models import User, Notification
+from app.models import db
+from app.services import NotificationService
+from app.tests.conftest import count_queries
+
+
+class TestNotificationService:
+
+    @pytest.fixture
+    def app(self):
+        app = create_app('test')
+
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([
+                User(username='student_a', password='password', role='student', name='学生甲'),
+                User(username='student_b', password='password', role='student', name='学生乙')
+            ])
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    @staticmethod
+    def _user_id(username):
+        return User.query.filter_by(username=username).one().id
+
+    def test_notify_many_maintains_unread_counts(self, app):
+        """批量写入通知时一条 UPDATE 累加各用户的未读数"""
+        a, b = self._user_id('student_a'), self._user_id('student_b')
+
+        with count_queries() as statements:
+            NotificationService.notify_many([
+                {'user_id': a, 'message': '一'}, {'user_id': b, 'message': '二'}, {'user_id': a, 'message': '三'}
+            ])
+        db.session.commit()
+
+        assert len(statements) == 2
+        assert NotificationService.unread_count(a) == 2
+        assert NotificationService.unread_count(b) == 1
+
+    def test_list_notifications_pages_with_cursor(self, app):
+        """按创建时间倒序键集翻页，可只看未读"""
+        a = self._user_id('student_a')
+        now = datetime.utcnow()
+        for minutes in range(5):
+            NotificationService.notify_many([{'user_id': a, 'message': f'通知{minutes}'}],
+                                            now - timedelta(minutes=minutes))
+        db.session.commit()
+        latest = Notification.query.filter_by(message='通知0').one()
+        NotificationService.mark_read(a, latest.id)
+
+        first = NotificationService.list_notifications(a, limit=2)
+        second = NotificationService.list_notifications(a, limit=2, cursor=first['next_cursor'])
+        last = NotificationService.list_notifications(a, limit=2, cursor=second['next_cursor'])
+
+        assert [n['message'] for n in first['data'] + second['data'] + last['data']] == [
+            '通知0', '通知1', '通知2', '通知3', '通知4'
+        ]
+        assert last['next_cursor'] is None
+
+        unread = NotificationService.list_notifications(a, unread_only=True)
+        assert [n['message'] for n in unread['data']] == ['通知1', '通知2', '通知3', '通知4']
+        assert NotificationService.list_notifications(a, cursor='bad')['success'] is False
+
+    def test_mark_read_and_mark_all_read(self, app):
+        """单条标记只扣减一次，全部已读用一条 UPDATE 完成"""
+        a, b = self._user_id('student_a'), self._user_id('student_b')
+        NotificationService.notify_many([{'user_id': a, 'message': str(i)} for i in range(3)])
+        NotificationService.notify_many([{'user_id': b, 'message': '乙'}])
+        db.session.commit()
+        first = Notification.query.filter_by(user_id=a).first()
+
+        assert NotificationService.mark_read(a, first.id) is True
+        assert NotificationService.mark_read(a, first.id) is True
+        assert NotificationService.mark_read(b, first.id) is False
+        assert NotificationService.unread_count(a) == 2
+
+        assert NotificationService.mark_all_read(a) == 2
+        assert NotificationService.unread_count(a) == 0
+        assert Notification.query.filter_by(user_id=a, is_read=False).count() == 0
+        assert NotificationService.unread_count(b) == 1
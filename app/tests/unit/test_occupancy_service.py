@@ -0,0 +1,84 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from app import create_app
+from app.models import User, StudyRoom, QRCode, CheckIn
+from app.models.db import db
+from app.services.check_in_service import CheckInService
+from app.services.occupancy_service import OccupancyService
+from app.services.qrcode_service import QRCodeService
+from app.tests.conftest import count_queries
+
+
+class TestOccupancy:
+
+    @pytest.fixture
+    def app(self):
+        app = create_app('test')
+
+        with app.app_context():
+            db.create_all()
+            students = [User(username=f'student{i}', password='password', role='student', name=f'学生{i}')
+                        for i in range(1, 4)]
+            rooms = [
+                StudyRoom(id=1, name='自习室一', location='一楼', capacity=4),
+                StudyRoom(id=2, name='自习室二', location='二楼', capacity=0),
+            ]
+            db.session.add_all(students + rooms)
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    @staticmethod
+    def _scan(student_id, room_id):
+        encoded = QRCodeService.encode_qrcode_for_display(QRCodeService.get_active_qrcode(room_id))
+        assert CheckInService.student_check_in(student_id, encoded)['success'] is True
+
+    def test_counts_follow_check_in_and_check_out_without_sql(self, app):
+        OccupancyService.reconcile()
+        self._scan(1, 1)
+        self._scan(2, 1)
+        self._scan(3, 2)
+        assert CheckInService.student_check_out(2, 1)['success'] is True
+
+        with count_queries() as statements:
+            counts = OccupancyService.get_counts()
+
+        assert counts == {1: 1, 2: 1}
+        assert statements == []
+
+    def test_auto_checkout_decrements_counts(self, app):
+        OccupancyService.reconcile()
+        self._scan(1, 1)
+        room = db.session.get(StudyRoom, 1)
+        now = datetime.utcnow()
+        room.close_time = (now - timedelta(minutes=1)).time()
+        db.session.execute(update(CheckIn).values(check_in_time=now - timedelta(hours=1)))
+        db.session.commit()
+
+        assert CheckInService.auto_check_out_stale(now=now) == 1
+        assert OccupancyService.get_counts().get(1, 0) == 0
+
+    def test_reconcile_corrects_drift(self, app):
+        OccupancyService.reconcile()
+        self._scan(1, 1)
+        # 模拟其它进程签到：绕过服务直接写库
+        qrcode_id = QRCode.query.filter_by(room_id=1).first().id
+        db.session.add(CheckIn(student_id=2, room_id=1, qrcode_id=qrcode_id, status='checked_in'))
+        db.session.commit()
+
+        assert OccupancyService.get_counts() == {1: 1}
+        assert OccupancyService.reconcile() == 1
+        assert OccupancyService.get_counts() == {1: 2}
+
+    def test_all_rooms_endpoint(self, app):
+        self._scan(1, 1)
+
+        response = app.test_client().get('/api/search/room-occupancy')
+
+        assert response.status_code == 200
+        assert response.get_json() == [
+            {'room_id': 1, 'room_name': '自习室一', 'capacity': 4, 'occupied': 1, 'available': 3, 'occupancy_rate': 0.25},
+            {'room_id': 2, 'room_name': '自习室二', 'capacity': 0, 'occupied': 0, 'available': None, 'occupancy_rate': None},
+        ]
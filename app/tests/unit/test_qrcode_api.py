@@ -0,0 +1,138 @@
+import json
+import pytest
+from app import create_app
+from app.models import User, StudyRoom
+from app.models.db import db
+from app.services.qrcode_service import QRCodeService
+from app.tests.conftest import count_queries
+from flask_jwt_extended import create_access_token
+
+
+def _next_event(stream):
+    """读取下一个 qrcode 事件的数据，跳过 retry 与心跳行"""
+    for chunk in stream:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if chunk.startswith('event: qrcode'):
+            return json.loads(chunk.split('data: ', 1)[1])
+    raise AssertionError('事件流提前结束')
+
+
+class TestQRCodeStreamAPI:
+
+    @pytest.fixture
+    def app(self):
+        app = create_app('test')
+
+        with app.app_context():
+            db.create_all()
+            admin = User(username='admin', password='password', role='admin', name='管理员')
+            student = User(username='test_student', password='password', role='student', name='测试学生')
+            room = StudyRoom(id=1, name='测试自习室', location='测试位置', qrcode_refresh_interval=30)
+            db.session.add_all([admin, student, room])
+            db.session.commit()
+
+        yield app
+
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _token(self, app, username):
+        with app.app_context():
+            user = User.query.filter_by(username=username).first()
+            return create_access_token(identity=str(user.id))
+
+    def _ticket(self, app, room_id=1):
+        response = app.test_client().post(
+            f'/api/qrcode/room/{room_id}/stream/ticket',
+            headers={'Authorization': f'Bearer {self._token(app, "admin")}'}
+        )
+        assert response.status_code == 200
+        return response.get_json()['data']['ticket']
+
+    def test_stream_pushes_current_code_then_rotation(self, app):
+        ticket = self._ticket(app)
+        response = app.test_client().get(f'/api/qrcode/room/1/stream?ticket={ticket}')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'text/event-stream'
+        stream = iter(response.response)
+
+        first = _next_event(stream)
+        assert first['room_name'] == '测试自习室'
+        assert first['expires_in'] > 0
+
+        with app.app_context():
+            rotated = QRCodeService.generate_room_qrcode(1)
+
+        second = _next_event(stream)
+        assert second['qrcode_data'] != first['qrcode_data']
+        decoded = QRCodeService.decode_qrcode(second['qrcode_data'])['data']
+        assert (decoded['room_id'], decoded['code']) == (1, rotated['data']['code'])
+        response.close()
+
+    def test_stream_serves_unchanged_code_from_cache(self, app):
+        ticket = self._ticket(app)
+        response = app.test_client().get(f'/api/qrcode/room/1/stream?ticket={ticket}')
+        stream = iter(response.response)
+        _next_event(stream)
+
+        # 无关的缓存变更唤醒推送流后，只发送心跳且不访问数据库
+        with app.app_context():
+            QRCodeService.rotation_signal(1).notify()
+            with count_queries() as statements:
+                chunk = next(stream)
+
+        assert chunk.decode() == ': keepalive\n\n'
+        assert statements == []
+        response.close()
+
+    def test_cache_write_notifies_only_changed_room(self, app):
+        with app.app_context():
+            db.session.add(StudyRoom(id=2, name='另一自习室', location='测试位置', qrcode_refresh_interval=30))
+            db.session.commit()
+            QRCodeService.generate_room_qrcode(1)
+            room_1 = QRCodeService.rotation_signal(1)
+            seen = room_1.version
+
+            # 其它自习室轮换不唤醒本自习室的推送流
+            QRCodeService.generate_room_qrcode(2)
+            assert room_1.version == seen
+
+            # 缓存过期后回库重建出相同的二维码，也不算变更
+            cached_at, codes = QRCodeService._active_codes()[1]
+            QRCodeService._active_codes()[1] = (cached_at - QRCodeService.ACTIVE_CODE_TTL, codes)
+            QRCodeService.get_active_qrcode(1)
+            assert room_1.version == seen
+
+            QRCodeService.generate_room_qrcode(1)
+            assert room_1.version != seen
+
+    def test_stream_ticket_requires_admin(self, app):
+        token = self._token(app, 'test_student')
+        response = app.test_client().post(
+            '/api/qrcode/room/1/stream/ticket', headers={'Authorization': f'Bearer {token}'}
+        )
+
+        assert response.status_code == 403
+
+    def test_stream_rejects_access_token_and_foreign_ticket(self, app):
+        token = self._token(app, 'admin')
+        with app.app_context():
+            db.session.add(StudyRoom(id=2, name='另一自习室', location='测试位置', qrcode_refresh_interval=30))
+            db.session.commit()
+        client = app.test_client()
+
+        assert client.get(f'/api/qrcode/room/1/stream?jwt={token}').status_code == 401
+        # 票据只能订阅签发时指定的自习室
+        assert client.get(f'/api/qrcode/room/2/stream?ticket={self._ticket(app, 1)}').status_code == 401
+
+    def test_stream_ticket_expires(self, app):
+        ticket = self._ticket(app)
+        with app.app_context():
+            assert QRCodeService.verify_stream_ticket(ticket, 1) is not None
+            QRCodeService.STREAM_TICKET_SECONDS = -1
+            try:
+                assert QRCodeService.verify_stream_ticket(ticket, 1) is None
+            finally:
+                QRCodeService.STREAM_TICKET_SECONDS = 60
@@ -0,0 +1,278 @@
+import base64
+import json
+import pytest
+from sqlalchemy import event
+from sqlalchemy.dialects import mysql
+from datetime import datetime, timedelta
+from app import create_app
+from app.models import User, StudyRoom, QRCode, CheckIn
+from app.models.db import db
+from app.services.qrcode_service import QRCodeService
+from app.tasks.qrcode_tasks import refresh_expired_qrcodes, prune_inactive_qrcodes
+from app.tests.conftest import count_queries
+
+
+class TestQRCodeRefresh:
+
+    @pytest.fixture
+    def app(self):
+        app = create_app('test')
+
+        with app.app_context():
+            db.create_all()
+            rooms = [StudyRoom(id=i, name=f'自习室{i}', location='测试楼', qrcode_refresh_interval=10 * i) for i in (1, 2, 3)]
+            db.session.add_all(rooms)
+            db.session.commit()
+
+            now = datetime.utcnow()
+            db.session.add_all([
+                # 1 号自习室的二维码仍有效
+                QRCode(room_id=1, code=QRCode.generate_code(), expires_at=now + timedelta(minutes=5), is_active=True),
+                # 2 号自习室的二维码已过期
+                QRCode(room_id=2, code=QRCode.generate_code(), expires_at=now - timedelta(minutes=1), is_active=True),
+                # 3 号自习室没有有效二维码
+            ])
+            db.session.commit()
+
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    def test_refresh_rotates_only_missing_or_expired(self, app):
+        refreshed = QRCodeService.refresh_expired_qrcodes()
+
+        assert sorted(c['room_id'] for c in refreshed) == [2, 3]
+        assert QRCode.query.filter_by(room_id=1, is_active=True).count() == 1
+        for room_id in (2, 3):
+            active = QRCode.query.filter_by(room_id=room_id, is_active=True).all()
+            assert len(active) == 1
+            assert not active[0].is_expired()
+        assert QRCode.query.filter_by(room_id=2, is_active=False).count() == 1
+
+        # 全部有效时不做任何写入
+        assert QRCodeService.refresh_expired_qrcodes() == []
+
+    def test_refresh_statement_count_independent_of_room_count(self, app):
+        with count_queries() as few_rooms:
+            QRCodeService.refresh_expired_qrcodes(now=datetime.utcnow() + timedelta(days=1))
+
+        db.session.add_all([StudyRoom(name=f'新自习室{i}', location='测试楼') for i in range(50)])
+        db.session.commit()
+
+        with count_queries() as many_rooms:
+            refreshed = QRCodeService.refresh_expired_qrcodes(now=datetime.utcnow() + timedelta(days=2))
+
+        assert len(refreshed) == 53
+        assert len(many_rooms) == len(few_rooms)
+
+    def test_refresh_statements_compile_for_mysql(self, app):
+        """生产库为 MySQL，刷新任务的语句不能依赖 INSERT ... RETURNING"""
+        executed = []
+
+        # 在 ORM 改写之前记录服务构造的原始语句
+        def capture(orm_execute_state):
+            executed.append(orm_execute_state.statement)
+
+        event.listen(db.session, 'do_orm_execute', capture)
+        try:
+            refreshed = QRCodeService.refresh_expired_qrcodes()
+        finally:
+            event.remove(db.session, 'do_orm_execute', capture)
+
+        assert len(refreshed) == 2
+        assert any(stmt.is_insert for stmt in executed)
+        dialect = mysql.dialect()
+        assert not dialect.insert_executemany_returning
+        for stmt in executed:
+            if stmt.is_dml:
+                # exported_columns 即 RETURNING 子句的列
+                assert len(stmt.exported_columns) == 0
+            else:
+                stmt.compile(dialect=dialect)
+
+    def test_refresh_job_logs_counts(self, app, caplog):
+        with caplog.at_level('INFO'):
+            refresh_expired_qrcodes(app)
+
+        assert '轮换 2 个自习室' in caplog.text
+
+    def test_next_code_published_before_expiry_and_both_verify(self, app):
+        """当前二维码进入重叠窗口后预先生成下一张，两张同时有效"""
+        now = datetime.utcnow()
+        current = QRCode.query.filter_by(room_id=1, is_active=True).one()
+        current.expires_at = now + timedelta(minutes=1)
+        db.session.commit()
+
+        refreshed = QRCodeService.refresh_expired_qrcodes(now=now)
+
+        next_code = next(c for c in refreshed if c['room_id'] == 1)
+        # 从旧码的过期时间接续一个周期，而不是从任务执行时刻起算
+        assert next_code['expires_at'] == current.expires_at + timedelta(minutes=10)
+        assert QRCode.query.filter_by(room_id=1, is_active=True).count() == 2
+        # 展示端切换到新码，旧码仍能签到
+        assert QRCodeService.get_active_qrcode(1)['data']['code'] == next_code['code']
+        for code, expires_at in ((current.code, current.expires_at), (next_code['code'], next_code['expires_at'])):
+            data = {'room_id': 1, 'code': code, 'expires_at': expires_at.isoformat()}
+            encoded = QRCodeService.encode_qrcode_for_display(
+                {'data': data, 'signature': QRCodeService.generate_signature(data)}
+            )
+            assert QRCodeService.verify_qrcode(encoded)[0] is True
+
+        # 重叠窗口内不会重复生成，旧码过期后被置为失效
+        assert QRCodeService.refresh_expired_qrcodes(now=now + timedelta(seconds=30)) == []
+        assert QRCodeService.refresh_expired_qrcodes(now=now + timedelta(minutes=2)) == []
+        assert db.session.get(QRCode, current.id).is_active is False
+
+
+class TestQRCodeVerifyCache:
+
+    @pytest.fixture
+    def app(self):
+        app = create_app('test')
+
+        with app.app_context():
+            db.create_all()
+            db.session.add(StudyRoom(id=1, name='自习室1', location='测试楼', qrcode_refresh_interval=30))
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    @staticmethod
+    def _encode(qrcode):
+        return QRCodeService.encode_qrcode_for_display({'data': qrcode['data'], 'signature': qrcode['signature']})
+
+    def test_valid_scan_issues_no_sql(self, app):
+        qrcode = QRCodeService.generate_room_qrcode(1)
+
+        with count_queries() as statements:
+            is_valid, error_msg, active = QRCodeService.verify_qrcode(self._encode(qrcode))
+
+        assert is_valid is True
+        assert active.id == qrcode['qrcode_id']
+        assert active.room_id == 1
+        assert statements == []
+
+    def test_rotated_code_falls_back_to_db(self, app):
+        old = QRCodeService.generate_room_qrcode(1)
+        new = QRCodeService.generate_room_qrcode(1)
+
+        with count_queries() as statements:
+            is_valid, error_msg, _ = QRCodeService.verify_qrcode(self._encode(old))
+
+        assert is_valid is False
+        assert error_msg == "无效的二维码"
+        assert len(statements) == 1
+        assert QRCodeService.verify_qrcode(self._encode(new))[0] is True
+
+    def test_cache_miss_is_filled_from_db(self, app):
+        qrcode = QRCodeService.generate_room_qrcode(1)
+        app.extensions['qrcode_active_codes'].clear()
+
+        with count_queries() as first:
+            assert QRCodeService.verify_qrcode(self._encode(qrcode))[0] is True
+        with count_queries() as second:
+            assert QRCodeService.verify_qrcode(self._encode(qrcode))[0] is True
+
+        assert len(first) == 1
+        assert second == []
+
+    def test_refresh_job_populates_cache(self, app):
+        refreshed = QRCodeService.refresh_expired_qrcodes()
+        code = refreshed[0]
+        data = {'room_id': 1, 'code': code['code'], 'expires_at': code['expires_at'].isoformat()}
+        encoded = self._encode({'data': data, 'signature': QRCodeService.generate_signature(data)})
+
+        with count_queries() as statements:
+            is_valid, _, active = QRCodeService.verify_qrcode(encoded)
+
+        assert is_valid is True
+        assert active.id == QRCode.query.filter_by(code=code['code']).one().id
+        assert statements == []
+
+    def test_compact_payload_round_trip_without_json(self, app, monkeypatch):
+        def no_json(*args, **kwargs):
+            raise AssertionError('紧凑格式不应序列化 JSON')
+        monkeypatch.setattr('app.services.qrcode_service.json.dumps', no_json)
+
+        # 生成与展示二维码都只对打包后的字节签名
+        qrcode = QRCodeService.generate_room_qrcode(1)
+        assert QRCodeService.get_active_qrcode(1)['signature'] == qrcode['signature']
+        encoded = QRCodeService.encode_qrcode_for_display(qrcode)
+        is_valid, _, active = QRCodeService.verify_qrcode(encoded)
+
+        assert len(encoded) == QRCodeService.COMPACT_ENCODED_LENGTH
+        assert is_valid is True
+        assert active.code == qrcode['data']['code']
+
+    def test_tampered_compact_payload_rejected(self, app):
+        qrcode = QRCodeService.generate_room_qrcode(1)
+        raw = bytearray(base64.urlsafe_b64decode(QRCodeService.encode_qrcode_for_display(qrcode) + '='))
+        # 改写 room_id
+        raw[4] ^= 0x02
+        tampered = base64.urlsafe_b64encode(bytes(raw)).rstrip(b'=').decode()
+
+        assert QRCodeService.verify_qrcode(tampered)[:2] == (False, "二维码验证失败，可能已被篡改")
+
+    def test_legacy_json_payload_still_accepted(self, app):
+        qrcode = QRCodeService.generate_room_qrcode(1)
+        signature = QRCodeService.generate_signature(qrcode['data'])
+        legacy = base64.b64encode(
+            json.dumps({'data': qrcode['data'], 'signature': signature}).encode()
+        ).decode()
+
+        assert QRCodeService.verify_qrcode(legacy)[0] is True
+        forged = base64.b64encode(json.dumps({'data': qrcode['data'], 'signature': '0' * 64}).encode()).decode()
+        assert QRCodeService.verify_qrcode(forged)[0] is False
+
+
+class TestQRCodePruning:
+
+    @pytest.fixture
+    def app(self):
+        app = create_app('test')
+
+        with app.app_context():
+            db.create_all()
+            student = User(username='test_student', password='password', role='student', name='测试学生')
+            db.session.add_all([student, StudyRoom(id=1, name='自习室1', location='测试楼')])
+            db.session.commit()
+
+            old = datetime.utcnow() - timedelta(days=30)
+            db.session.add_all([
+                QRCode(id=i, room_id=1, code=QRCode.generate_code(), expires_at=old, is_active=False)
+                for i in range(1, 8)
+            ] + [
+                # 保留期内的失效码与仍有效的码
+                QRCode(id=8, room_id=1, code=QRCode.generate_code(),
+                       expires_at=datetime.utcnow() - timedelta(hours=1), is_active=False),
+                QRCode(id=9, room_id=1, code=QRCode.generate_code(),
+                       expires_at=datetime.utcnow() + timedelta(minutes=10), is_active=True),
+            ])
+            db.session.add(CheckIn(student_id=student.id, room_id=1, qrcode_id=3, status='checked_out'))
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    def test_prune_removes_old_unreferenced_codes_in_batches(self, app, monkeypatch):
+        monkeypatch.setattr(QRCodeService, 'PRUNE_BATCH_SIZE', 2)
+
+        removed = QRCodeService.prune_inactive_qrcodes(retention_days=7)
+
+        assert removed == 6
+        assert sorted(q.id for q in QRCode.query.all()) == [3, 8, 9]
+        assert QRCodeService.prune_inactive_qrcodes(retention_days=7) == 0
+
+    def test_prune_stops_after_max_batches(self, app, monkeypatch):
+        monkeypatch.setattr(QRCodeService, 'PRUNE_BATCH_SIZE', 2)
+        monkeypatch.setattr(QRCodeService, 'PRUNE_MAX_BATCHES', 2)
+
+        assert QRCodeService.prune_inactive_qrcodes(retention_days=7) == 4
+        assert QRCodeService.prune_inactive_qrcodes(retention_days=7) == 2
+
+    def test_prune_job_reports_rows_removed(self, app, caplog):
+        with caplog.at_level('INFO'):
+            prune_inactive_qrcodes(app)
+
+        assert '删除 6 行' in caplog.text
@@ -0,0 +1,139 @@
+import pytest
+from datetime import datetime, timedelta
+from app import create_app
+from app.models import User, StudyRoom, Seat, TimeSlot, StudentPreference
+from app.models import db
+from app.services.recommendation_service import RecommendationService
+from app.services.student_service import StudentService
+
+
+class TestRecommendationService:
+
+    @pytest.fixture
+    def app(self):
+        app = create_app('test')
+
+        with app.app_context():
+            db.create_all()
+            student = User(username='test_student', password='password', role='student', name='测试学生')
+            other = User(username='other_student', password='password', role='student', name='其他学生')
+            rooms = [StudyRoom(id=1, name='常去的自习室', location='一楼'), StudyRoom(id=2, name='偶尔去的自习室', location='二楼')]
+            seats = [
+                Seat(id=1, room_id=1, seat_number='A1', has_power=True),
+                Seat(id=2, room_id=1, seat_number='A2', has_power=False),
+                Seat(id=3, room_id=1, seat_number='A3', has_power=True),
+                Seat(id=4, room_id=2, seat_number='B1', has_power=True),
+            ]
+            db.session.add_all([student, other] + rooms + seats)
+            db.session.commit()
+
+            # 历史预约：常在 1 号自习室 A1 座位、上午 9 点、1 小时
+            history = datetime(2025, 3, 1, 9, 0)
+            slots = [
+                TimeSlot(room_id=1, seat_id=1, start_time=history + timedelta(days=d),
+                         end_time=history + timedelta(days=d, hours=1), is_reserved=True, reserved_by=student.id)
+                for d in range(4)
+            ]
+            slots.append(TimeSlot(room_id=2, seat_id=4, start_time=history + timedelta(days=10, hours=5),
+                                  end_time=history + timedelta(days=10, hours=6), is_reserved=True, reserved_by=student.id))
+            slots.append(TimeSlot(room_id=2, seat_id=4, start_time=history, end_time=history + timedelta(hours=2),
+                                  is_reserved=True, reserved_by=other.id))
+            db.session.add_all(slots)
+            db.session.commit()
+
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    def test_refresh_profiles_recomputes_changed_students(self, app):
+        student = User.query.filter_by(username='test_student').one()
+        free_start = datetime(2025, 3, 20, 14, 0)
+        free_slot = TimeSlot(room_id=2, seat_id=4, start_time=free_start, end_time=free_start + timedelta(hours=1))
+        db.session.add(free_slot)
+        db.session.commit()
+        first = datetime.utcnow() + timedelta(hours=1)
+
+        assert RecommendationService.refresh_profiles(now=first) == 2
+        profile = db.session.get(StudentPreference, student.id)
+        assert profile.total_slots == 5
+        assert profile.top_rooms(1) == [(1, 4)]
+        assert profile.usual_hour() == 9
+        assert profile.needs_power()
+
+        # 没有变化时不重算
+        assert RecommendationService.refresh_profiles(now=first + timedelta(minutes=10)) == 0
+
+        # 复用已存在的空闲时间块（不产生新 id）并取消一条自己的预约
+        reused = db.session.get(TimeSlot, free_slot.id)
+        reused.is_reserved = True
+        reused.reserved_by = student.id
+        reused.updated_at = first + timedelta(minutes=12)
+        cancelled = TimeSlot.query.filter_by(reserved_by=student.id, seat_id=1).order_by(TimeSlot.id).first()
+        cancelled.is_reserved = False
+        cancelled.updated_at = first + timedelta(minutes=12)
+        db.session.commit()
+
+        assert RecommendationService.refresh_profiles(now=first + timedelta(minutes=20)) == 1
+        profile = db.session.get(StudentPreference, student.id)
+        assert profile.total_slots == 5
+        assert profile.room_counts == {'1': 3, '2': 2}
+
+        # 提交晚于上次刷新、但写入时间早于水位的变更由回看窗口补上
+        late = datetime(2025, 4, 1, 9, 0)
+        db.session.add(TimeSlot(room_id=1, seat_id=2, start_time=late, end_time=late + timedelta(hours=1),
+                                is_reserved=True, reserved_by=student.id,
+                                updated_at=first + timedelta(minutes=18)))
+        db.session.commit()
+
+        assert RecommendationService.refresh_profiles(now=first + timedelta(minutes=30)) == 1
+        assert db.session.get(StudentPreference, student.id).total_slots == 6
+
+    def test_recommend_ranks_free_seats_by_preference(self, app):
+        student = User.query.filter_by(username='test_student').one()
+        RecommendationService.refresh_profiles()
+
+        # 月末深夜请求：建议时间应顺延到下个月 1 日的 9 点
+        now = datetime(datetime.utcnow().year + 1, 1, 31, 23, 0)
+        usual_start = datetime(now.year, 2, 1, 9, 0)
+        # 常坐的 A1 已被占用
+        db.session.add(TimeSlot(room_id=1, seat_id=1, start_time=usual_start, end_time=usual_start + timedelta(hours=1),
+                                is_reserved=True, reserved_by=None))
+        db.session.commit()
+
+        recommendations = RecommendationService.recommend(student.id, now=now)
+
+        # 需要插座：A2 没有插座被排除，A3 所在自习室最常去，排在 B1 之前
+        assert [r['seat_id'] for r in recommendations] == [3, 4]
+        assert recommendations[0]['suggested_start_time'] == usual_start.isoformat()
+        assert recommendations[0]['suggested_end_time'] == (usual_start + timedelta(hours=1)).isoformat()
+
+    def test_quick_recommendation_without_profile_uses_history(self, app):
+        student = User.query.filter_by(username='test_student').one()
+
+        recommendation = StudentService.get_quick_recommendation(student.id)
+
+        assert recommendation['room_id'] == 1
+        assert recommendation['seat_id'] == 1
+        assert [r['seat_id'] for r in recommendation['alternatives']] == [3, 4]
+        assert db.session.get(StudentPreference, student.id) is None
+
+    def test_quick_recommendation_without_history(self, app):
+        assert StudentService.get_quick_recommendation(999) is None
+
+    def test_refresh_profiles_commits_each_batch(self, app, monkeypatch):
+        student = User.query.filter_by(username='test_student').one()
+        other = User.query.filter_by(username='other_student').one()
+        monkeypatch.setattr(RecommendationService, 'REFRESH_BATCH_SIZE', 1)
+        commits = []
+        monkeypatch.setattr(db.session, 'commit', lambda: commits.append(
+            {p.user_id: p.refreshed_at for p in StudentPreference.query.all()}
+        ))
+        now = datetime.utcnow() + timedelta(hours=1)
+
+        assert RecommendationService.refresh_profiles(now=now) == 2
+
+        # 每批提交一次；前面的批次不推进水位，中途失败时下次仍会重算剩余学生
+        assert commits == [
+            {student.id: None},
+            {student.id: None, other.id: now},
+        ]
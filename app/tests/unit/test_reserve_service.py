@@ -1,6 +1,8 @@
 import pytest
+import threading
 from datetime import datetime, timedelta
 from app import create_app
+from config import TestingConfig
 from app.models import User, StudyRoom, Seat, TimeSlot
 from app.models import db
 from app.services.student_service import StudentService
@@ -78,6 +80,22 @@ class TestStudentReserve:
             assert not result["success"]
             assert "不能超过2小时" in result["message"]
 
+    def test_booking_starts_a_fresh_transaction(self, app, monkeypatch):
+        """读取配置开启的事务在锁定座位前结束，冲突检查不沿用更早的快照"""
+        with app.app_context():
+            student_id = User.query.filter_by(username='test_student').first().id
+            start_time = datetime.utcnow() + timedelta(hours=1)
+            seen = []
+
+            def locked(*args):
+                seen.append(db.session().in_transaction())
+                return {"success": True}
+            monkeypatch.setattr(StudentService, '_reserve_slot_locked', locked)
+
+            StudentService.reserve_slot(student_id, 1, start_time, start_time + timedelta(hours=1))
+
+            assert seen == [False]
+
     def test_conflict_with_existing_reservation(self, app):
         with app.app_context():
             student = User.query.filter_by(username='test_student').first()
@@ -141,3 +159,94 @@ class TestStudentReserve:
 
             assert not result["success"]
             assert "座位不存在" in result["message"]
+
+
+class TestConcurrentReserve:
+
+    @pytest.fixture
+    def app(self, tmp_path, monkeypatch):
+        # 内存库在多线程间共享同一个连接，并发测试需要使用文件库让每个线程拥有独立连接
+        monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'reserve.db'}")
+        app = create_app('test')
+
+        with app.app_context():
+            db.create_all()
+            room = StudyRoom(id=2, name='测试自习室', location='测试楼层')
+            seat = Seat(id=1, room_id=2, seat_number='A1', has_power=True)
+            students = [
+                User(username=f'student_{i}', password='password', role='student', name=f'学生{i}')
+                for i in range(12)
+            ]
+            db.session.add_all([room, seat] + students)
+            db.session.commit()
+
+        yield app
+
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_concurrent_bookings_have_exactly_one_winner(self, app):
+        """多个线程同时抢同一座位的重叠时间段，只有一个预约成功"""
+        with app.app_context():
+            user_ids = [u.id for u in User.query.order_by(User.id).all()]
+
+        start = datetime.utcnow() + timedelta(hours=1)
+        barrier = threading.Barrier(len(user_ids))
+        results = []
+
+        def book(index, user_id):
+            # 一半线程预约完全相同的时间段，另一半错开 30 分钟但仍与之重叠
+            offset = timedelta(minutes=30 * (index % 2))
+            with app.app_context():
+                barrier.wait()
+                results.append(StudentService.reserve_slot(user_id, 1, start + offset, start + offset + timedelta(hours=1)))
+                db.session.remove()
+
+        threads = [threading.Thread(target=book, args=(i, uid)) for i, uid in enumerate(user_ids)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(results) == len(user_ids)
+        assert sum(1 for r in results if r['success']) == 1
+        with app.app_context():
+            assert TimeSlot.query.filter_by(seat_id=1, is_reserved=True).count() == 1
+
+
+def explain_query_plan(query):
+    """返回 SQLite 对该查询的 EXPLAIN QUERY PLAN 明细"""
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = db.session.connection().exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).fetchall()
+    return ' | '.join(row[-1] for row in rows)
+
+
+class TestTimeSlotIndexes:
+
+    @pytest.fixture
+    def app(self):
+        app = create_app('test')
+
+        with app.app_context():
+            db.create_all()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    def test_seat_conflict_check_uses_composite_index(self, app):
+        start = datetime(2025, 6, 19, 10)
+        plan = explain_query_plan(StudentService._seat_conflict_query(1, start, start + timedelta(hours=1)))
+        assert 'USING COVERING INDEX ix_time_slots_seat_reserved_period' in plan
+
+    def test_user_conflict_check_uses_user_index(self, app):
+        start = datetime(2025, 6, 19, 10)
+        plan = explain_query_plan(StudentService._user_conflict_query(1, start, start + timedelta(hours=1)))
+        assert 'USING INDEX ix_time_slots_user_start' in plan
+
+    def test_room_availability_uses_composite_index(self, app):
+        start = datetime(2025, 6, 19, 10)
+        conflict = StudentService._seat_conflict_exists(start, start + timedelta(hours=1))
+        query = db.session.query(Seat.id).filter(Seat.room_id == 1, ~conflict)
+        assert 'ix_time_slots_seat_reserved_period' in explain_query_plan(query)
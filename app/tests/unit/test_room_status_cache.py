@@ -0,0 +1,89 @@
+import pytest
+from datetime import datetime, timedelta
+from app import create_app
+from app.models import User, StudyRoom, Seat
+from app.models import db
+from app.services.student_service import StudentService
+from app.utils.lru_cache import TTLLRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = TTLLRUCache(maxsize=2, ttl=60)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    stats = cache.stats()
+    assert stats['hits'] == 2
+    assert stats['misses'] == 1
+    assert stats['evictions'] == 1
+
+
+def test_lru_cache_expires_entries_after_ttl():
+    cache = TTLLRUCache(maxsize=2, ttl=0)
+    cache.put('a', 1)
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 0
+
+
+class TestRoomStatusCache:
+
+    @pytest.fixture
+    def app(self):
+        app = create_app('test')
+
+        with app.app_context():
+            db.create_all()
+            student = User(username='test_student', password='password', role='student', name='测试学生')
+            rooms = [StudyRoom(id=1, name='自习室一', location='一楼'), StudyRoom(id=2, name='自习室二', location='二楼')]
+            seats = [Seat(id=1, room_id=1, seat_number='A1'), Seat(id=2, room_id=2, seat_number='B1')]
+            db.session.add_all([student] + rooms + seats)
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    def test_repeated_requests_hit_cache(self, app):
+        start = datetime.utcnow() + timedelta(hours=1)
+        end = start + timedelta(hours=1)
+
+        first = StudentService.get_room_seat_status(1, start, end)
+        second = StudentService.get_room_seat_status(1, start, end)
+
+        assert second == first
+        stats = StudentService.get_room_status_cache_stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+
+    def test_reservation_invalidates_only_its_room(self, app):
+        start = datetime.utcnow() + timedelta(hours=1)
+        end = start + timedelta(hours=1)
+        student = User.query.filter_by(username='test_student').one()
+
+        StudentService.get_room_seat_status(1, start, end)
+        other_room = StudentService.get_room_seat_status(2, start, end)
+
+        assert StudentService.reserve_slot(student.id, 1, start, end)['success'] is True
+
+        room_status = StudentService.get_room_seat_status(1, start, end)
+        assert room_status[0]['is_available'] is False
+        assert StudentService.get_room_seat_status(2, start, end) == other_room
+
+        stats = StudentService.get_room_status_cache_stats()
+        assert stats['invalidations'] == 1
+        assert stats['hits'] == 1
+
+    def test_mutating_result_does_not_corrupt_cache(self, app):
+        start = datetime.utcnow() + timedelta(hours=1)
+        end = start + timedelta(hours=1)
+
+        first = StudentService.get_room_seat_status(1, start, end)
+        first[0]['is_available'] = False
+        first.clear()
+
+        second = StudentService.get_room_seat_status(1, start, end)
+        assert second == [{'seat_id': 1, 'seat_number': 'A1', 'has_power': False, 'is_available': True}]
+        assert StudentService.get_room_status_cache_stats()['hits'] == 1
@@ -13,12 +13,21 @@ class SearchApiTestCase(unittest.TestCase):
 
     @patch('app.services.student_service.StudentService.get_reservation_history')
     def test_get_student_reservations(self, mock_get_history):
-        mock_get_history.return_value = [{"seat_id": 1, "start": "2025-06-19T10:00", "end": "2025-06-19T12:00"}]
+        mock_get_history.return_value = {
+            "items": [{"seat_id": 1, "start": "2025-06-19T10:00", "end": "2025-06-19T12:00"}],
+            "next_cursor": "abc"
+        }
 
-        response = self.client.get('/api/reservations/42')
+        response = self.client.get('/api/reservations/42', query_string={'cursor': 'xyz', 'limit': 10})
         self.assertEqual(response.status_code, 200)
-        self.assertIsInstance(response.json, list)
-        self.assertEqual(response.json[0]['seat_id'], 1)
+        self.assertIsInstance(response.json['items'], list)
+        self.assertEqual(response.json['items'][0]['seat_id'], 1)
+        self.assertEqual(response.json['next_cursor'], 'abc')
+        mock_get_history.assert_called_once_with(42, cursor='xyz', limit=10)
+
+    def test_get_student_reservations_rejects_bad_cursor(self):
+        response = self.client.get('/api/reservations/42', query_string={'cursor': '!!!'})
+        self.assertEqual(response.status_code, 400)
 
     @patch('app.services.student_service.StudentService.get_room_seat_status')
     def test_room_seat_status(self, mock_room_status):
@@ -55,5 +64,74 @@ class SearchApiTestCase(unittest.TestCase):
         self.assertIn('available_seats', response.json)
         self.assertTrue(response.json['available_seats'][0]['has_power'])
 
+    @patch('app.services.student_service.StudentService.get_room_day_grid')
+    def test_room_day_grid(self, mock_day_grid):
+        mock_day_grid.return_value = {
+            "room_id": 5,
+            "date": "2025-06-19",
+            "bucket_minutes": 15,
+            "seats": [{"seat_id": 1, "occupancy": "0" * 24}]
+        }
+
+        response = self.client.get('/api/room-grid', query_string={'room_id': 5, 'date': '2025-06-19'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['bucket_minutes'], 15)
+        mock_day_grid.assert_called_once()
+        self.assertEqual(str(mock_day_grid.call_args[0][1]), '2025-06-19')
+
+    def test_room_day_grid_rejects_invalid_date(self):
+        response = self.client.get('/api/room-grid', query_string={'room_id': 5, 'date': 'bad'})
+        self.assertEqual(response.status_code, 400)
+
+    @patch('app.services.student_service.StudentService.find_earliest_windows')
+    def test_earliest_windows(self, mock_find_windows):
+        mock_find_windows.return_value = [
+            {"room_id": 1, "seat_id": 3, "start_time": "2025-06-19T10:00:00", "end_time": "2025-06-19T11:00:00"}
+        ]
+
+        response = self.client.get('/api/earliest-windows', query_string={'duration': 60, 'has_power': 'true'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json['windows']), 1)
+        kwargs = mock_find_windows.call_args.kwargs
+        self.assertEqual(kwargs['duration'].total_seconds(), 3600)
+        self.assertTrue(kwargs['require_power'])
+
+    def test_earliest_windows_rejects_invalid_duration(self):
+        response = self.client.get('/api/earliest-windows', query_string={'duration': 0})
+        self.assertEqual(response.status_code, 400)
+
+    def test_earliest_windows_rejects_oversized_ranges(self):
+        for params in ({'duration': 60, 'horizon_hours': 10 ** 12}, {'duration': 60, 'horizon_hours': 7 * 24 + 1},
+                       {'duration': 24 * 60 + 1}):
+            response = self.client.get('/api/earliest-windows', query_string=params)
+            self.assertEqual(response.status_code, 400)
+
+    def test_earliest_windows_rejects_invalid_start(self):
+        response = self.client.get('/api/earliest-windows', query_string={'duration': 60, 'start': 'not-a-time'})
+        self.assertEqual(response.status_code, 400)
+
+    @patch('app.services.student_service.StudentService.get_room_status_cache_stats')
+    def test_room_status_cache_stats(self, mock_stats):
+        mock_stats.return_value = {"hits": 3, "misses": 1, "hit_rate": 0.75}
+
+        response = self.client.get('/api/room-status/cache-stats')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['hit_rate'], 0.75)
+
+    @patch('app.services.student_service.StudentService.get_quick_recommendation')
+    def test_quick_recommendation(self, mock_recommend):
+        mock_recommend.return_value = {"seat_id": 3, "room_id": 1, "alternatives": []}
+
+        response = self.client.get('/api/recommendation/42')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['seat_id'], 3)
+
+        mock_recommend.return_value = None
+        response = self.client.get('/api/recommendation/42')
+        self.assertEqual(response.status_code, 404)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,9 +1,10 @@
 import pytest
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from app import create_app
 from app.models import User, StudyRoom, Seat, TimeSlot
 from app.models import db
 from app.services.student_service import StudentService
+from app.tests.conftest import count_queries
 
 class TestStudentSearch:
 
@@ -198,4 +199,159 @@ class TestStudentSearch:
 
             result = StudentService.search_available_seats(room_id=999, start=start, end=end, require_power=False)
 
-            assert result == []
\ No newline at end of file
+            assert result == []
+
+    def test_room_seat_status_marks_reserved_seat(self, app):
+        """座位状态中被预约的座位标记为不可用"""
+        with app.app_context():
+            start = datetime.utcnow() + timedelta(hours=1)
+            end = start + timedelta(hours=1)
+            db.session.add(TimeSlot(seat_id=1, room_id=1, start_time=start, end_time=end,
+                                    is_reserved=True, reserved_by=1))
+            db.session.commit()
+
+            result = StudentService.get_room_seat_status(room_id=1, start=start, end=end)
+
+            assert [s['seat_id'] for s in result] == [1, 2]
+            assert result[0]['is_available'] is False
+            assert result[1]['is_available'] is True
+
+    def test_query_count_independent_of_seat_count(self, app):
+        """座位数量增长时，搜索与座位状态查询的 SQL 语句数保持不变"""
+        with app.app_context():
+            start = datetime.utcnow() + timedelta(hours=1)
+            end = start + timedelta(hours=1)
+
+            with count_queries() as small_search:
+                StudentService.search_available_seats(room_id=1, start=start, end=end)
+            with count_queries() as small_status:
+                StudentService.get_room_seat_status(room_id=1, start=start, end=end)
+
+            seats = [Seat(room_id=1, seat_number=f'B{i}') for i in range(100)]
+            db.session.add_all(seats)
+            db.session.flush()
+            db.session.add_all([
+                TimeSlot(seat_id=seat.id, room_id=1, start_time=start, end_time=end,
+                         is_reserved=True, reserved_by=1)
+                for seat in seats[::2]
+            ])
+            db.session.commit()
+
+            with count_queries() as large_search:
+                available = StudentService.search_available_seats(room_id=1, start=start, end=end)
+            with count_queries() as large_status:
+                StudentService.get_room_seat_status(room_id=1, start=start, end=end)
+
+            assert len(available) == 52
+            assert len(large_search) == len(small_search)
+            assert len(large_status) == len(small_status)
+
+    def test_find_earliest_windows_skips_busy_seat(self, app):
+        """最早空闲时间窗：被占用的座位从其预约结束后开始计算"""
+        with app.app_context():
+            start = (datetime.utcnow() + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
+            db.session.add_all([
+                TimeSlot(seat_id=1, room_id=1, start_time=start, end_time=start + timedelta(hours=1),
+                         is_reserved=True, reserved_by=1),
+                TimeSlot(seat_id=1, room_id=1, start_time=start + timedelta(minutes=90),
+                         end_time=start + timedelta(hours=3), is_reserved=True, reserved_by=1),
+                TimeSlot(seat_id=2, room_id=1, start_time=start + timedelta(minutes=30),
+                         end_time=start + timedelta(hours=2), is_reserved=True, reserved_by=1),
+            ])
+            db.session.commit()
+
+            windows = StudentService.find_earliest_windows(
+                duration=timedelta(minutes=45), horizon=timedelta(hours=8), start=start
+            )
+
+            # A2 在 10:00 后空闲；A1 的 9:00-9:30 空档不够 45 分钟，要等到 11:00
+            assert [(w['seat_number'], w['start_time']) for w in windows] == [
+                ('A2', (start + timedelta(hours=2)).isoformat()),
+                ('A1', (start + timedelta(hours=3)).isoformat()),
+            ]
+
+            powered = StudentService.find_earliest_windows(
+                duration=timedelta(minutes=30), require_power=True, horizon=timedelta(hours=8), start=start
+            )
+            assert [(w['seat_number'], w['start_time']) for w in powered] == [
+                ('A1', (start + timedelta(hours=1)).isoformat()),
+            ]
+
+    def test_find_earliest_windows_respects_horizon(self, app):
+        """时间窗必须完整落在查找范围内"""
+        with app.app_context():
+            start = datetime.utcnow() + timedelta(hours=1)
+            db.session.add_all([
+                TimeSlot(seat_id=seat_id, room_id=1, start_time=start, end_time=start + timedelta(hours=2),
+                         is_reserved=True, reserved_by=1)
+                for seat_id in (1, 2)
+            ])
+            db.session.commit()
+
+            windows = StudentService.find_earliest_windows(
+                duration=timedelta(hours=1), horizon=timedelta(hours=2, minutes=30), start=start
+            )
+
+            assert windows == []
+
+    def test_find_earliest_windows_respects_opening_hours(self, app):
+        """时间窗只落在自习室开放时段内，闭馆时段顺延到次日开门"""
+        with app.app_context():
+            room = db.session.get(StudyRoom, 1)
+            room.open_time, room.close_time = time(8, 0), time(22, 0)
+            db.session.commit()
+            day = (datetime.utcnow() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+            windows = StudentService.find_earliest_windows(
+                duration=timedelta(hours=1), horizon=timedelta(hours=12), start=day.replace(hour=3)
+            )
+            assert {w['start_time'] for w in windows} == {day.replace(hour=8).isoformat()}
+
+            late = StudentService.find_earliest_windows(
+                duration=timedelta(hours=1), horizon=timedelta(hours=12), start=day.replace(hour=21, minute=30)
+            )
+            assert {w['start_time'] for w in late} == {(day + timedelta(days=1, hours=8)).isoformat()}
+
+    def test_find_earliest_windows_clamps_past_start(self, app):
+        """早于当前时间的起点从当前时间开始查找，而不是返回空列表"""
+        with app.app_context():
+            windows = StudentService.find_earliest_windows(
+                duration=timedelta(hours=1), start=datetime.utcnow() - timedelta(days=30)
+            )
+
+            assert len(windows) == 2
+            assert min(datetime.fromisoformat(w['start_time']) for w in windows) > datetime.utcnow()
+
+    def test_reservation_history_keyset_pagination(self, app):
+        """预约历史按 (start_time, id) 游标翻页，且查询数不随记录数增长"""
+        with app.app_context():
+            base = datetime.utcnow() + timedelta(days=1)
+            # 两条记录开始时间相同，验证游标按 id 打破平局
+            starts = [base, base, base + timedelta(hours=2), base + timedelta(hours=4), base + timedelta(hours=6)]
+            db.session.add_all([
+                TimeSlot(seat_id=1 + i % 2, room_id=1, start_time=start, end_time=start + timedelta(hours=1),
+                         is_reserved=True, reserved_by=1)
+                for i, start in enumerate(starts)
+            ])
+            db.session.commit()
+
+            seen = []
+            cursor = None
+            while True:
+                with count_queries() as statements:
+                    page = StudentService.get_reservation_history(1, cursor=cursor, limit=2)
+                assert len(statements) == 1
+                seen.extend(page['items'])
+                cursor = page['next_cursor']
+                if cursor is None:
+                    break
+
+            assert len(seen) == 5
+            assert len({item['slot_id'] for item in seen}) == 5
+            assert [item['start_time'] for item in seen] == sorted((s.isoformat() for s in starts), reverse=True)
+            assert seen[0]['room_name'] == '测试自习室'
+
+    def test_reservation_history_rejects_invalid_cursor(self, app):
+        with app.app_context():
+            with pytest.raises(ValueError):
+                StudentService.get_reservation_history(1, cursor='not-a-cursor')
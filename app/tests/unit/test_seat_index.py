@@ -0,0 +1,202 @@
+import numpy
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import insert, update
+from app import create_app
+from app.models import User, StudyRoom, Seat, TimeSlot
+from app.models import db
+from app.services.seat_index import SeatIndex, RoomOccupancy
+from app.services.student_service import StudentService
+from app.tests.conftest import count_queries
+
+
+def test_room_occupancy_merges_overlapping_intervals():
+    """重叠或相接的区间插入后合并为一个区间"""
+    base = datetime(2025, 6, 19, 8, 0)
+    occupancy = RoomOccupancy(1, (1, 0, 1), [(1, 'A1', True)], base)
+
+    occupancy.add(1, base + timedelta(hours=2), base + timedelta(hours=3))
+    occupancy.add(1, base, base + timedelta(hours=1))
+    occupancy.add(1, base + timedelta(minutes=30), base + timedelta(hours=2))
+
+    starts, ends = occupancy.intervals(1)
+    assert starts == [base]
+    assert ends == [base + timedelta(hours=3)]
+    assert not occupancy.is_free(1, base + timedelta(hours=1), base + timedelta(hours=2))
+    assert occupancy.is_free(1, base + timedelta(hours=3), base + timedelta(hours=4))
+    assert occupancy.is_free(2, base, base + timedelta(hours=4))
+
+
+def test_free_mask_resolves_partial_buckets_exactly():
+    """位图只能粗判首尾时间桶，部分覆盖的桶需按区间精确判断"""
+    day = datetime(2025, 6, 19)
+    occupancy = RoomOccupancy(1, (2, 0, 2), [(1, 'A1', True), (2, 'A2', False)], day)
+    occupancy.add(1, day.replace(hour=10, minute=5), day.replace(hour=10, minute=20))
+
+    # 与预约共享 10:15 时间桶但不重叠
+    assert occupancy.free_mask(day.replace(hour=10, minute=20), day.replace(hour=10, minute=30)).tolist() == [True, True]
+    # 位于同一时间桶内部且重叠
+    assert occupancy.free_mask(day.replace(hour=10, minute=10), day.replace(hour=10, minute=12)).tolist() == [False, True]
+    # 完整覆盖预约所在的时间桶
+    assert occupancy.free_mask(day.replace(hour=9), day.replace(hour=12)).tolist() == [False, True]
+    # 跨天查询走逐座位判断
+    assert occupancy.free_mask(day.replace(hour=23), day + timedelta(days=1, hours=1)).tolist() == [True, True]
+
+
+def test_day_grid_sets_touched_buckets():
+    """日占用位图中被预约触及的时间桶置 1"""
+    day = datetime(2025, 6, 19)
+    occupancy = RoomOccupancy(1, (1, 0, 1), [(1, 'A1', True)], day)
+    occupancy.add(1, day.replace(hour=10, minute=5), day.replace(hour=10, minute=20))
+    # 跨越午夜的预约只计入当天部分
+    occupancy.add(1, day.replace(hour=23, minute=30), day + timedelta(days=1, hours=1))
+
+    bits = numpy.unpackbits(occupancy.day_grid(day)[0])
+
+    assert numpy.flatnonzero(bits).tolist() == [40, 41, 94, 95]
+
+
+def test_day_grid_not_cached_when_booking_lands_during_build():
+    """位图计算期间插入的预约不会被过期的缓存位图掩盖"""
+    day = datetime(2025, 6, 19)
+    occupancy = RoomOccupancy(1, (1, 0, 1), [(1, 'A1', True)], day)
+    read_intervals = occupancy.intervals
+
+    def intervals_with_concurrent_booking(seat_id):
+        snapshot = read_intervals(seat_id)
+        occupancy.intervals = read_intervals
+        occupancy.add(1, day.replace(hour=10), day.replace(hour=11))
+        return snapshot
+    occupancy.intervals = intervals_with_concurrent_booking
+
+    assert not numpy.unpackbits(occupancy.day_grid(day)[0]).any()
+    assert numpy.flatnonzero(numpy.unpackbits(occupancy.day_grid(day)[0])).tolist() == [40, 41, 42, 43]
+
+
+class TestSeatIndex:
+
+    @pytest.fixture
+    def app(self):
+        app = create_app('test')
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+        app.config['TESTING'] = True
+
+        with app.app_context():
+            db.create_all()
+
+            student = User(username='test_student', password='password', role='student', name='测试学生')
+            room = StudyRoom(id=1, name='测试自习室', location='测试楼层')
+            seat1 = Seat(id=1, seat_number='A1', room_id=1, has_power=True)
+            seat2 = Seat(id=2, seat_number='A2', room_id=1, has_power=False)
+
+            db.session.add_all([student, room, seat1, seat2])
+            db.session.commit()
+
+        yield app
+
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_repeated_search_issues_no_sql(self, app):
+        """索引加载后，版本核对间隔内的搜索不访问数据库"""
+        with app.app_context():
+            start = datetime.utcnow() + timedelta(hours=1)
+            end = start + timedelta(hours=1)
+
+            StudentService.search_available_seats(room_id=1, start=start, end=end)
+            with count_queries() as statements:
+                available = StudentService.search_available_seats(room_id=1, start=start, end=end)
+                StudentService.get_room_seat_status(room_id=1, start=start, end=end)
+
+            assert len(available) == 2
+            assert statements == []
+
+    def test_reserve_slot_updates_index_in_place(self, app):
+        """reserve_slot 提交后直接更新本进程的索引，无需重新加载"""
+        with app.app_context():
+            start = datetime.utcnow() + timedelta(hours=1)
+            end = start + timedelta(hours=1)
+            student = User.query.filter_by(username='test_student').first()
+
+            StudentService.search_available_seats(room_id=1, start=start, end=end)
+            result = StudentService.reserve_slot(student.id, 1, start, end)
+            assert result['success'] is True
+
+            # 即使需要核对版本，本进程的写入也已计入指纹，只需一次核对查询
+            SeatIndex.get_room(1).checked_at -= SeatIndex.VERSION_CHECK_SECONDS
+            with count_queries() as statements:
+                available = StudentService.search_available_seats(room_id=1, start=start, end=end)
+
+            assert [s['seat_id'] for s in available] == [2]
+            assert len(statements) == 1
+            assert db.session.get(Seat, 1).slot_version == 1
+
+    def test_write_from_other_process_triggers_reload(self, app):
+        """其它进程的写入使版本号变化，下次核对时重新加载索引"""
+        with app.app_context():
+            start = datetime.utcnow() + timedelta(hours=1)
+            end = start + timedelta(hours=1)
+
+            StudentService.search_available_seats(room_id=1, start=start, end=end)
+
+            # 模拟另一个 worker：绕过本进程 ORM 会话直接写库
+            with db.engine.begin() as conn:
+                conn.execute(insert(TimeSlot.__table__).values(
+                    room_id=1, seat_id=2, start_time=start, end_time=end, is_reserved=True, reserved_by=1
+                ))
+                conn.execute(update(Seat.__table__).where(Seat.__table__.c.id == 2).values(
+                    slot_version=Seat.__table__.c.slot_version + 1
+                ))
+
+            # 版本核对间隔内仍使用旧索引
+            assert len(StudentService.search_available_seats(room_id=1, start=start, end=end)) == 2
+
+            SeatIndex.get_room(1).checked_at -= SeatIndex.VERSION_CHECK_SECONDS
+            available = StudentService.search_available_seats(room_id=1, start=start, end=end)
+            assert [s['seat_id'] for s in available] == [1]
+
+    def test_query_before_index_window_falls_back_to_sql(self, app):
+        """早于索引窗口的查询仍由数据库回答"""
+        with app.app_context():
+            start = datetime.utcnow() - timedelta(days=3)
+            end = start + timedelta(hours=1)
+            db.session.add(TimeSlot(seat_id=1, room_id=1, start_time=start, end_time=end,
+                                    is_reserved=True, reserved_by=1))
+            db.session.commit()
+
+            result = StudentService.get_room_seat_status(room_id=1, start=start, end=end)
+
+            assert [s['is_available'] for s in result] == [False, True]
+
+    def test_room_day_grid_uses_local_day(self, app):
+        """日期按本地时区理解：北京时间当天从前一天 UTC 16:00 开始"""
+        app.config['LOCAL_TIMEZONE'] = 'Asia/Shanghai'
+        with app.app_context():
+            day = (datetime.utcnow() + timedelta(days=2)).date()
+            # 北京时间 day 当天 08:00-09:00，即 UTC 当天 00:00-01:00；按 UTC 日期会落在第 0 个时间桶
+            start = datetime.combine(day, datetime.min.time())
+            db.session.add(TimeSlot(seat_id=2, room_id=1, start_time=start, end_time=start + timedelta(hours=1),
+                                    is_reserved=True, reserved_by=1))
+            db.session.commit()
+
+            grid = StudentService.get_room_day_grid(1, day)
+
+            assert grid['seats'][1]['occupancy'] == '00000000f0' + '0' * 14
+
+    def test_room_day_grid_payload(self, app):
+        """教室日网格按座位返回十六进制编码的占用位图"""
+        with app.app_context():
+            day = (datetime.utcnow() + timedelta(days=1)).date()
+            start = datetime.combine(day, datetime.min.time()).replace(hour=8)
+            db.session.add(TimeSlot(seat_id=2, room_id=1, start_time=start, end_time=start + timedelta(hours=1),
+                                    is_reserved=True, reserved_by=1))
+            db.session.commit()
+
+            grid = StudentService.get_room_day_grid(1, day)
+
+            assert grid['bucket_minutes'] == 15
+            assert [s['seat_id'] for s in grid['seats']] == [1, 2]
+            assert grid['seats'][0]['occupancy'] == '0' * 24
+            # 8:00-9:00 对应第 32-35 个时间桶，即第 4 个字节的高 4 位
+            assert grid['seats'][1]['occupancy'] == '00000000f0' + '0' * 14
@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy import update
+from app import create_app
+from app.models import SystemSetting
+from app.models import db
+from app.services import SettingsStore
+from app.tests.conftest import count_queries
+
+
+class TestSettingsStore:
+
+    @pytest.fixture
+    def app(self):
+        app = create_app('test')
+
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([
+                SystemSetting(key='MAX_VIOLATION_COUNT', value='3', description=''),
+                SystemSetting(key='BROKEN', value='abc', description='')
+            ])
+            db.session.commit()
+            yield app
+            db.session.remove()
+            db.drop_all()
+
+    def test_reads_are_served_from_memory(self, app):
+        """首次读取加载全部配置，之后的读取不访问数据库"""
+        with count_queries() as statements:
+            assert SettingsStore.get_int('MAX_VIOLATION_COUNT', 5) == 3
+            assert SettingsStore.get_int('BROKEN', 5) == 5
+            assert SettingsStore.get_int('MISSING', 7) == 7
+            assert SettingsStore.get('BROKEN') == 'abc'
+
+        assert len(statements) == 1
+
+    def test_version_change_from_other_process_triggers_reload(self, app):
+        """其它进程修改配置并更新版本后，下次核对版本时重新加载"""
+        assert SettingsStore.get_int('MAX_VIOLATION_COUNT', 5) == 3
+
+        # 模拟另一个 worker 通过管理接口修改配置
+        with db.engine.begin() as conn:
+            conn.execute(update(SystemSetting.__table__).where(
+                SystemSetting.__table__.c.key == 'MAX_VIOLATION_COUNT'
+            ).values(value='4'))
+            conn.execute(SystemSetting.__table__.insert().values(
+                key=SettingsStore.VERSION_KEY, value='other', description=''
+            ))
+
+        # 核对间隔内仍使用旧值
+        assert SettingsStore.get_int('MAX_VIOLATION_COUNT', 5) == 3
+
+        app.extensions['system_settings']['checked_at'] -= SettingsStore.VERSION_CHECK_SECONDS
+        with count_queries() as statements:
+            assert SettingsStore.get_int('MAX_VIOLATION_COUNT', 5) == 4
+            assert SettingsStore.get('MAX_VIOLATION_COUNT') == '4'
+
+        # 一次版本核对 + 一次重新加载
+        assert len(statements) == 2
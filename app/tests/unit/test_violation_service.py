@@ -3,7 +3,10 @@ from datetime import datetime, timedelta
 from app import create_app
 from app.models.db import db
 from app.models import User, StudyRoom, Reservation, SystemSetting, Notification
-from app.services import ViolationService
+from app.services import ViolationService, SettingsStore
+from app.tests.conftest import count_queries
+from sqlalchemy import event, update
+from sqlalchemy.dialects import mysql
 
 @pytest.fixture(scope='module')
 def app():
@@ -38,6 +41,7 @@ def session(app):
         
         db.session.add_all([student1, student2, room1] + settings_data)
         db.session.commit()
+        SettingsStore.invalidate()
         
         yield db.session
         
@@ -70,6 +74,62 @@ class TestViolationService:
         assert "即将于" in notification.message
         assert "开始" in notification.message
 
+    def test_check_upcoming_reservations_reminds_once(self, session):
+        """每分钟重复执行时，每条预约只提醒一次"""
+        good_student = User.query.filter_by(username='good_student').one()
+        room = StudyRoom.query.filter_by(name='测试自习室A').one()
+        now = datetime.utcnow()
+        session.add_all([
+            Reservation(student_id=good_student.id, room_id=room.id,
+                        start_time=now + timedelta(minutes=minutes), end_time=now + timedelta(hours=2))
+            for minutes in (5, 10)
+        ])
+        session.commit()
+        student_id = good_student.id
+
+        assert ViolationService.check_upcoming_reservations() == 2
+        with count_queries() as statements:
+            assert ViolationService.check_upcoming_reservations() == 0
+
+        # 配置已缓存，第二次只有一次扫描
+        assert len(statements) == 1
+        assert Notification.query.filter_by(user_id=student_id).count() == 2
+        assert Reservation.query.filter(Reservation.reminder_sent_at.is_(None)).count() == 0
+
+    def test_check_upcoming_reservations_skips_rows_claimed_concurrently(self, session):
+        """读取之后被其它 worker 认领的预约不重复提醒"""
+        good_student = User.query.filter_by(username='good_student').one()
+        room = StudyRoom.query.filter_by(name='测试自习室A').one()
+        now = datetime.utcnow()
+        reservations = [
+            Reservation(student_id=good_student.id, room_id=room.id,
+                        start_time=now + timedelta(minutes=minutes), end_time=now + timedelta(hours=2))
+            for minutes in (5, 10)
+        ]
+        session.add_all(reservations)
+        session.commit()
+        student_id, claimed_id = good_student.id, reservations[0].id
+        ViolationService.get_setting('REMINDER_BEFORE_MINUTES', 15)
+
+        statements = []
+
+        def concurrent_worker(orm_execute_state):
+            statements.append(orm_execute_state.statement)
+            if len(statements) == 2:
+                orm_execute_state.session.connection().execute(
+                    update(Reservation).where(Reservation.id == claimed_id).values(reminder_sent_at=now)
+                )
+        event.listen(db.session, 'do_orm_execute', concurrent_worker)
+        try:
+            reminded = ViolationService.check_upcoming_reservations()
+        finally:
+            event.remove(db.session, 'do_orm_execute', concurrent_worker)
+
+        assert reminded == 1
+        assert Notification.query.filter_by(user_id=student_id).count() == 1
+        # MySQL 8 上靠加锁读取避免两个 worker 认领同一批预约
+        assert 'FOR UPDATE SKIP LOCKED' in str(statements[0].compile(dialect=mysql.dialect()))
+
     def test_process_no_show_violations_marks_as_violation(self, session):
         """测试系统应将超时未签到的预约标记为违约"""
         violator = User.query.filter_by(username='violator').one()
@@ -125,4 +185,77 @@ class TestViolationService:
         assert student.banned_until > now
         
         notification = Notification.query.filter_by(user_id=violator.id).order_by(Notification.id.desc()).first()
-        assert "预约功能将被禁用至" in notification.message
\ No newline at end of file
+        assert "预约功能将被禁用至" in notification.message
+
+    def test_process_no_show_violations_uses_constant_statements_per_chunk(self, session, monkeypatch):
+        """违约处理按批执行固定数量的语句，与违约预约数无关"""
+        violator = User.query.filter_by(username='violator').one()
+        good_student = User.query.filter_by(username='good_student').one()
+        room = StudyRoom.query.filter_by(name='测试自习室A').one()
+        now = datetime.utcnow()
+
+        # violator 三次未签到，第三次达到上限；good_student 一次
+        for minutes, student in ((60, violator), (50, violator), (40, good_student), (30, violator)):
+            session.add(Reservation(student_id=student.id, room_id=room.id, status='scheduled',
+                                    start_time=now - timedelta(minutes=minutes),
+                                    end_time=now - timedelta(minutes=minutes - 10)))
+        session.commit()
+        violator_id, good_student_id = violator.id, good_student.id
+        monkeypatch.setattr(ViolationService, 'NO_SHOW_CHUNK_SIZE', 3)
+        ViolationService.get_setting('MAX_VIOLATION_COUNT', 3)
+
+        with count_queries() as statements:
+            processed = ViolationService.process_no_show_violations()
+
+        assert processed == 4
+        # 配置从缓存读取，每批 7 条（两批）
+        assert len(statements) == 7 * 2
+        assert Reservation.query.filter_by(status='violation_no_show').count() == 4
+
+        violator = session.get(User, violator_id)
+        assert violator.violation_count == 3
+        assert violator.banned_until > now
+        assert session.get(User, good_student_id).violation_count == 1
+        assert session.get(User, good_student_id).banned_until is None
+
+        messages = [n.message for n in Notification.query.filter_by(user_id=violator_id).order_by(Notification.id)]
+        assert '累计违约 1 次' in messages[0]
+        assert '累计违约 2 次' in messages[1]
+        assert '预约功能将被禁用至' in messages[2]
+
+    def test_process_no_show_violations_skips_rows_claimed_concurrently(self, session):
+        """读取之后被其它处理任务标记的预约，不重复累计违约次数也不重复通知"""
+        violator = User.query.filter_by(username='violator').one()
+        room = StudyRoom.query.filter_by(name='测试自习室A').one()
+        now = datetime.utcnow()
+        reservations = [
+            Reservation(student_id=violator.id, room_id=room.id, status='scheduled',
+                        start_time=now - timedelta(minutes=minutes), end_time=now)
+            for minutes in (60, 30)
+        ]
+        session.add_all(reservations)
+        session.commit()
+        violator_id, claimed_id = violator.id, reservations[0].id
+        ViolationService.get_setting('MAX_VIOLATION_COUNT', 3)
+
+        statements = []
+
+        def concurrent_processor(orm_execute_state):
+            statements.append(orm_execute_state.statement)
+            if len(statements) == 2:
+                orm_execute_state.session.connection().execute(
+                    update(Reservation).where(Reservation.id == claimed_id).values(status='violation_no_show')
+                )
+        event.listen(db.session, 'do_orm_execute', concurrent_processor)
+        try:
+            processed = ViolationService.process_no_show_violations()
+        finally:
+            event.remove(db.session, 'do_orm_execute', concurrent_processor)
+
+        assert processed == 1
+        assert session.get(User, violator_id).violation_count == 1
+        assert Notification.query.filter_by(user_id=violator_id).count() == 1
+        # MySQL 8 上靠加锁读取避免两个任务处理同一批预约，只锁预约行
+        dialect = mysql.dialect()
+        dialect.supports_for_update_of = True
+        assert 'FOR UPDATE OF reservations SKIP LOCKED' in str(statements[0].compile(dialect=dialect))
@@ -0,0 +1,18 @@
+# 键集翻页游标：把排序键 (时间, id) 编码为不透明字符串，供各列表接口共用
+import base64
+import binascii
+from datetime import datetime
+
+
+def encode_cursor(sort_time: datetime, row_id: int) -> str:
+    """把 (sort_time, id) 编码为不透明的翻页游标"""
+    return base64.urlsafe_b64encode(f"{sort_time.isoformat()}|{row_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    """解析翻页游标，格式不合法时抛出 ValueError"""
+    try:
+        sort_time, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(sort_time), int(row_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError("无效的翻页游标") from e
\ No newline at end of file
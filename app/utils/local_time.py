@@ -0,0 +1,18 @@
+# 库中时间一律为 UTC 的 naive datetime；自习室开放时间等按 LOCAL_TIMEZONE 的本地时间记录
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+from flask import current_app
+
+
+def local_timezone():
+    return ZoneInfo(current_app.config.get('LOCAL_TIMEZONE', 'Asia/Shanghai'))
+
+
+def utc_to_local(value: datetime) -> datetime:
+    """UTC naive datetime 转为本地时区的 naive datetime"""
+    return value.replace(tzinfo=timezone.utc).astimezone(local_timezone()).replace(tzinfo=None)
+
+
+def local_to_utc(value: datetime) -> datetime:
+    """本地时区的 naive datetime 转为 UTC naive datetime"""
+    return value.replace(tzinfo=local_timezone()).astimezone(timezone.utc).replace(tzinfo=None)
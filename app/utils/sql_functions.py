@@ -0,0 +1,32 @@
+# 跨数据库的 SQL 表达式，按方言编译为各自的函数
+from sqlalchemy import Integer
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class minutes_between(FunctionElement):
+    """两个时间之间相差的整分钟数 end - start，用于在 SQL 中直接计算学习时长"""
+    type = Integer()
+    inherit_cache = True
+    name = 'minutes_between'
+
+
+@compiles(minutes_between)
+def _minutes_between_default(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return 'CAST(EXTRACT(EPOCH FROM (%s - %s)) / 60 AS INTEGER)' % (compiler.process(end, **kw), compiler.process(start, **kw))
+
+
+@compiles(minutes_between, 'mysql')
+def _minutes_between_mysql(element, compiler, **kw):
+    start, end = list(element.clauses)
+    return 'TIMESTAMPDIFF(MINUTE, %s, %s)' % (compiler.process(start, **kw), compiler.process(end, **kw))
+
+
+@compiles(minutes_between, 'sqlite')
+def _minutes_between_sqlite(element, compiler, **kw):
+    start, end = list(element.clauses)
+    # 取整秒相减再整除，避免 julianday 浮点误差少算一分钟
+    return "(CAST(strftime('%%s', %s) AS INTEGER) - CAST(strftime('%%s', %s) AS INTEGER)) / 60" % (
+        compiler.process(end, **kw), compiler.process(start, **kw)
+    )
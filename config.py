@@ -10,6 +10,10 @@ class Config:
     DEBUG = False
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt_secret_key')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+    # 失效二维码的保留天数，超过后由定时任务清理
+    QRCODE_RETENTION_DAYS = int(os.getenv('QRCODE_RETENTION_DAYS', 7))
+    # 自习室开放、关门时间所用的本地时区，库中其余时间均为 UTC
+    LOCAL_TIMEZONE = os.getenv('LOCAL_TIMEZONE', 'Asia/Shanghai')
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -22,6 +26,7 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_TEST_URL', 'sqlite:///:memory:')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     PRESERVE_CONTEXT_ON_EXCEPTION = False
+    LOCAL_TIMEZONE = 'UTC'
 
 class ProductionConfig(Config):
     DEBUG = False
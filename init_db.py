@@ -2,6 +2,9 @@
 数据库初始化脚本
 用于创建数据库表结构并添加初始数据
 """
+from flask_migrate import stamp
+from sqlalchemy import inspect
+
 from app import create_app
 from app.models.db import db
 from app.models.user import User
@@ -11,8 +14,14 @@ def init_db():
     """初始化数据库"""
     app = create_app('dev')
     with app.app_context():
+        # 尚未纳入迁移管理的库：建表后标记为最新迁移版本，之后可直接 flask db upgrade
+        managed = 'alembic_version' in inspect(db.engine).get_table_names()
+
         # 创建所有表
         db.create_all()
+
+        if not managed:
+            stamp()
         
         # 检查是否已存在管理员账户
         admin = User.query.filter_by(username='admin', role='admin').first()
@@ -44,7 +53,8 @@ def init_db():
             'REMINDER_BEFORE_MINUTES': ('15', '预约开始前多少分钟发送提醒'),
             'NO_SHOW_TIMEOUT_MINUTES': ('10', '预约开始后多少分钟未签到算作违约'),
             'MAX_VIOLATION_COUNT': ('3', '累计多少次违约后禁用账户'),
-            'BAN_DAYS': ('7', '账户禁用多少天')
+            'BAN_DAYS': ('7', '账户禁用多少天'),
+            'MAX_RESERVATION_DURATION': ('120', '单次预约最长时长（分钟）')
         }
         
         for key, (value, desc) in settings.items():
@@ -0,0 +1,32 @@
+"""seat slot_version
+
+补上 seat.slot_version 列，座位占用索引据此判断其它进程是否写入过该座位的时间块。
+
+Revision ID: 1c7d4e9a2b58
+Revises: 5e0b7a1c9d24
+Create Date: 2026-10-17 08:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c7d4e9a2b58'
+down_revision = '5e0b7a1c9d24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    # 以 create_all 新建的库已包含该列
+    if 'slot_version' not in {c['name'] for c in inspector.get_columns('seat')}:
+        with op.batch_alter_table('seat', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('slot_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('seat', schema=None) as batch_op:
+        batch_op.drop_column('slot_version')
@@ -0,0 +1,59 @@
+"""time_slots hot path indexes
+
+为 time_slots 的搜索、预约与历史查询添加复合索引和唯一约束。
+加唯一约束前先清理同一座位同一时段的重复时间块：优先保留已被预约的一条，
+其次保留 id 最小的一条。没有其它表引用 time_slots.id，删除无需改写引用。
+
+Revision ID: 3f2a9c1d7e45
+Revises: 1c7d4e9a2b58
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7e45'
+down_revision = '1c7d4e9a2b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+
+    existing = {i['name'] for i in inspector.get_indexes('time_slots')}
+    existing |= {c['name'] for c in inspector.get_unique_constraints('time_slots')}
+
+    if 'uq_time_slots_seat_period' not in existing:
+        # MySQL 不允许在 DELETE 的子查询中直接引用目标表，外面再包一层派生表
+        op.execute(
+            "DELETE FROM time_slots WHERE id IN ("
+            " SELECT id FROM ("
+            "  SELECT dup.id FROM time_slots dup"
+            "  JOIN time_slots keep ON keep.seat_id = dup.seat_id"
+            "   AND keep.start_time = dup.start_time AND keep.end_time = dup.end_time"
+            "   AND (COALESCE(keep.is_reserved, 0) > COALESCE(dup.is_reserved, 0)"
+            "    OR (COALESCE(keep.is_reserved, 0) = COALESCE(dup.is_reserved, 0) AND keep.id < dup.id))"
+            " ) duplicated"
+            ")"
+        )
+
+    with op.batch_alter_table('time_slots', schema=None) as batch_op:
+        if 'uq_time_slots_seat_period' not in existing:
+            batch_op.create_unique_constraint('uq_time_slots_seat_period', ['seat_id', 'start_time', 'end_time'])
+        if 'ix_time_slots_seat_reserved_period' not in existing:
+            batch_op.create_index('ix_time_slots_seat_reserved_period', ['seat_id', 'is_reserved', 'start_time', 'end_time'], unique=False)
+        if 'ix_time_slots_user_start' not in existing:
+            batch_op.create_index('ix_time_slots_user_start', ['reserved_by', 'start_time'], unique=False)
+        if 'ix_time_slots_room_reserved_end' not in existing:
+            batch_op.create_index('ix_time_slots_room_reserved_end', ['room_id', 'is_reserved', 'end_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('time_slots', schema=None) as batch_op:
+        batch_op.drop_index('ix_time_slots_room_reserved_end')
+        batch_op.drop_index('ix_time_slots_user_start')
+        batch_op.drop_index('ix_time_slots_seat_reserved_period')
+        batch_op.drop_constraint('uq_time_slots_seat_period', type_='unique')
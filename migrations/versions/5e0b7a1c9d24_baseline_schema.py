@@ -0,0 +1,164 @@
+"""baseline schema
+
+迁移链的起点：建出 init_db.py 最初以 db.create_all() 建立的表结构。
+已由 create_all 建表、尚未纳入迁移管理的库中，已存在的表逐一跳过。
+
+Revision ID: 5e0b7a1c9d24
+Revises:
+Create Date: 2026-10-17 08:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0b7a1c9d24'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'users' not in existing:
+        op.create_table('users',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=100), nullable=False),
+            sa.Column('password_hash', sa.String(length=255), nullable=False),
+            sa.Column('role', sa.String(length=20), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('avatar', sa.String(length=255), nullable=True),
+            sa.Column('violation_count', sa.Integer(), nullable=True),
+            sa.Column('banned_until', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('username')
+        )
+
+    if 'system_settings' not in existing:
+        op.create_table('system_settings',
+            sa.Column('key', sa.String(length=50), nullable=False),
+            sa.Column('value', sa.String(length=255), nullable=False),
+            sa.Column('description', sa.String(length=255), nullable=True),
+            sa.PrimaryKeyConstraint('key')
+        )
+
+    if 'study_rooms' not in existing:
+        op.create_table('study_rooms',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('location', sa.String(length=200), nullable=False),
+            sa.Column('capacity', sa.Integer(), nullable=True),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('qrcode_refresh_interval', sa.Integer(), nullable=True),
+            sa.Column('admin_id', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['admin_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'seat' not in existing:
+        op.create_table('seat',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('room_id', sa.Integer(), nullable=False),
+            sa.Column('seat_number', sa.String(length=10), nullable=False),
+            sa.Column('has_power', sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(['room_id'], ['study_rooms.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'qrcodes' not in existing:
+        op.create_table('qrcodes',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('room_id', sa.Integer(), nullable=False),
+            sa.Column('code', sa.String(length=32), nullable=False),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('expires_at', sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(['room_id'], ['study_rooms.id']),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('code')
+        )
+
+    if 'time_slots' not in existing:
+        op.create_table('time_slots',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('room_id', sa.Integer(), nullable=False),
+            sa.Column('seat_id', sa.Integer(), nullable=False),
+            sa.Column('start_time', sa.DateTime(), nullable=False),
+            sa.Column('end_time', sa.DateTime(), nullable=False),
+            sa.Column('is_reserved', sa.Boolean(), nullable=True),
+            sa.Column('reserved_by', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['room_id'], ['study_rooms.id']),
+            sa.ForeignKeyConstraint(['seat_id'], ['seat.id']),
+            sa.ForeignKeyConstraint(['reserved_by'], ['users.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    # reservations 与 check_ins 互相引用，先建 reservations，check_ins 建好后再补外键
+    if 'reservations' not in existing:
+        op.create_table('reservations',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('student_id', sa.Integer(), nullable=False),
+            sa.Column('room_id', sa.Integer(), nullable=False),
+            sa.Column('start_time', sa.DateTime(), nullable=False),
+            sa.Column('end_time', sa.DateTime(), nullable=False),
+            sa.Column('status', sa.String(length=50), nullable=False),
+            sa.Column('check_in_id', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['student_id'], ['users.id']),
+            sa.ForeignKeyConstraint(['room_id'], ['study_rooms.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'check_ins' not in existing:
+        op.create_table('check_ins',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('student_id', sa.Integer(), nullable=False),
+            sa.Column('room_id', sa.Integer(), nullable=False),
+            sa.Column('qrcode_id', sa.Integer(), nullable=False),
+            sa.Column('reservation_id', sa.Integer(), nullable=True),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('check_in_time', sa.DateTime(), nullable=True),
+            sa.Column('check_out_time', sa.DateTime(), nullable=True),
+            sa.Column('duration', sa.Integer(), nullable=True),
+            sa.Column('is_violation', sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(['student_id'], ['users.id']),
+            sa.ForeignKeyConstraint(['room_id'], ['study_rooms.id']),
+            sa.ForeignKeyConstraint(['qrcode_id'], ['qrcodes.id']),
+            sa.ForeignKeyConstraint(['reservation_id'], ['reservations.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'reservations' not in existing:
+        with op.batch_alter_table('reservations', schema=None) as batch_op:
+            batch_op.create_foreign_key('fk_reservations_check_in_id', 'check_ins', ['check_in_id'], ['id'])
+
+    if 'notifications' not in existing:
+        op.create_table('notifications',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('message', sa.Text(), nullable=False),
+            sa.Column('is_read', sa.Boolean(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('reservations', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_reservations_check_in_id', type_='foreignkey')
+    op.drop_table('notifications')
+    op.drop_table('check_ins')
+    op.drop_table('reservations')
+    op.drop_table('time_slots')
+    op.drop_table('qrcodes')
+    op.drop_table('seat')
+    op.drop_table('study_rooms')
+    op.drop_table('system_settings')
+    op.drop_table('users')
\ No newline at end of file
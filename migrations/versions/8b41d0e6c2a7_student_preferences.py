@@ -0,0 +1,36 @@
+"""student preferences
+
+Revision ID: 8b41d0e6c2a7
+Revises: 3f2a9c1d7e45
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b41d0e6c2a7'
+down_revision = '3f2a9c1d7e45'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('student_preferences',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('room_counts', sa.JSON(), nullable=False),
+    sa.Column('seat_counts', sa.JSON(), nullable=False),
+    sa.Column('hour_counts', sa.JSON(), nullable=False),
+    sa.Column('total_slots', sa.Integer(), nullable=False),
+    sa.Column('power_slots', sa.Integer(), nullable=False),
+    sa.Column('total_minutes', sa.Integer(), nullable=False),
+    sa.Column('last_slot_id', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade():
+    op.drop_table('student_preferences')
@@ -0,0 +1,40 @@
+"""preference refresh by time_slots.updated_at
+
+Revision ID: a3e7c9d4f285
+Revises: f2d6b8c3e174
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3e7c9d4f285'
+down_revision = 'f2d6b8c3e174'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('time_slots', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_time_slots_updated_at', ['updated_at'], unique=False)
+
+    # 现有时间块视为刚刚变化，首次刷新时重算所有学生的画像
+    op.execute(sa.text("UPDATE time_slots SET updated_at = :now").bindparams(now=datetime.utcnow()))
+
+    with op.batch_alter_table('student_preferences', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('refreshed_at', sa.DateTime(), nullable=True))
+        batch_op.drop_column('last_slot_id')
+
+
+def downgrade():
+    with op.batch_alter_table('student_preferences', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('last_slot_id', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.drop_column('refreshed_at')
+
+    with op.batch_alter_table('time_slots', schema=None) as batch_op:
+        batch_op.drop_index('ix_time_slots_updated_at')
+        batch_op.drop_column('updated_at')
@@ -0,0 +1,32 @@
+"""study room close time and auto checkout index
+
+Revision ID: a9d3e5f7c120
+Revises: f1b4c7e2a938
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9d3e5f7c120'
+down_revision = 'f1b4c7e2a938'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('study_rooms', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('close_time', sa.Time(), nullable=True))
+
+    with op.batch_alter_table('check_ins', schema=None) as batch_op:
+        batch_op.create_index('ix_check_ins_status_room_time', ['status', 'room_id', 'check_in_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('check_ins', schema=None) as batch_op:
+        batch_op.drop_index('ix_check_ins_status_room_time')
+
+    with op.batch_alter_table('study_rooms', schema=None) as batch_op:
+        batch_op.drop_column('close_time')
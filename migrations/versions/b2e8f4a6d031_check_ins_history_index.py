@@ -0,0 +1,26 @@
+"""check_ins history index
+
+Revision ID: b2e8f4a6d031
+Revises: a9d3e5f7c120
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b2e8f4a6d031'
+down_revision = 'a9d3e5f7c120'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('check_ins', schema=None) as batch_op:
+        batch_op.create_index('ix_check_ins_student_status_time', ['student_id', 'status', 'check_in_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('check_ins', schema=None) as batch_op:
+        batch_op.drop_index('ix_check_ins_student_status_time')
@@ -0,0 +1,26 @@
+"""reservations status start index
+
+Revision ID: c4f9a2d8e613
+Revises: b2e8f4a6d031
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f9a2d8e613'
+down_revision = 'b2e8f4a6d031'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reservations', schema=None) as batch_op:
+        batch_op.create_index('ix_reservations_status_start', ['status', 'start_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reservations', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservations_status_start')
@@ -0,0 +1,26 @@
+"""qrcodes active index
+
+Revision ID: c5e8f3a1b904
+Revises: 8b41d0e6c2a7
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e8f3a1b904'
+down_revision = '8b41d0e6c2a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('qrcodes', schema=None) as batch_op:
+        batch_op.create_index('ix_qrcodes_room_active_expires', ['room_id', 'is_active', 'expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('qrcodes', schema=None) as batch_op:
+        batch_op.drop_index('ix_qrcodes_room_active_expires')
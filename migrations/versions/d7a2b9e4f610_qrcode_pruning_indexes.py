@@ -0,0 +1,32 @@
+"""qrcode pruning indexes
+
+Revision ID: d7a2b9e4f610
+Revises: c5e8f3a1b904
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a2b9e4f610'
+down_revision = 'c5e8f3a1b904'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('qrcodes', schema=None) as batch_op:
+        batch_op.create_index('ix_qrcodes_active_expires', ['is_active', 'expires_at'], unique=False)
+
+    with op.batch_alter_table('check_ins', schema=None) as batch_op:
+        batch_op.create_index('ix_check_ins_qrcode_id', ['qrcode_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('check_ins', schema=None) as batch_op:
+        batch_op.drop_index('ix_check_ins_qrcode_id')
+
+    with op.batch_alter_table('qrcodes', schema=None) as batch_op:
+        batch_op.drop_index('ix_qrcodes_active_expires')
@@ -0,0 +1,29 @@
+"""reservations reminder_sent_at
+
+Revision ID: d8b3e6f1a742
+Revises: c4f9a2d8e613
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8b3e6f1a742'
+down_revision = 'c4f9a2d8e613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reservations', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reminder_sent_at', sa.DateTime(), nullable=True))
+        batch_op.create_index('ix_reservations_status_reminder_start',
+                              ['status', 'reminder_sent_at', 'start_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reservations', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservations_status_reminder_start')
+        batch_op.drop_column('reminder_sent_at')
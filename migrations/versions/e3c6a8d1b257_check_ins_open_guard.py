@@ -0,0 +1,45 @@
+"""check_ins open check-in guard
+
+Revision ID: e3c6a8d1b257
+Revises: d7a2b9e4f610
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3c6a8d1b257'
+down_revision = 'd7a2b9e4f610'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 同一学生在同一自习室已有多条签到中的记录时，只保留最新一条，其余标记为过期
+    op.execute("""
+        UPDATE check_ins SET status = 'expired'
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT older.id FROM check_ins older
+                JOIN check_ins newer
+                  ON newer.student_id = older.student_id
+                 AND newer.room_id = older.room_id
+                 AND newer.status = 'checked_in'
+                 AND newer.id > older.id
+                WHERE older.status = 'checked_in'
+            ) duplicated
+        )
+    """)
+
+    op.add_column('check_ins', sa.Column(
+        'open_flag', sa.Integer(), sa.Computed("CASE WHEN status = 'checked_in' THEN 1 END")
+    ))
+    op.create_index('uq_check_ins_student_room_open', 'check_ins', ['student_id', 'room_id', 'open_flag'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_check_ins_student_room_open', table_name='check_ins')
+    with op.batch_alter_table('check_ins', schema=None) as batch_op:
+        batch_op.drop_column('open_flag')
@@ -0,0 +1,27 @@
+"""reservations check-in lookup index
+
+Revision ID: f1b4c7e2a938
+Revises: e3c6a8d1b257
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1b4c7e2a938'
+down_revision = 'e3c6a8d1b257'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('reservations', schema=None) as batch_op:
+        batch_op.create_index('ix_reservations_student_room_status_start',
+                              ['student_id', 'room_id', 'status', 'start_time'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reservations', schema=None) as batch_op:
+        batch_op.drop_index('ix_reservations_student_room_status_start')
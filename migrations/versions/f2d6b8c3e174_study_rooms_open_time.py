@@ -0,0 +1,26 @@
+"""study room open time
+
+Revision ID: f2d6b8c3e174
+Revises: e9c4a7b2d853
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2d6b8c3e174'
+down_revision = 'e9c4a7b2d853'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('study_rooms', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('open_time', sa.Time(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('study_rooms', schema=None) as batch_op:
+        batch_op.drop_column('open_time')